@@ -6,7 +6,12 @@ from .arnold_common import ai, NullToNone
 from .ai_node_entry import AtNodeEntry
 from .ai_types import *
 
-AtDisplayCallBack = CFUNCTYPE(None, c_uint, c_uint, c_uint, c_uint, POINTER(c_byte), c_void_p)
+# (x, y, width, height, buffer, data)
+# buffer is 8-bit RGBA, or linear float RGBA when the driver float_output is set,
+# the callback owns it and must release it with AiFree
+# with the driver process_buckets set buckets are converted in render threads,
+# the callback is still called from one thread at a time
+AtDisplayCallBack = CFUNCTYPE(None, c_uint, c_uint, c_uint, c_uint, c_void_p, c_void_p)
 
 _AiFindDriverType = ai.AiFindDriverType
 _AiFindDriverType.argtypes = [AtPythonString]
@@ -147,6 +147,12 @@ def register():
 
     bpy.utils.register_class(ArnoldRenderEngine)
     nodes.register()
+    bpy.app.handlers.render_cancel.append(engine.sequence_end)
+    bpy.app.handlers.render_complete.append(engine.sequence_end)
+
+    prefs = bpy.context.user_preferences.addons[__package__].preferences
+    if prefs.ipr_prestart:
+        engine.ipr_prestart()
 
 
 def unregister():
@@ -157,6 +163,11 @@ def unregister():
     from . import ui
     from . import engine
     from . import addon_preferences
+    engine.ipr_shutdown()
+    for handlers in (bpy.app.handlers.render_cancel, bpy.app.handlers.render_complete):
+        if engine.sequence_end in handlers:
+            handlers.remove(engine.sequence_end)
+    engine.sequence_end()
     addon_preferences.unregister()
     bpy.utils.unregister_class(ArnoldRenderEngine)
     nodes.unregister()
@@ -12,12 +12,18 @@ class ArnoldAddonPreferences(AddonPreferences):
         name="Arnold Path",
         subtype="DIR_PATH")
 
+    ipr_prestart = BoolProperty(
+        name="Start IPR Worker",
+        description="Start viewport render process in background on addon registration",
+        default=False)
+
     def draw(self, context):
         layout = self.layout
         layout.label(text="IMPORTANT NOTICE:")
         layout.label(text="if you have an ARNOLD_HOME environment set,it will \
         override whatever setting you input here.")
         layout.prop(self, "arnold_path")
+        layout.prop(self, "ipr_prestart")
 
 # Registration
 
@@ -8,6 +8,7 @@ import sys
 import ctypes
 import itertools
 import collections
+import concurrent.futures
 import numpy
 import math
 import time
@@ -31,8 +32,16 @@ from ..nodes import (
 )
 from . import bla as _BLA
 from . import ipr as _IPR
+from . import cache as _Cache
+from . import arrays as _AiArray
+from . import tiles as _Tiles
+from . import stats as _Stats
+from . import ass as _Ass
+from .ipr import shutdown as _ipr_shutdown
 
 _IPR = _IPR.ipr()
+_MESH_CACHE = _Cache.MeshCache()  # lives between render sessions
+_SEQUENCE = {}  # sequence render session kept between frames
 
 _RN = re.compile("[^-0-9A-Za-z_]")  # regex to cleanup names
 _CT = {'MESH', 'CURVE', 'SURFACE', 'META', 'FONT'}  # convertible types
@@ -73,34 +82,68 @@ _AiNodeSet = {
 }
 
 
-def _AiNode(node, prefix, nodes):
+def _Hashable(value):
+    """Hashable copy of the property value, arrays and matrices are tuples"""
+    if isinstance(value, (str, bytes)):
+        return value
+    try:
+        return tuple(_Hashable(v) for v in value)
+    except TypeError:
+        return value
+
+
+def _AiNode(node, prefix, nodes, shared=None):
     """
     Args:
         node (ArnoldNode): node.
         prefix (str): node name prefix.
         nodes (dict): created nodes {Node: AiNode}.
+        shared (dict): nodes shared between the trees {signature: AiNode}.
     Returns:
         arnold.AiNode or None
+
+    Inputs are exported first, so the signature of the node refers to the
+    nodes of identical subgraphs, which are created once.
     """
     if not isinstance(node, ArnoldNode):
         return None
 
     anode = nodes.get(node)
     if anode is None:
-        anode = arnold.AiNode(node.ai_name)
-        name = "%s&N%d::%s" % (prefix, len(nodes), _RN.sub("_", node.name))
-        arnold.AiNodeSetStr(anode, "name", name)
-        nodes[node] = anode
+        links = []
+        values = []
         for input in node.inputs:
             if input.is_linked:
-                _anode = _AiNode(input.links[0].from_node, prefix, nodes)
+                _anode = _AiNode(input.links[0].from_node, prefix, nodes, shared)
                 if _anode is not None:
-                    arnold.AiNodeLink(_anode, input.identifier, anode)
+                    links.append((input.identifier, _anode))
                     continue
             if not input.hide_value:
-                _AiNodeSet[input.bl_idname](anode, input.identifier, input.default_value)
+                values.append((input.bl_idname, input.identifier, input.default_value))
         for p_name, (p_type, p_value) in node.ai_properties.items():
-            _AiNodeSet[p_type](anode, p_name, p_value)
+            values.append((p_type, p_name, p_value))
+
+        if shared is not None:
+            key = (
+                node.ai_name,
+                tuple((t, n, _Hashable(v)) for t, n, v in values),
+                tuple((i, id(n)) for i, n in links)
+            )
+            anode = shared.get(key)
+            if anode is not None:
+                nodes[node] = anode
+                return anode
+
+        anode = arnold.AiNode(node.ai_name)
+        name = "%s&N%d::%s" % (prefix, len(nodes), _RN.sub("_", node.name))
+        arnold.AiNodeSetStr(anode, "name", name)
+        nodes[node] = anode
+        for identifier, _anode in links:
+            arnold.AiNodeLink(_anode, identifier, anode)
+        for t, n, v in values:
+            _AiNodeSet[t](anode, n, v)
+        if shared is not None:
+            shared[key] = anode
     return anode
 
 
@@ -111,6 +154,8 @@ class Shaders:
 
         self._shaders = {}
         self._default = arnold.AiNode('lambert')  # default shader, if used
+        arnold.AiNodeSetStr(self._default, "name", "__default")
+        self.shared = {}  # identical node subgraphs of materials, lights and world
 
         self._Name = _CleanNames("M", itertools.count())
 
@@ -142,7 +187,7 @@ class Shaders:
                 if isinstance(n, ArnoldNodeOutput) and n.is_active:
                     input = n.inputs[0]
                     if input.is_linked:
-                        return _AiNode(input.links[0].from_node, self._Name(mat.name), {})
+                        return _AiNode(input.links[0].from_node, self._Name(mat.name), {}, self.shared)
                     break
             return None
 
@@ -270,91 +315,441 @@ class Shaders:
         return node
 
 
-def _AiPolymesh(mesh, shaders):
-    print("AiPolymesh triggered")
-    pc = time.perf_counter()
-
+def _MeshRead(mesh, shaders, digest=False):
+    """Read mesh buffers, bpy data is accessible only from the main thread
+    Args:
+        mesh (bpy.types.Mesh): evaluated mesh.
+        shaders (Shaders): material shaders.
+        digest (bool): the content hash is needed, even if arrays are not cached.
+    Returns:
+        (key, arrays, slots)
+        key: content hash if arrays are cached or digest is requested, None otherwise.
+        arrays: {name: numpy.ndarray}, complete if found in the cache.
+        slots: {material index: AiNode} shaders of used materials or None.
+
+    The buffers are read and hashed even when the arrays are cached, a hit
+    only skips the split normals, the uv welding and the copies of the
+    cached arrays.
+    """
     verts = mesh.vertices
     nverts = len(verts)
     loops = mesh.loops
     nloops = len(loops)
     polygons = mesh.polygons
     npolygons = len(polygons)
+    materials = mesh.materials
+
+    # numpy buffers only for the hash, without the cache and the digest
+    # they are read once, straight into arnold memory; custom split
+    # normals can't be checked without computing them
+    hashing = (digest or _MESH_CACHE.budget > 0) and not mesh.has_custom_normals
+    caching = hashing and _MESH_CACHE.budget > 0
+
+    def _read(collection, attr, n, type):
+        if hashing:
+            a = _AiArray.ndarray(n, type)
+            collection.foreach_get(attr, a)
+            return a
+        # nothing to keep, read straight into arnold memory
+        return _AiArray.from_collection(collection, attr, n, type)
 
     # vertices
-    a = numpy.ndarray(nverts * 3, dtype=numpy.float32)
-    verts.foreach_get("co", a)
-    vlist = arnold.AiArrayConvert(nverts, 1, arnold.AI_TYPE_VECTOR, ctypes.c_void_p(a.ctypes.data))
-    # normals
-    a = numpy.ndarray(nloops * 3, dtype=numpy.float32)
-    loops.foreach_get("normal", a)
-    nlist = arnold.AiArrayConvert(nloops, 1, arnold.AI_TYPE_VECTOR, ctypes.c_void_p(a.ctypes.data))
+    vlist = _read(verts, "co", nverts, arnold.AI_TYPE_VECTOR)
     # polygons
-    a = numpy.ndarray(npolygons, dtype=numpy.uint32)
-    polygons.foreach_get("loop_total", a)
-    nsides = arnold.AiArrayConvert(npolygons, 1, arnold.AI_TYPE_UINT, ctypes.c_void_p(a.ctypes.data))
-    a = numpy.ndarray(nloops, dtype=numpy.uint32)
-    polygons.foreach_get("vertices", a)
-    vidxs = arnold.AiArrayConvert(nloops, 1, arnold.AI_TYPE_UINT, ctypes.c_void_p(a.ctypes.data))
-    # TODO: very slow, seems its always a range(0, nloops)
-    #a = numpy.array([i for p in polygons for i in p.loop_indices], dtype=numpy.uint32)
-    #nidxs = arnold.AiArrayConvert(len(a), 1, arnold.AI_TYPE_UINT, ctypes.c_void_p(a.ctypes.data))
-    a = numpy.arange(nloops, dtype=numpy.uint32)
-    nidxs = arnold.AiArrayConvert(nloops, 1, arnold.AI_TYPE_UINT, ctypes.c_void_p(a.ctypes.data))
-
-    node = arnold.AiNode('polymesh')
-    arnold.AiNodeSetBool(node, "smoothing", True)
+    nsides = _read(polygons, "loop_total", npolygons, arnold.AI_TYPE_UINT)
+    vidxs = _read(polygons, "vertices", nloops, arnold.AI_TYPE_UINT)
+    # uv, welded in _MeshBuild
+    uvlist, uvmaps = _MeshUVs(mesh)
+    # materials
+    shidxs = None
+    slots = None
+    if materials:
+        shidxs = numpy.ndarray(npolygons, dtype=numpy.int16)
+        polygons.foreach_get("material_index", shidxs)
+        slots = collections.OrderedDict(
+            (i, shaders.get(materials[i])) for i in numpy.unique(shidxs)
+        )
+    # smoothing
+    smooth = numpy.ndarray(npolygons, dtype=numpy.bool_)
+    polygons.foreach_get("use_smooth", smooth)
+    smoothing, normals = _MeshSmoothing(mesh, smooth)
+
+    key = None
+    if hashing:
+        sharp = None
+        if mesh.use_auto_smooth:
+            edges = mesh.edges
+            sharp = numpy.ndarray(len(edges), dtype=numpy.bool_)
+            edges.foreach_get("use_edge_sharp", sharp)
+        header = repr((
+            nverts, nloops, npolygons, uvlist is not None, list(uvmaps), shidxs is not None,
+            mesh.use_auto_smooth, mesh.auto_smooth_angle,
+            [m.name if m else None for m in materials]
+        ))
+        key = _Cache.digest(header.encode(), vlist, nsides, vidxs, uvlist, shidxs, smooth, sharp,
+                            *uvmaps.values())
+        arrays = _MESH_CACHE.get(key) if caching else None
+        if arrays is not None:
+            arnold.AiMsgDebug(b"    cached")
+            return key, arrays, slots
+
+    arrays = {
+        'vlist': vlist,
+        'nsides': nsides,
+        'vidxs': vidxs,
+        'smoothing': numpy.array(smoothing),
+    }
+    # normals
+    if normals:
+        mesh.calc_normals_split()
+        arrays['nlist'] = _read(loops, "normal", nloops, arnold.AI_TYPE_VECTOR)
+    if uvlist is not None:
+        arrays['uvlist'] = uvlist
+    for name, a in uvmaps.items():
+        arrays['uvlist:' + name] = a
+    if shidxs is not None:
+        arrays['shidxs'] = shidxs
+    return key, arrays, slots
+
+
+def _MeshUVs(mesh):
+    """Read uv layers
+    Returns:
+        (uvlist, uvmaps)
+        uvlist: numpy.ndarray active render layer or None.
+        uvmaps: {name: numpy.ndarray} other layers, exported as user data.
+    """
+    uvlist = None
+    uvmaps = collections.OrderedDict()
+    entry = None
+    for i, uvt in enumerate(mesh.uv_textures):
+        if uvt.active_render and uvlist is None:
+            name = None
+        else:
+            # user data can't override the polymesh parameters
+            name = _RN.sub("_", uvt.name)
+            if entry is None:
+                entry = arnold.AiNodeEntryLookUp("polymesh")
+            if (arnold.AiNodeEntryLookUpParameter(entry, name) or
+                    arnold.AiNodeEntryLookUpParameter(entry, name + "idxs")):
+                arnold.AiMsgWarning(b"BARNOLD: uv map '%S' skipped, the name is a polymesh parameter", name)
+                continue
+        uvd = mesh.uv_layers[i].data
+        a = _AiArray.ndarray(len(uvd), arnold.AI_TYPE_VECTOR2)
+        uvd.foreach_get("uv", a)
+        if name is None:
+            uvlist = a
+        else:
+            uvmaps[name] = a
+    return uvlist, uvmaps
+
+
+def _WeldUV(uv):
+    """Merge identical uv coordinates, (u, v) float32 pairs are packed
+    into uint64 keys for numpy.unique
+    Args:
+        uv (numpy.ndarray): float32 per loop [u, v, ...].
+    Returns:
+        (uvlist, uvidxs)
+    """
+    keys, idxs = numpy.unique(numpy.ascontiguousarray(uv).view(numpy.uint64), return_inverse=True)
+    return keys.view(numpy.float32), idxs.astype(numpy.uint32)
+
+
+def _MeshSmoothing(mesh, smooth):
+    """Arnold computes the normals of all smooth or all flat polygons,
+    split normals are exported only for the mixed ones, auto smooth
+    and custom normals
+    Args:
+        mesh (bpy.types.Mesh): evaluated mesh.
+        smooth (numpy.ndarray): per polygon use_smooth.
+    Returns:
+        (smoothing, normals)
+        smoothing: bool polymesh smoothing.
+        normals: bool split normals have to be exported.
+    """
+    if mesh.has_custom_normals:
+        return True, True
+    if not smooth.any():
+        return False, False
+    return True, mesh.use_auto_smooth or not smooth.all()
+
+
+def _MeshBuild(key, arrays, slots):
+    """Build polymesh arrays from mesh buffers, doesn't touch bpy data,
+    so it can run in a worker thread
+    Returns:
+        (key, arrays, shader, shidxs)
+        shader: [AiNode] polymesh shaders or None.
+        shidxs: numpy.ndarray per polygon shader indices or None.
+    """
+    for k in [k for k in arrays if k.startswith('uvlist')]:
+        i = 'uvidxs' + k[6:]
+        if i not in arrays:
+            arrays[k], arrays[i] = _WeldUV(arrays[k])
+
+    shader = None
+    shidxs = None
+    a = arrays.get('shidxs')
+    if a is not None:
+        # lookup table: material index -> index of the distinct shader
+        shader = []
+        index = {}  # {id(AiNode): shader index}
+        lut = numpy.zeros(max(slots) + 1, dtype=numpy.int16)
+        for i, mn in slots.items():
+            j = index.get(id(mn))
+            if j is None:
+                j = index[id(mn)] = len(shader)
+                shader.append(mn)
+            lut[i] = j
+        shidxs = lut[a]  # new array, cached arrays are shared
+    return key, arrays, shader, shidxs
+
+
+_MAX_SHADERS = 256  # polymesh shidxs is a BYTE array
+
+
+def _ShaderIndices(shader, shidxs):
+    """Fit the per polygon shader indices into the polymesh BYTE array,
+    polygons of the shaders past the limit get the first one
+    Returns:
+        (shader, shidxs)
+        shader: [AiNode]
+        shidxs: numpy.ndarray uint8
+    """
+    if len(shader) > _MAX_SHADERS:
+        arnold.AiMsgWarning(b"BARNOLD: %d shaders in a mesh, %d are supported",
+                            ctypes.c_int(len(shader)), ctypes.c_int(_MAX_SHADERS))
+        shader = shader[:_MAX_SHADERS]
+        shidxs = numpy.where(shidxs < _MAX_SHADERS, shidxs, 0)
+    return shader, shidxs.astype(numpy.uint8)
+
+
+def _MeshNode(node, key, arrays, shader, shidxs):
+    """Set polymesh arrays, must run in the main thread"""
+    if key is not None and _MESH_CACHE.budget > 0:
+        _MESH_CACHE.put(key, arrays)
+
+    vlist = _AiArray.convert(arrays['vlist'], arnold.AI_TYPE_VECTOR)
+    nsides = _AiArray.convert(arrays['nsides'], arnold.AI_TYPE_UINT)
+    vidxs = _AiArray.convert(arrays['vidxs'], arnold.AI_TYPE_UINT)
+
+    arnold.AiNodeSetBool(node, "smoothing", bool(arrays['smoothing']))
     arnold.AiNodeSetArray(node, "vlist", vlist)
-    arnold.AiNodeSetArray(node, "nlist", nlist)
     arnold.AiNodeSetArray(node, "nsides", nsides)
     arnold.AiNodeSetArray(node, "vidxs", vidxs)
-    arnold.AiNodeSetArray(node, "nidxs", nidxs)
+
+    # normals, computed by arnold if not set
+    a = arrays.get('nlist')
+    if a is not None:
+        # split normals are per loop, nidxs is always range(0, nloops)
+        nidxs = _AiArray.arange(arnold.AiArrayGetNumElements(vidxs))
+        nlist = _AiArray.convert(a, arnold.AI_TYPE_VECTOR)
+        arnold.AiNodeSetArray(node, "nidxs", nidxs)
+        arnold.AiNodeSetArray(node, "nlist", nlist)
+    elif arnold.AiArrayGetNumElements(arnold.AiNodeGetArray(node, "nidxs")):
+        # updated node had split normals
+        arnold.AiNodeSetArray(node, "nidxs", arnold.AiArrayAllocate(0, 1, arnold.AI_TYPE_UINT))
+        arnold.AiNodeSetArray(node, "nlist", arnold.AiArrayAllocate(0, 1, arnold.AI_TYPE_VECTOR))
 
     # uv
-    for i, uvt in enumerate(mesh.uv_textures):
-        if uvt.active_render:
-            uvd = mesh.uv_layers[i].data
-            nuvs = len(uvd)
-            a = numpy.arange(nuvs, dtype=numpy.uint32)
-            uvidxs = arnold.AiArrayConvert(nuvs, 1, arnold.AI_TYPE_UINT, ctypes.c_void_p(a.ctypes.data))
-            a = numpy.ndarray(nuvs * 2, dtype=numpy.float32)
-            uvd.foreach_get("uv", a)
-            uvlist = arnold.AiArrayConvert(nuvs, 1, arnold.AI_TYPE_VECTOR2, ctypes.c_void_p(a.ctypes.data))
-            arnold.AiNodeSetArray(node, "uvidxs", uvidxs)
-            arnold.AiNodeSetArray(node, "uvlist", uvlist)
-            break
+    a = arrays.get('uvidxs')
+    if a is not None:
+        uvidxs = _AiArray.convert(a, arnold.AI_TYPE_UINT)
+        uvlist = _AiArray.convert(arrays['uvlist'], arnold.AI_TYPE_VECTOR2)
+        arnold.AiNodeSetArray(node, "uvidxs", uvidxs)
+        arnold.AiNodeSetArray(node, "uvlist", uvlist)
+    for k, a in arrays.items():
+        if k.startswith('uvidxs:'):
+            name = k[7:]
+            if not arnold.AiNodeLookUpUserParameter(node, name):
+                arnold.AiNodeDeclare(node, name, "indexed VECTOR2")
+            uvidxs = _AiArray.convert(a, arnold.AI_TYPE_UINT)
+            uvlist = _AiArray.convert(arrays['uvlist:' + name], arnold.AI_TYPE_VECTOR2)
+            arnold.AiNodeSetArray(node, name, uvlist)
+            arnold.AiNodeSetArray(node, name + "idxs", uvidxs)
 
     # materials
-    if mesh.materials:
-        a = numpy.ndarray(npolygons, dtype=numpy.uint8)
-        polygons.foreach_get("material_index", a)
-        mm = collections.OrderedDict()
-        for i in numpy.unique(a):
-            mn = shaders.get(mesh.materials[i])
-            mi = mm.setdefault(id(mn), (mn, []))[1]
-            mi.append(i)
-        for i, (mn, mi) in enumerate(mm.values()):
-            a[numpy.in1d(a, numpy.setdiff1d(mi, i))] = i
-        if mm:
-            nmm = len(mm)
-            t = mm.popitem(False)
-            if mm:
-                shader = arnold.AiArrayAllocate(nmm, 1, arnold.AI_TYPE_POINTER)
-                arnold.AiArraySetPtr(shader, 0, t[1][0])
-                i = 1
-                while mm:
-                    arnold.AiArraySetPtr(shader, i, mm.popitem(False)[1][0])
-                    i += 1
-                shidxs = arnold.AiArrayConvert(len(a), 1, arnold.AI_TYPE_BYTE, ctypes.c_void_p(a.ctypes.data))
-                arnold.AiNodeSetArray(node, "shader", shader)
-                arnold.AiNodeSetArray(node, "shidxs", shidxs)
-            else:
-                arnold.AiNodeSetPtr(node, "shader", t[1][0])
+    if shader:
+        if len(shader) > 1:
+            shader, shidxs = _ShaderIndices(shader, shidxs)
+            a = arnold.AiArray(len(shader), 1, arnold.AI_TYPE_NODE, *shader)
+            arnold.AiNodeSetArray(node, "shader", a)
+            a = _AiArray.convert(shidxs, arnold.AI_TYPE_BYTE)
+            arnold.AiNodeSetArray(node, "shidxs", a)
+        else:
+            arnold.AiNodeSetPtr(node, "shader", shader[0])
+
+
+def _AiPolymesh(mesh, shaders, node=None):
+    """
+    Args:
+        mesh (bpy.types.Mesh): evaluated mesh.
+        shaders (Shaders): material shaders.
+        node (arnold.AiNode): existing polymesh node to update, new if None.
+    Returns:
+        arnold.AiNode
+    """
+    print("AiPolymesh triggered")
+    pc = time.perf_counter()
+
+    if node is None:
+        node = arnold.AiNode('polymesh')
+    _MeshNode(node, *_MeshBuild(*_MeshRead(mesh, shaders)))
 
     arnold.AiMsgDebug(b"    node (%f)", ctypes.c_double(time.perf_counter() - pc))
     return node
 
 
+def _AiProcedural(mesh, shaders, props, cache_dir, instances):
+    """Polymesh written into the geometry cache and loaded by a procedural,
+    the cache file is named by the mesh content hash and reused while
+    the mesh is unchanged. Arnold doesn't pass the procedural shaders and
+    flags to the loaded polymesh, so they are written into the file, the
+    shaders by name
+    Args:
+        mesh (bpy.types.Mesh): evaluated mesh.
+        shaders (Shaders): material shaders.
+        props (ArnoldShape): object properties, the shape flags and subdivision
+            are cached with the mesh.
+        cache_dir (str): cache files directory.
+        instances (dict): {content hash: AiNode} procedurals of the export.
+    Returns:
+        (node, new)
+        node: arnold.AiNode new procedural or the existing one with the same content.
+        new: bool
+    """
+    pc = time.perf_counter()
+
+    verts = mesh.vertices
+    nverts = len(verts)
+    loops = mesh.loops
+    nloops = len(loops)
+    polygons = mesh.polygons
+    npolygons = len(polygons)
+    materials = mesh.materials
+
+    def _read(collection, attr, n, type):
+        a = _AiArray.ndarray(n, type)
+        collection.foreach_get(attr, a)
+        return a
+
+    vlist = _read(verts, "co", nverts, arnold.AI_TYPE_VECTOR)
+    nsides = _read(polygons, "loop_total", npolygons, arnold.AI_TYPE_UINT)
+    vidxs = _read(polygons, "vertices", nloops, arnold.AI_TYPE_UINT)
+    uvlist, uvmaps = _MeshUVs(mesh)
+    shidxs = None
+    if materials:
+        shidxs = numpy.ndarray(npolygons, dtype=numpy.int16)
+        polygons.foreach_get("material_index", shidxs)
+    smooth = numpy.ndarray(npolygons, dtype=numpy.bool_)
+    polygons.foreach_get("use_smooth", smooth)
+    sharp = None
+    if mesh.use_auto_smooth:
+        edges = mesh.edges
+        sharp = numpy.ndarray(len(edges), dtype=numpy.bool_)
+        edges.foreach_get("use_edge_sharp", sharp)
+    nlist = None
+    if mesh.has_custom_normals:
+        # custom split normals can't be checked without computing them
+        mesh.calc_normals_split()
+        nlist = _read(loops, "normal", nloops, arnold.AI_TYPE_VECTOR)
+
+    smoothing, normals = _MeshSmoothing(mesh, smooth)
+    params = {'smoothing': smoothing}
+    params.update((p, getattr(props, p)) for p in _SHAPE)
+    params.update(_SubdivParams(props))
+    shader = None
+    if shidxs is not None:
+        # used material slots, the cached indices are the slots positions
+        slots, shidxs = numpy.unique(shidxs, return_inverse=True)
+        shader, shidxs = _ShaderIndices([shaders.get(materials[i]) for i in slots], shidxs)
+    # shader node names depend on the export order, files are rewritten
+    # when they change
+    names = [arnold.AiNodeGetName(mn) for mn in shader or ()]
+    header = repr((
+        nverts, nloops, npolygons, uvlist is not None, list(uvmaps), shidxs is not None,
+        mesh.use_auto_smooth, mesh.auto_smooth_angle, sorted(params.items()), names
+    ))
+    key = _Cache.digest(header.encode(), vlist, nsides, vidxs, uvlist, shidxs, smooth, sharp, nlist,
+                        *uvmaps.values())
+    node = instances.get(key)
+    if node is not None:
+        return node, False
+    name = "".join("%02x" % b for b in key)
+    path = os.path.join(cache_dir, name + ".ass.gz")
+    if os.path.exists(path):
+        arnold.AiMsgDebug(b"    cached (%S)", path)
+    else:
+        arrays = {
+            'vlist': vlist,
+            'nsides': nsides,
+            'vidxs': vidxs,
+        }
+        if normals:
+            if nlist is None:
+                mesh.calc_normals_split()
+                nlist = _read(loops, "normal", nloops, arnold.AI_TYPE_VECTOR)
+            arrays['nlist'] = nlist
+            arrays['nidxs'] = numpy.arange(nloops, dtype=numpy.uint32)
+        if uvlist is not None:
+            arrays['uvlist'], arrays['uvidxs'] = _WeldUV(uvlist)
+        user = collections.OrderedDict(
+            (name, _WeldUV(a)) for name, a in uvmaps.items()
+        )
+        if shidxs is not None:
+            arrays['shidxs'] = shidxs
+        os.makedirs(cache_dir, exist_ok=True)
+        _Ass.write_polymesh(path, "M" + name, arrays, params, user, names)
+        arnold.AiMsgDebug(b"    written (%S)", path)
+
+    node = arnold.AiNode("procedural")
+    arnold.AiNodeSetStr(node, "filename", path)
+
+    instances[key] = node
+    arnold.AiMsgDebug(b"    procedural (%f)", ctypes.c_double(time.perf_counter() - pc))
+    return node, True
+
+
+# modifiers properties not affecting the result
+_MOD_SKIP = {"rna_type", "name", "show_viewport", "show_render", "show_in_editmode",
+             "show_on_cage", "show_expanded"}
+# the result depends on the object simulation cache or particles
+_MOD_UNIQUE = {'CLOTH', 'SOFT_BODY', 'COLLISION', 'SMOKE', 'DYNAMIC_PAINT',
+               'EXPLODE', 'PARTICLE_INSTANCE'}
+
+
+def _ModifiersSignature(ob):
+    """Hashable description of the object render modifiers stack,
+    None if the result depends on the object placement or state"""
+    sig = []
+    for m in ob.modifiers:
+        if not m.show_render:
+            continue
+        if m.type in _MOD_UNIQUE:
+            return None
+        if getattr(m, "texture_coords", None) in {'GLOBAL', 'OBJECT'}:
+            return None
+        values = [m.type]
+        for p in m.bl_rna.properties:
+            i = p.identifier
+            if i in _MOD_SKIP or p.type == 'COLLECTION':
+                continue
+            v = getattr(m, i)
+            if p.type == 'POINTER':
+                # deformed by other objects, hooks, armatures, booleans etc.
+                if isinstance(v, bpy.types.Object):
+                    return None
+                if v is not None:
+                    # settings structs aren't comparable by name
+                    if not isinstance(v, bpy.types.ID):
+                        return None
+                    v = getattr(v, "name", None)
+            values.append(_Hashable(v))
+        sig.append(tuple(values))
+    return tuple(sig)
+
+
 def _AiCurvesPS(scene, ob, mod, ps, pss, shaders):
     """Create arnold curves node from a particle system"""
     pc = time.perf_counter()
@@ -363,12 +758,14 @@ def _AiCurvesPS(scene, ob, mod, ps, pss, shaders):
     try:
         props = pss.arnold.curves
         steps = 2 ** pss.render_step + 1
-        curves = _BLA.psys_get_curves(ps, steps, pss.use_parent_particles, props)
+        # points are written straight into arnold array memory
+        with _AiArray.Mapping(arnold.AI_TYPE_VECTOR) as alloc:
+            curves = _BLA.psys_get_curves(ps, steps, pss.use_parent_particles, props, alloc)
         if curves is None:
             return None
         p, r, steps = curves
-        points = arnold.AiArrayConvert(len(p), 1, arnold.AI_TYPE_VECTOR, ctypes.c_void_p(p.ctypes.data))
-        radius = arnold.AiArrayConvert(len(r), 1, arnold.AI_TYPE_FLOAT, ctypes.c_void_p(r.ctypes.data))
+        points = alloc.array
+        radius = _AiArray.convert(r, arnold.AI_TYPE_FLOAT)
 
         arnold.AiMsgDebug(b"    standard_hair [%d] (%f)", ctypes.c_int(len(p)), ctypes.c_double(time.perf_counter() - pc))
 
@@ -387,38 +784,12 @@ def _AiCurvesPS(scene, ob, mod, ps, pss, shaders):
 
         # TODO: work only if particle system emits particles from faces or volume
         if props.uvmap:
-            uv_no = ob.data.uv_layers.find(props.uvmap)
-            if uv_no >= 0:
+            if ob.data.uv_layers.find(props.uvmap) >= 0:
                 pc = time.perf_counter()
 
-                setFlt = arnold.AiArraySetFlt
-                uv_on_emitter = ps.uv_on_emitter
-
-                np = len(ps.particles)
-                nch = len(ps.child_particles)
-                if nch == 0 or pss.use_parent_particles:
-                    tot = np + nch
-                    uparam = arnold.AiArrayAllocate(tot, 1, arnold.AI_TYPE_FLOAT)
-                    vparam = arnold.AiArrayAllocate(tot, 1, arnold.AI_TYPE_FLOAT)
-                    for i, p in enumerate(ps.particles):
-                        u, v = uv_on_emitter(mod, p, i, uv_no)
-                        setFlt(uparam, i, u)
-                        setFlt(vparam, i, v)
-                    n = i + 1
-                else:
-                    uparam = arnold.AiArrayAllocate(nch, 1, arnold.AI_TYPE_FLOAT)
-                    vparam = arnold.AiArrayAllocate(nch, 1, arnold.AI_TYPE_FLOAT)
-                    n = 0
-                if nch > 0:
-                    j = np
-                    r = nch // np
-                    for p in ps.particles:
-                        for i in range(r):
-                            u, v = uv_on_emitter(mod, p, j, uv_no)
-                            setFlt(uparam, n, u)
-                            setFlt(vparam, n, v)
-                            j += 1
-                            n += 1
+                uvs = _BLA.psys_get_uvs(ob, mod, ps, pss, props.uvmap)
+                uparam = _AiArray.convert(uvs[:, 0], arnold.AI_TYPE_FLOAT)
+                vparam = _AiArray.convert(uvs[:, 1], arnold.AI_TYPE_FLOAT)
 
                 arnold.AiMsgDebug(b"    standard_hair uvs (%f)", ctypes.c_double(time.perf_counter() - pc))
 
@@ -440,7 +811,7 @@ def _AiPointsPS(scene, ob, ps, pss, frame_current, shaders):
         if p is not None:
             n = len(p)
             if n > 0:
-                points = arnold.AiArrayConvert(n, 1, arnold.AI_TYPE_VECTOR, ctypes.c_void_p(p.ctypes.data))
+                points = _AiArray.convert(p, arnold.AI_TYPE_VECTOR)
 
                 arnold.AiMsgDebug(b"    points [%d] (%f)", ctypes.c_int(n), ctypes.c_double(time.perf_counter() - pc))
 
@@ -465,7 +836,42 @@ def _AiPointsPS(scene, ob, ps, pss, frame_current, shaders):
     return None
 
 
-def _export_object_properties(ob, node):
+# polymesh subdivision parameters of the object properties
+_SUBDIV = (
+    "subdiv_type",
+    "subdiv_iterations",
+    "subdiv_adaptive_error",
+    "subdiv_adaptive_metric",
+    "subdiv_adaptive_space",
+    "subdiv_uv_smoothing",
+    "subdiv_smooth_derivs",
+)
+
+
+# shape flags, they are written into the geometry cache files
+_SHAPE = (
+    "visibility",
+    "sidedness",
+    "receive_shadows",
+    "self_shadows",
+    "invert_normals",
+    "opaque",
+    "matte",
+)
+
+
+def _SubdivParams(props):
+    """Subdivision parameters, ginstance nodes ignore them, so the shapes
+    with different ones are not instanced
+    Returns:
+        tuple ((name, value), ...), empty without subdivision
+    """
+    if props.subdiv_type == 'none':
+        return ()
+    return tuple((p, getattr(props, p)) for p in _SUBDIV)
+
+
+def _export_object_properties(ob, node, subdiv=True):
     props = ob.arnold
     arnold.AiNodeSetByte(node, "visibility", props.visibility)
     arnold.AiNodeSetByte(node, "sidedness", props.sidedness)
@@ -474,7 +880,7 @@ def _export_object_properties(ob, node):
     arnold.AiNodeSetBool(node, "invert_normals", props.invert_normals)
     arnold.AiNodeSetBool(node, "opaque", props.opaque)
     arnold.AiNodeSetBool(node, "matte", props.matte)
-    if props.subdiv_type != 'none':
+    if subdiv and props.subdiv_type != 'none':
         arnold.AiNodeSetStr(node, "subdiv_type", props.subdiv_type)
         arnold.AiNodeSetByte(node, "subdiv_iterations", props.subdiv_iterations)
         arnold.AiNodeSetFlt(node, "subdiv_adaptive_error", props.subdiv_adaptive_error)
@@ -484,8 +890,59 @@ def _export_object_properties(ob, node):
         arnold.AiNodeSetBool(node, "subdiv_smooth_derivs", props.subdiv_smooth_derivs)
 
 
-def _export(data, scene, camera, xres, yres, session=None):
+def _export_camera_properties(camera, node, xres, yres, aspect_x, aspect_y):
+    mw = camera.matrix_world
+    cdata = camera.data
+    cp = cdata.arnold
+    arnold.AiNodeSetMatrix(node, "matrix", _AiMatrix(mw))
+    if cdata.sensor_fit == 'VERTICAL':
+        sw = cdata.sensor_height * xres / yres * aspect_x / aspect_y
+    else:
+        sw = cdata.sensor_width
+        if cdata.sensor_fit == 'AUTO':
+            x = xres * aspect_x
+            y = xres * aspect_y
+            if x < y:
+                sw *= x / y
+    fov = math.degrees(2 * math.atan(sw / (2 * cdata.lens)))
+    arnold.AiNodeSetFlt(node, "fov", fov)
+    if cdata.dof_object:
+        dof = geometry.distance_point_to_plane(
+            mw.to_translation(),
+            cdata.dof_object.matrix_world.to_translation(),
+            mw.col[2][:3]
+        )
+    else:
+       dof = cdata.dof_distance
+    arnold.AiNodeSetFlt(node, "focus_distance", dof)
+    if cp.enable_dof:
+        arnold.AiNodeSetFlt(node, "aperture_size", cp.aperture_size)
+        arnold.AiNodeSetInt(node, "aperture_blades", cp.aperture_blades)
+        arnold.AiNodeSetFlt(node, "aperture_rotation", cp.aperture_rotation)
+        arnold.AiNodeSetFlt(node, "aperture_blade_curvature", cp.aperture_blade_curvature)
+        arnold.AiNodeSetFlt(node, "aperture_aspect_ratio", cp.aperture_aspect_ratio)
+    arnold.AiNodeSetFlt(node, "near_clip", cdata.clip_start)
+    arnold.AiNodeSetFlt(node, "far_clip", cdata.clip_end)
+    arnold.AiNodeSetFlt(node, "shutter_start", cp.shutter_start)
+    arnold.AiNodeSetFlt(node, "shutter_end", cp.shutter_end)
+    arnold.AiNodeSetStr(node, "shutter_type", cp.shutter_type)
+    arnold.AiNodeSetStr(node, "rolling_shutter", cp.rolling_shutter)
+    arnold.AiNodeSetFlt(node, "rolling_shutter_duration", cp.rolling_shutter_duration)
+    arnold.AiNodeSetFlt(node, "exposure", cp.exposure)
+
+
+def _mesh_light_objects(scene):
+    """Names of the objects used by the mesh lights"""
+    return {
+        ob.data.arnold.mesh for ob in scene.objects
+        if ob.type == 'LAMP' and ob.data.type == 'AREA' and ob.data.arnold.type == 'mesh_light'
+    }
+
+
+def _export(data, scene, camera, xres, yres, session=None, objects=None):
     """
+        objects:
+            subset of the scene objects to export, all of them by default
     """
 
     @contextmanager
@@ -494,7 +951,6 @@ def _export(data, scene, camera, xres, yres, session=None):
         mesh = ob.to_mesh(scene, True, 'RENDER', False)
         if mesh is not None:
             try:
-                mesh.calc_normals_split()
                 arnold.AiMsgDebug(b"    mesh (%f)", ctypes.c_double(time.perf_counter() - pc))
                 yield mesh
             finally:
@@ -504,265 +960,373 @@ def _export(data, scene, camera, xres, yres, session=None):
 
     _Name = _CleanNames("O", itertools.count())
 
-    # enabled scene layers
-    layers = [i for i, j in enumerate(scene.layers) if j]
-    in_layers = lambda o: any(o.layers[i] for i in layers)
-    # nodes cache
-    nodes = {}  # {Object: AiNode}
-    inodes = {}  # {Object.data: AiNode}
-    lamp_nodes = {}
-    mesh_lights = []
-    duplicators = []
-    duplicator_parent = False
-
-    # print("NEEEEENEEEENEEEEEEENEEEENEEEEEEEEE")
-    shaders = Shaders(data)
-
+    # meshes pipeline: buffers are read in the main thread, arrays are built
+    # in the thread pool and set to the polymesh nodes at the end of export
     opts = scene.arnold
-    arnold.AiMsgSetConsoleFlags(opts.get("console_log_flags", 0))
-    arnold.AiMsgSetMaxWarnings(opts.max_warnings)
-    arnold.AiMsgDebug(b"BARNOLD: >>>")
-
-    plugins_path = os.path.normpath(os.path.join(os.path.dirname(__file__), os.path.pardir, "bin"))
-    arnold.AiLoadPlugins(plugins_path)
-
-    ##############################
-    ## objects
-    for ob in scene.objects:
-        arnold.AiMsgDebug(b"[%S] '%S'", ob.type, ob.name)
-
-        if ob.hide_render or not in_layers(ob):
-            arnold.AiMsgDebug(b"    skip (hidden)")
-            continue
+    pool = concurrent.futures.ThreadPoolExecutor(
+        os.cpu_count() if opts.auto_threads else opts.threads
+    )
+    try:
+        jobs = []  # [(AiNode, Future)]
+        timings = [0.0, 0.0, 0.0]  # read, build, nodes
+
+        def _Build(*args):
+            pc = time.perf_counter()
+            res = _MeshBuild(*args)
+            return res, time.perf_counter() - pc
+
+        def _Polymesh(mesh, read=None):
+            pc = time.perf_counter()
+            node = arnold.AiNode('polymesh')
+            if read is None:
+                read = _MeshRead(mesh, shaders)
+            jobs.append((node, pool.submit(_Build, *read)))
+            timings[0] += time.perf_counter() - pc
+            return node
+
+        def _Instance(ob, name, inode):
+            node = arnold.AiNode("ginstance")
+            arnold.AiNodeSetStr(node, "name", name)
+            arnold.AiNodeSetMatrix(node, "matrix", _AiMatrix(ob.matrix_world))
+            arnold.AiNodeSetBool(node, "inherit_xform", False)
+            arnold.AiNodeSetPtr(node, "node", inode)
+            _export_object_properties(ob, node, False)
+            snodes.append((ob.name, name, False))
+            arnold.AiMsgDebug(b"    instance (%S)", ob.data.name)
+
+        # enabled scene layers
+        layers = [i for i, j in enumerate(scene.layers) if j]
+        in_layers = lambda o: any(o.layers[i] for i in layers)
+        # nodes cache
+        nodes = {}  # {Object: AiNode}
+        # shapes for instancing, the keys have the subdivision parameters too
+        inodes = {}  # {(Object.data, subdiv): AiNode}
+        minodes = {}  # {(Object.data, modifiers signature, materials, subdiv): AiNode}
+        dnodes = {}  # {(evaluated mesh digest, subdiv): AiNode}
+        pnodes = {}  # procedurals, see _AiProcedural
+        lamp_nodes = {}
+        mesh_lights = []
+        duplicators = []
+        duplicator_parent = False
+        # exported nodes for sequence updates [(Object.name, AiNode name, deforming)]
+        snodes = []
+        static = True
+
+        # geometry cache of the heavy meshes, meshes of the mesh lights
+        # have to be polymesh nodes
+        proc_cache = None
+        if opts.proc_cache:
+            proc_cache = bpy.path.abspath(opts.proc_cache_path)
+            light_meshes = _mesh_light_objects(scene)
+
+        # print("NEEEEENEEEENEEEEEEENEEEENEEEEEEEEE")
+        shaders = Shaders(data)
+        stats = _Stats.Stats() if session is None else session["stats"]
+        export_pc = time.perf_counter()
+
+        arnold.AiMsgSetConsoleFlags(opts.get("console_log_flags", 0))
+        arnold.AiMsgSetMaxWarnings(opts.max_warnings)
+        arnold.AiMsgDebug(b"BARNOLD: >>>")
+
+        _MESH_CACHE.resize(opts.mesh_cache_size * 1048576)  # 1024*1024
+        _MESH_CACHE.reset_stats()
+
+        plugins_path = os.path.normpath(os.path.join(os.path.dirname(__file__), os.path.pardir, "bin"))
+        arnold.AiLoadPlugins(plugins_path)
+
+        ##############################
+        ## objects
+        for ob in stats.iter_objects(scene.objects if objects is None else objects):
+            arnold.AiMsgDebug(b"[%S] '%S'", ob.type, ob.name)
 
-        if duplicator_parent is not False:
-            if duplicator_parent == ob.parent:
-                duplicator_parent = False
-            else:
-                arnold.AiMsgDebug(b"    skip (duplicator child)")
+            if ob.hide_render or not in_layers(ob):
+                arnold.AiMsgDebug(b"    skip (hidden)")
                 continue
 
-        if ob.is_duplicator:
-            duplicators.append(ob)
-            if ob.dupli_type in {'VERTS', 'FACES'}:
-                duplicator_parent = ob.parent
-            arnold.AiMsgDebug(b"    skip (duplicator)")
-            continue
-
-        if ob.type in _CT:
-            name = None
-
-            particle_systems = [
-                (m, m.particle_system) for m in ob.modifiers
-                if m.type == 'PARTICLE_SYSTEM' and m.show_render
-            ]
-            if particle_systems:
-                use_render_emitter = False
-                for mod, ps in particle_systems:
-                    pss = ps.settings
-                    if pss.use_render_emitter:
-                        use_render_emitter = True
-                    node = None
-                    if pss.type == 'HAIR' and pss.render_type == 'PATH':
-                        node = _AiCurvesPS(scene, ob, mod, ps, pss, shaders)
-                    elif pss.type == 'EMITTER' and pss.render_type in {'HALO', 'LINE', 'PATH'}:
-                        node = _AiPointsPS(scene, ob, ps, pss, scene.frame_current, shaders)
-                    if node is not None:
-                        if name is None:
-                            name = _Name(ob.name)
-                        arnold.AiNodeSetStr(node, "name", "%s&PS:%s" % (name, _RN.sub("_", ps.name)))
-                if not use_render_emitter:
+            if duplicator_parent is not False:
+                if duplicator_parent == ob.parent:
+                    duplicator_parent = False
+                else:
+                    arnold.AiMsgDebug(b"    skip (duplicator child)")
                     continue
 
-            if name is None:
-                name = _Name(ob.name)
+            if ob.is_duplicator:
+                duplicators.append(ob)
+                if ob.dupli_type in {'VERTS', 'FACES'}:
+                    duplicator_parent = ob.parent
+                arnold.AiMsgDebug(b"    skip (duplicator)")
+                continue
 
-            modified = ob.is_modified(scene, 'RENDER')
-            if not modified:
-                inode = inodes.get(ob.data)
+            if ob.type in _CT:
+                name = None
+
+                particle_systems = [
+                    (m, m.particle_system) for m in ob.modifiers
+                    if m.type == 'PARTICLE_SYSTEM' and m.show_render
+                ]
+                if particle_systems:
+                    static = False
+                    use_render_emitter = False
+                    for mod, ps in particle_systems:
+                        pss = ps.settings
+                        if pss.use_render_emitter:
+                            use_render_emitter = True
+                        node = None
+                        if pss.type == 'HAIR' and pss.render_type == 'PATH':
+                            node = _AiCurvesPS(scene, ob, mod, ps, pss, shaders)
+                        elif pss.type == 'EMITTER' and pss.render_type in {'HALO', 'LINE', 'PATH'}:
+                            node = _AiPointsPS(scene, ob, ps, pss, scene.frame_current, shaders)
+                        if node is not None:
+                            if name is None:
+                                name = _Name(ob.name)
+                            arnold.AiNodeSetStr(node, "name", "%s&PS:%s" % (name, _RN.sub("_", ps.name)))
+                    if not use_render_emitter:
+                        continue
+
+                if name is None:
+                    name = _Name(ob.name)
+
+                modified = ob.is_modified(scene, 'RENDER')
+                subdiv = _SubdivParams(ob.arnold)
+                mkey = None
+                if not modified:
+                    inode = inodes.get((ob.data, subdiv))
+                else:
+                    # same data with the same modifiers stack gives the same shape
+                    sig = _ModifiersSignature(ob)
+                    if sig is not None:
+                        mkey = (ob.data, sig, tuple(s.material for s in ob.material_slots), subdiv)
+                    inode = minodes.get(mkey)
                 if inode is not None:
-                    node = arnold.AiNode("ginstance")
-                    arnold.AiNodeSetStr(node, "name", name)
-                    arnold.AiNodeSetMatrix(node, "matrix", _AiMatrix(ob.matrix_world))
-                    arnold.AiNodeSetBool(node, "inherit_xform", False)
-                    arnold.AiNodeSetPtr(node, "node", inode)
-                    _export_object_properties(ob, node)
-                    arnold.AiMsgDebug(b"    instance (%S)", ob.data.name)
+                    if modified:
+                        # modifiers may be animated differently on the next frames
+                        static = False
+                    _Instance(ob, name, inode)
                     continue
 
-            with _Mesh(ob) as mesh:
-                if mesh is not None:
-                    # print("NEVERRRRRRRRRRRRRRRRRRRRR")
-                    node = _AiPolymesh(mesh, shaders)
-                    arnold.AiNodeSetStr(node, "name", name)
-                    arnold.AiNodeSetMatrix(node, "matrix", _AiMatrix(ob.matrix_world))
-                    _export_object_properties(ob, node)
-                    if not modified:
-                        # cache unmodified shapes for instancing
-                        inodes[ob.data] = node
-                    # cache for duplicators
-                    nodes[ob] = node
-        elif ob.type == 'LAMP':
-            lamp = ob.data
-            light = lamp.arnold
-            matrix = ob.matrix_world.copy()
-            if lamp.type == 'POINT':
-                node = arnold.AiNode("point_light")
-                arnold.AiNodeSetFlt(node, "radius", light.radius)
-                arnold.AiNodeSetStr(node, "decay_type", light.decay_type)
-                arnold.AiMsgDebug(b"    point_light")
-            elif lamp.type == 'SUN':
-                node = arnold.AiNode("distant_light")
-                arnold.AiNodeSetFlt(node, "angle", light.angle)
-                arnold.AiMsgDebug(b"    distant_light")
-            elif lamp.type == 'SPOT':
-                node = arnold.AiNode("spot_light")
-                arnold.AiNodeSetFlt(node, "radius", light.radius)
-                arnold.AiNodeSetFlt(node, "lens_radius", light.lens_radius)
-                arnold.AiNodeSetFlt(node, "cone_angle", math.degrees(lamp.spot_size))
-                arnold.AiNodeSetFlt(node, "penumbra_angle", light.penumbra_angle)
-                arnold.AiNodeSetFlt(node, "aspect_ratio", light.aspect_ratio)
-                arnold.AiNodeSetStr(node, "decay_type", light.decay_type)
-                arnold.AiMsgDebug(b"    spot_light")
-            elif lamp.type == 'HEMI':
-                node = arnold.AiNode("skydome_light")
-                arnold.AiNodeSetInt(node, "resolution", light.resolution)
-                arnold.AiNodeSetStr(node, "format", light.format)
-                arnold.AiMsgDebug(b"    skydome_light")
-            elif lamp.type == 'AREA':
-                node = arnold.AiNode(light.type)
-                if light.type == 'cylinder_light':
-                    top = arnold.AiArray(1, 1, arnold.AI_TYPE_VECTOR, arnold.AtVector(0, lamp.size_y / 2, 0))
-                    arnold.AiNodeSetArray(node, "top", top)
-                    bottom = arnold.AiArray(1, 1, arnold.AI_TYPE_VECTOR, arnold.AtVector(0, -lamp.size_y / 2, 0))
-                    arnold.AiNodeSetArray(node, "bottom", bottom)
-                    arnold.AiNodeSetFlt(node, "radius", lamp.size / 2)
+                with _Mesh(ob) as mesh:
+                    if mesh is not None:
+                        shape_keys = getattr(ob.data, "shape_keys", None)
+                        deforming = modified or shape_keys is not None
+                        if (proc_cache is not None and
+                                len(mesh.polygons) >= opts.proc_cache_polygons and
+                                ob.name not in light_meshes):
+                            if deforming:
+                                # procedurals are not updated between frames
+                                static = False
+                            node, new = _AiProcedural(mesh, shaders, ob.arnold, proc_cache, pnodes)
+                            if not new:
+                                _Instance(ob, name, node)
+                                continue
+                            deforming = False
+                        else:
+                            # the buffers read for the digest are the polymesh ones
+                            read = _MeshRead(mesh, shaders, modified)
+                            digest = None if read[0] is None else (read[0], subdiv)
+                            inode = dnodes.get(digest)
+                            if inode is not None:
+                                # the same evaluated mesh, but it may change
+                                # differently on the next frames
+                                static = False
+                                _Instance(ob, name, inode)
+                                if mkey is not None:
+                                    minodes[mkey] = inode
+                                continue
+                            # print("NEVERRRRRRRRRRRRRRRRRRRRR")
+                            node = _Polymesh(mesh, read)
+                            _export_object_properties(ob, node)
+                            if modified and digest is not None:
+                                dnodes[digest] = node
+                        arnold.AiNodeSetStr(node, "name", name)
+                        arnold.AiNodeSetMatrix(node, "matrix", _AiMatrix(ob.matrix_world))
+                        # cache shapes for instancing
+                        if not modified:
+                            inodes[(ob.data, subdiv)] = node
+                        elif mkey is not None:
+                            minodes[mkey] = node
+                        # cache for duplicators
+                        nodes[ob] = node
+                        snodes.append((ob.name, name, deforming))
+            elif ob.type == 'LAMP':
+                lamp = ob.data
+                light = lamp.arnold
+                matrix = ob.matrix_world.copy()
+                if lamp.type == 'POINT':
+                    node = arnold.AiNode("point_light")
+                    arnold.AiNodeSetFlt(node, "radius", light.radius)
                     arnold.AiNodeSetStr(node, "decay_type", light.decay_type)
-                elif light.type == 'disk_light':
-                    arnold.AiNodeSetFlt(node, "radius", lamp.size / 2)
-                    #arnold.AiNodeSetStr(node, "decay_type", light.decay_type)
-                elif light.type == 'quad_light':
-                    x = lamp.size / 2
-                    y = lamp.size_y / 2 if lamp.shape == 'RECTANGLE' else x
-                    verts = arnold.AiArrayAllocate(4, 1, arnold.AI_TYPE_VECTOR)
-                    arnold.AiArraySetVec(verts, 0, arnold.AtVector(-x, -y, 0))
-                    arnold.AiArraySetVec(verts, 1, arnold.AtVector(-x, y, 0))
-                    arnold.AiArraySetVec(verts, 2, arnold.AtVector(x, y, 0))
-                    arnold.AiArraySetVec(verts, 3, arnold.AtVector(x, -y, 0))
-                    arnold.AiNodeSetArray(node, "vertices", verts)
-                    arnold.AiNodeSetInt(node, "resolution", light.quad_resolution)
-                    #arnold.AiNodeSetStr(node, "decay_type", light.decay_type)
-                elif light.type == 'photometric_light':
-                    arnold.AiNodeSetStr(node, "filename", bpy.path.abspath(light.filename))
-                    matrix *= _MR
-                elif light.type == 'mesh_light':
+                    arnold.AiMsgDebug(b"    point_light")
+                elif lamp.type == 'SUN':
+                    node = arnold.AiNode("distant_light")
+                    arnold.AiNodeSetFlt(node, "angle", light.angle)
+                    arnold.AiMsgDebug(b"    distant_light")
+                elif lamp.type == 'SPOT':
+                    node = arnold.AiNode("spot_light")
+                    arnold.AiNodeSetFlt(node, "radius", light.radius)
+                    arnold.AiNodeSetFlt(node, "lens_radius", light.lens_radius)
+                    arnold.AiNodeSetFlt(node, "cone_angle", math.degrees(lamp.spot_size))
+                    arnold.AiNodeSetFlt(node, "penumbra_angle", light.penumbra_angle)
+                    arnold.AiNodeSetFlt(node, "aspect_ratio", light.aspect_ratio)
                     arnold.AiNodeSetStr(node, "decay_type", light.decay_type)
-                    if light.mesh:
-                        mesh_lights.append((node, light.mesh))
-            else:
-                arnold.AiMsgDebug(b"    skip (unsupported)")
-                continue
+                    arnold.AiMsgDebug(b"    spot_light")
+                elif lamp.type == 'HEMI':
+                    node = arnold.AiNode("skydome_light")
+                    arnold.AiNodeSetInt(node, "resolution", light.resolution)
+                    arnold.AiNodeSetStr(node, "format", light.format)
+                    arnold.AiMsgDebug(b"    skydome_light")
+                elif lamp.type == 'AREA':
+                    node = arnold.AiNode(light.type)
+                    if light.type == 'cylinder_light':
+                        top = arnold.AiArray(1, 1, arnold.AI_TYPE_VECTOR, arnold.AtVector(0, lamp.size_y / 2, 0))
+                        arnold.AiNodeSetArray(node, "top", top)
+                        bottom = arnold.AiArray(1, 1, arnold.AI_TYPE_VECTOR, arnold.AtVector(0, -lamp.size_y / 2, 0))
+                        arnold.AiNodeSetArray(node, "bottom", bottom)
+                        arnold.AiNodeSetFlt(node, "radius", lamp.size / 2)
+                        arnold.AiNodeSetStr(node, "decay_type", light.decay_type)
+                    elif light.type == 'disk_light':
+                        arnold.AiNodeSetFlt(node, "radius", lamp.size / 2)
+                        #arnold.AiNodeSetStr(node, "decay_type", light.decay_type)
+                    elif light.type == 'quad_light':
+                        x = lamp.size / 2
+                        y = lamp.size_y / 2 if lamp.shape == 'RECTANGLE' else x
+                        verts = arnold.AiArrayAllocate(4, 1, arnold.AI_TYPE_VECTOR)
+                        arnold.AiArraySetVec(verts, 0, arnold.AtVector(-x, -y, 0))
+                        arnold.AiArraySetVec(verts, 1, arnold.AtVector(-x, y, 0))
+                        arnold.AiArraySetVec(verts, 2, arnold.AtVector(x, y, 0))
+                        arnold.AiArraySetVec(verts, 3, arnold.AtVector(x, -y, 0))
+                        arnold.AiNodeSetArray(node, "vertices", verts)
+                        arnold.AiNodeSetInt(node, "resolution", light.quad_resolution)
+                        #arnold.AiNodeSetStr(node, "decay_type", light.decay_type)
+                    elif light.type == 'photometric_light':
+                        arnold.AiNodeSetStr(node, "filename", bpy.path.abspath(light.filename))
+                        matrix *= _MR
+                    elif light.type == 'mesh_light':
+                        arnold.AiNodeSetStr(node, "decay_type", light.decay_type)
+                        if light.mesh:
+                            mesh_lights.append((node, light.mesh))
+                else:
+                    arnold.AiMsgDebug(b"    skip (unsupported)")
+                    continue
 
-            name = _Name(ob.name)
-            arnold.AiNodeSetStr(node, "name", name)
-            color_node = None
-            if lamp.use_nodes:
-                filter_nodes = []
-                for _node in lamp.node_tree.nodes:
-                    if isinstance(_node, ArnoldNodeLightOutput) and _node.is_active:
-                        for input in _node.inputs:
-                            if input.is_linked:
-                                _node = _AiNode(input.links[0].from_node, name, lamp_nodes)
-                                if input.identifier == "color":
-                                    color_node = _node
-                                elif input.bl_idname == "ArnoldNodeSocketFilter":
-                                    filter_nodes.append(_node)
-                        break
-                if filter_nodes:
-                    filters = arnold.AiArray(len(filter_nodes), 1, arnold.AI_TYPE_NODE, *filter_nodes)
-                    arnold.AiNodeSetArray(node, "filters", filters)
-            if color_node is None:
-                arnold.AiNodeSetRGB(node, "color", *lamp.color)
+                name = _Name(ob.name)
+                arnold.AiNodeSetStr(node, "name", name)
+                snodes.append((ob.name, name, False))
+                color_node = None
+                if lamp.use_nodes:
+                    filter_nodes = []
+                    for _node in lamp.node_tree.nodes:
+                        if isinstance(_node, ArnoldNodeLightOutput) and _node.is_active:
+                            for input in _node.inputs:
+                                if input.is_linked:
+                                    _node = _AiNode(input.links[0].from_node, name, lamp_nodes, shaders.shared)
+                                    if input.identifier == "color":
+                                        color_node = _node
+                                    elif input.bl_idname == "ArnoldNodeSocketFilter":
+                                        filter_nodes.append(_node)
+                            break
+                    if filter_nodes:
+                        filters = arnold.AiArray(len(filter_nodes), 1, arnold.AI_TYPE_NODE, *filter_nodes)
+                        arnold.AiNodeSetArray(node, "filters", filters)
+                if color_node is None:
+                    arnold.AiNodeSetRGB(node, "color", *lamp.color)
+                else:
+                    arnold.AiNodeLink(color_node, "color", node)
+                arnold.AiNodeSetMatrix(node, "matrix", _AiMatrix(matrix))
+                arnold.AiNodeSetFlt(node, "intensity", light.intensity)
+                arnold.AiNodeSetFlt(node, "exposure", light.exposure)
+                arnold.AiNodeSetBool(node, "cast_shadows", light.cast_shadows)
+                arnold.AiNodeSetBool(node, "cast_volumetric_shadows", light.cast_volumetric_shadows)
+                arnold.AiNodeSetFlt(node, "shadow_density", light.shadow_density)
+                arnold.AiNodeSetRGB(node, "shadow_color", *light.shadow_color)
+                arnold.AiNodeSetInt(node, "samples", light.samples)
+                arnold.AiNodeSetBool(node, "normalize", light.normalize)
+                #arnold.AiNodeSetBool(node, "affect_diffuse", light.affect_diffuse)
+                # arnold.AiNodeSetBool(node, "affect_specular", light.affect_specular)
+                # arnold.AiNodeSetBool(node, "affect_volumetrics", light.affect_volumetrics)
+                arnold.AiNodeSetFlt(node, "diffuse", light.diffuse)
+                arnold.AiNodeSetFlt(node, "specular", light.specular)
+                arnold.AiNodeSetFlt(node, "sss", light.sss)
+                arnold.AiNodeSetFlt(node, "indirect", light.indirect)
+                arnold.AiNodeSetInt(node, "max_bounces", light.max_bounces)
+                arnold.AiNodeSetInt(node, "volume_samples", light.volume_samples)
+                arnold.AiNodeSetFlt(node, "volume", light.volume)
             else:
-                arnold.AiNodeLink(color_node, "color", node)
-            arnold.AiNodeSetMatrix(node, "matrix", _AiMatrix(matrix))
-            arnold.AiNodeSetFlt(node, "intensity", light.intensity)
-            arnold.AiNodeSetFlt(node, "exposure", light.exposure)
-            arnold.AiNodeSetBool(node, "cast_shadows", light.cast_shadows)
-            arnold.AiNodeSetBool(node, "cast_volumetric_shadows", light.cast_volumetric_shadows)
-            arnold.AiNodeSetFlt(node, "shadow_density", light.shadow_density)
-            arnold.AiNodeSetRGB(node, "shadow_color", *light.shadow_color)
-            arnold.AiNodeSetInt(node, "samples", light.samples)
-            arnold.AiNodeSetBool(node, "normalize", light.normalize)
-            #arnold.AiNodeSetBool(node, "affect_diffuse", light.affect_diffuse)
-            # arnold.AiNodeSetBool(node, "affect_specular", light.affect_specular)
-            # arnold.AiNodeSetBool(node, "affect_volumetrics", light.affect_volumetrics)
-            arnold.AiNodeSetFlt(node, "diffuse", light.diffuse)
-            arnold.AiNodeSetFlt(node, "specular", light.specular)
-            arnold.AiNodeSetFlt(node, "sss", light.sss)
-            arnold.AiNodeSetFlt(node, "indirect", light.indirect)
-            arnold.AiNodeSetInt(node, "max_bounces", light.max_bounces)
-            arnold.AiNodeSetInt(node, "volume_samples", light.volume_samples)
-            arnold.AiNodeSetFlt(node, "volume", light.volume)
-        else:
-            arnold.AiMsgDebug(b"    skip (unsupported)")
+                arnold.AiMsgDebug(b"    skip (unsupported)")
 
-    ##############################
-    ## duplicators
-    for duplicator in duplicators:
-        i = 0
-        pc = time.perf_counter()
-        arnold.AiMsgDebug(b"[DUPLI:%S:%S] '%S'", duplicator.type,
-                         duplicator.dupli_type, duplicator.name)
-        arnold.AiMsgTab(4)
-        duplicator.dupli_list_create(scene, 'RENDER')
-        try:
-            for d in duplicator.dupli_list:
-                ob = d.object
-                if not ob.hide_render and ob.dupli_type not in {'VERTS', 'FACES'} and ob.type in _CT:
-                    onode = nodes.get(ob)
-                    if onode is None:
-                        arnold.AiMsgDebug(b"[%S] '%S'", ob.type, ob.name)
-                        with _Mesh(ob) as mesh:
-                            if mesh is not None:
-                                print("TEEEEEEEHEEEEEEEEE")
-                                node = _AiPolymesh(mesh, shaders)
-                                arnold.AiNodeSetStr(node, "name", _Name(ob.name))
-                                arnold.AiNodeSetMatrix(node, "matrix", _AiMatrix(d.matrix))
-                                nodes[ob] = node
-                    else:
-                        node = arnold.AiNode("ginstance")
+        ##############################
+        ## duplicators
+        for duplicator in duplicators:
+            i = 0
+            pc = time.perf_counter()
+            arnold.AiMsgDebug(b"[DUPLI:%S:%S] '%S'", duplicator.type,
+                             duplicator.dupli_type, duplicator.name)
+            arnold.AiMsgTab(4)
+            duplicator.dupli_list_create(scene, 'RENDER')
+            try:
+                for d in duplicator.dupli_list:
+                    ob = d.object
+                    if not ob.hide_render and ob.dupli_type not in {'VERTS', 'FACES'} and ob.type in _CT:
+                        onode = nodes.get(ob)
+                        if onode is None:
+                            arnold.AiMsgDebug(b"[%S] '%S'", ob.type, ob.name)
+                            with _Mesh(ob) as mesh:
+                                if mesh is not None:
+                                    print("TEEEEEEEHEEEEEEEEE")
+                                    node = _Polymesh(mesh)
+                                    arnold.AiNodeSetStr(node, "name", _Name(ob.name))
+                                    arnold.AiNodeSetMatrix(node, "matrix", _AiMatrix(d.matrix))
+                                    nodes[ob] = node
+                        else:
+                            node = arnold.AiNode("ginstance")
+                            arnold.AiNodeSetStr(node, "name", _Name(ob.name))
+                            arnold.AiNodeSetMatrix(node, "matrix", _AiMatrix(d.matrix))
+                            arnold.AiNodeSetBool(node, "inherit_xform", False)
+                            arnold.AiNodeSetPtr(node, "node", onode)
+                            i += 1
+                        _export_object_properties(ob, node)
+                arnold.AiMsgDebug(b"instances %d (%f)", ctypes.c_int(i),
+                                 ctypes.c_double(time.perf_counter() - pc))
+            finally:
+                arnold.AiMsgTab(-4)
+                duplicator.dupli_list_clear()
+
+        ##############################
+        ## mesh lights
+        for light_node, name in mesh_lights:
+            ob = scene.objects.get(name)
+            if ob is None:
+                continue
+            node = nodes.get(ob)
+            if node is None:
+                if ob.type not in _CT:
+                    continue
+                arnold.AiMsgDebug(b"[%S] '%S'", ob.type, ob.name)
+                with _Mesh(ob) as mesh:
+                    if mesh is not None:
+                        print("LOLOLOLOLOLOLOLOLOLOL")
+                        node = _Polymesh(mesh)
                         arnold.AiNodeSetStr(node, "name", _Name(ob.name))
-                        arnold.AiNodeSetMatrix(node, "matrix", _AiMatrix(d.matrix))
-                        arnold.AiNodeSetBool(node, "inherit_xform", False)
-                        arnold.AiNodeSetPtr(node, "node", onode)
-                        i += 1
-                    _export_object_properties(ob, node)
-            arnold.AiMsgDebug(b"instances %d (%f)", ctypes.c_int(i),
-                             ctypes.c_double(time.perf_counter() - pc))
-        finally:
-            arnold.AiMsgTab(-4)
-            duplicator.dupli_list_clear()
+                        arnold.AiNodeSetMatrix(node, "matrix", _AiMatrix(ob.matrix_world))
+                        nodes[ob] = node
+            arnold.AiNodeSetPtr(light_node, "mesh", node)
 
-    ##############################
-    ## mesh lights
-    for light_node, name in mesh_lights:
-        ob = scene.objects.get(name)
-        if ob is None:
-            continue
-        node = nodes.get(ob)
-        if node is None:
-            if ob.type not in _CT:
-                continue
-            arnold.AiMsgDebug(b"[%S] '%S'", ob.type, ob.name)
-            with _Mesh(ob) as mesh:
-                if mesh is not None:
-                    print("LOLOLOLOLOLOLOLOLOLOL")
-                    node = _AiPolymesh(mesh, shaders)
-                    arnold.AiNodeSetStr(node, "name", _Name(ob.name))
-                    arnold.AiNodeSetMatrix(node, "matrix", _AiMatrix(ob.matrix_world))
-                    nodes[ob] = node
-        arnold.AiNodeSetPtr(light_node, "mesh", node)
+        ##############################
+        ## meshes
+        pc = time.perf_counter()
+        for node, job in jobs:
+            res, t = job.result()
+            timings[1] += t
+            _MeshNode(node, *res)
+            stats.mesh(arnold.AiNodeGetName(node), res[1], t)
+        timings[2] = time.perf_counter() - pc
+    finally:
+        pool.shutdown(wait=True)
+    stats.phase("meshes_read", timings[0])
+    stats.phase("meshes_build", timings[1])
+    stats.phase("meshes_nodes", timings[2])
+    arnold.AiMsgInfo(b"BARNOLD: meshes %d: read %fs, build %fs (threads), nodes %fs",
+                     ctypes.c_int(len(jobs)), *map(ctypes.c_double, timings))
+    del jobs
 
     render = scene.render
     aspect_x = render.pixel_aspect_x
@@ -770,6 +1334,8 @@ def _export(data, scene, camera, xres, yres, session=None):
     # offsets for border render
     xoff = 0
     yoff = 0
+    xmax = xres
+    ymax = yres
 
     ##############################
     ## options
@@ -782,8 +1348,10 @@ def _export(data, scene, camera, xres, yres, session=None):
         yoff = int(yres * render.border_min_y)
         arnold.AiNodeSetInt(options, "region_min_x", xoff)
         arnold.AiNodeSetInt(options, "region_min_y", yoff)
-        arnold.AiNodeSetInt(options, "region_max_x", int(xres * render.border_max_x) - 1)
-        arnold.AiNodeSetInt(options, "region_max_y", int(yres * render.border_max_y) - 1)
+        xmax = int(xres * render.border_max_x)
+        ymax = int(yres * render.border_max_y)
+        arnold.AiNodeSetInt(options, "region_max_x", xmax - 1)
+        arnold.AiNodeSetInt(options, "region_max_y", ymax - 1)
     if not opts.lock_sampling_pattern:
         arnold.AiNodeSetInt(options, "AA_seed", scene.frame_current)
     if opts.clamp_sample_values:
@@ -850,50 +1418,14 @@ def _export(data, scene, camera, xres, yres, session=None):
     ## camera
     if camera:
         name = "C::" + _RN.sub("_", camera.name)
-        mw = camera.matrix_world
-        cdata = camera.data
-        cp = cdata.arnold
         node = arnold.AiNode("persp_camera")
         arnold.AiNodeSetStr(node, "name", name)
-        arnold.AiNodeSetMatrix(node, "matrix", _AiMatrix(mw))
-        if cdata.sensor_fit == 'VERTICAL':
-            sw = cdata.sensor_height * xres / yres * aspect_x / aspect_y
-        else:
-            sw = cdata.sensor_width
-            if cdata.sensor_fit == 'AUTO':
-                x = xres * aspect_x
-                y = xres * aspect_y
-                if x < y:
-                    sw *= x / y
-        fov = math.degrees(2 * math.atan(sw / (2 * cdata.lens)))
-        arnold.AiNodeSetFlt(node, "fov", fov)
-        if cdata.dof_object:
-            dof = geometry.distance_point_to_plane(
-                mw.to_translation(),
-                cdata.dof_object.matrix_world.to_translation(),
-                mw.col[2][:3]
-            )
-        else:
-           dof = cdata.dof_distance
-        arnold.AiNodeSetFlt(node, "focus_distance", dof)
-        if cp.enable_dof:
-            arnold.AiNodeSetFlt(node, "aperture_size", cp.aperture_size)
-            arnold.AiNodeSetInt(node, "aperture_blades", cp.aperture_blades)
-            arnold.AiNodeSetFlt(node, "aperture_rotation", cp.aperture_rotation)
-            arnold.AiNodeSetFlt(node, "aperture_blade_curvature", cp.aperture_blade_curvature)
-            arnold.AiNodeSetFlt(node, "aperture_aspect_ratio", cp.aperture_aspect_ratio)
-        arnold.AiNodeSetFlt(node, "near_clip", cdata.clip_start)
-        arnold.AiNodeSetFlt(node, "far_clip", cdata.clip_end)
-        arnold.AiNodeSetFlt(node, "shutter_start", cp.shutter_start)
-        arnold.AiNodeSetFlt(node, "shutter_end", cp.shutter_end)
-        arnold.AiNodeSetStr(node, "shutter_type", cp.shutter_type)
-        arnold.AiNodeSetStr(node, "rolling_shutter", cp.rolling_shutter)
-        arnold.AiNodeSetFlt(node, "rolling_shutter_duration", cp.rolling_shutter_duration)
+        _export_camera_properties(camera, node, xres, yres, aspect_x, aspect_y)
         # TODO: camera shift
         if session is not None:
             arnold.AiNodeSetVec2(node, "screen_window_min", -1, 1)
             arnold.AiNodeSetVec2(node, "screen_window_max", 1, -1)
-        arnold.AiNodeSetFlt(node, "exposure", cp.exposure)
+            session["camera"] = name
         arnold.AiNodeSetPtr(options, "camera", node)
 
     ##############################
@@ -906,7 +1438,7 @@ def _export(data, scene, camera, xres, yres, session=None):
                     name = "W::" + _RN.sub("_", world.name)
                     for input in _node.inputs:
                         if input.is_linked:
-                            node = _AiNode(input.links[0].from_node, name, {})
+                            node = _AiNode(input.links[0].from_node, name, {}, shaders.shared)
                             if node:
                                 arnold.AiNodeSetPtr(options, input.identifier, node)
                     break
@@ -940,6 +1472,13 @@ def _export(data, scene, camera, xres, yres, session=None):
 
     display = arnold.AiNode("driver_display_callback")
     arnold.AiNodeSetStr(display, "name", "__driver")
+    # plugin builds without the float_output parameter send 8-bit buckets
+    float_output = opts.display_float
+    if float_output and not arnold.AiNodeEntryLookUpParameter(arnold.AiNodeGetNodeEntry(display), "float_output"):
+        arnold.AiMsgWarning(b"BARNOLD: display driver has no float output, 8-bit buckets are used")
+        float_output = False
+    if float_output:
+        arnold.AiNodeSetBool(display, "float_output", True)
     #arnold.AiNodeSetFlt(display, "gamma", opts.display_gamma)
     #arnold.AiNodeSetBool(display, "rgba_packing", False)
 
@@ -958,7 +1497,12 @@ def _export(data, scene, camera, xres, yres, session=None):
     AA_samples = opts.AA_samples
     if session is not None:
         session["display"] = display
+        session["float_output"] = float_output
         session["offset"] = xoff, yoff
+        session["size"] = xmax - xoff, ymax - yoff
+        session["nodes"] = snodes
+        session["shaders"] = shaders
+        session["static"] = static and not duplicators
         if opts.progressive_refinement:
             # print("YOU HAVE CHOOSEN TO BE PROGRESSIVE! WOO!")
             isl = opts.initial_sampling_level
@@ -966,22 +1510,189 @@ def _export(data, scene, camera, xres, yres, session=None):
             AA_samples = isl
     arnold.AiNodeSetInt(options, "AA_samples", AA_samples)
 
+    arnold.AiMsgInfo(b"BARNOLD: mesh cache: %d hits, %d misses, %d meshes (%.2fMb)",
+                     ctypes.c_int(_MESH_CACHE.hits), ctypes.c_int(_MESH_CACHE.misses),
+                     ctypes.c_int(len(_MESH_CACHE)), ctypes.c_double(_MESH_CACHE.size / 1048576))
+    if session is not None:
+        stats.count_nodes()
+    stats.phase("export", time.perf_counter() - export_pc)
     arnold.AiMsgDebug(b"BARNOLD: <<<")
 
 
-def export_ass(data, scene, camera, xres, yres, filepath, open_procs, binary):
+def _ass_chunks(scene, mode):
+    """Split the scene geometry into export chunks
+        mode:
+            'OBJECT' - chunk per object, 'GROUP' - chunk per first object group
+        returns:
+            [(chunk name, [Object])], [master Object]
+    """
+    layers = [i for i, j in enumerate(scene.layers) if j]
+    # meshes of the mesh lights are exported with the lights
+    light_meshes = _mesh_light_objects(scene)
+    chunks = collections.OrderedDict()  # {name: [Object]}
+    master = []
+    for ob in scene.objects:
+        if ob.hide_render or not any(ob.layers[i] for i in layers):
+            continue
+        # children of the vertices/faces duplicators follow their parent
+        parent = ob.parent
+        if parent is not None and parent.is_duplicator and parent.dupli_type in {'VERTS', 'FACES'}:
+            root = parent
+        else:
+            root = ob
+        if (root.type not in _CT and not root.is_duplicator) or root.name in light_meshes:
+            master.append(ob)
+            continue
+        if mode == 'GROUP':
+            name = root.users_group[0].name if root.users_group else "ungrouped"
+        else:
+            name = root.name
+        chunks.setdefault(name, []).append(ob)
+    return list(chunks.items()), master
+
+
+def export_ass(data, scene, camera, xres, yres, filepath, open_procs, binary,
+               chunks='NONE', compress=False):
+    """
+        chunks:
+            'NONE' - single file, 'OBJECT' or 'GROUP' - the geometry is written
+            into per object or per group files one at a time, the main file
+            loads them with the procedural nodes
+        compress:
+            write gzip compressed files (.ass.gz)
+    """
+    sequence_end()
+    ext = ".ass.gz" if compress else ".ass"
+    if compress and not filepath.endswith(".gz"):
+        filepath += ".gz"
+    if chunks == 'NONE':
+        arnold.AiBegin()
+        try:
+            _export(data, scene, camera, xres, yres)
+            arnold.AiASSWrite(filepath, arnold.AI_NODE_ALL, open_procs, binary)
+        finally:
+            arnold.AiEnd()
+        return
+
+    base = filepath[:-len(ext)] if filepath.endswith(ext) else os.path.splitext(filepath)[0]
+    chunks_dir = base + "_chunks"
+    os.makedirs(chunks_dir, exist_ok=True)
+    chunks, master = _ass_chunks(scene, chunks)
+
+    # every chunk is exported in its own universe, so only one chunk
+    # of geometry is in memory at a time
+    files = []
+    for i, (name, objects) in enumerate(chunks):
+        pc = time.perf_counter()
+        path = os.path.join(chunks_dir, "%04d_%s%s" % (i, _RN.sub("_", name), ext))
+        arnold.AiBegin()
+        try:
+            _export(data, scene, None, xres, yres, objects=objects)
+            arnold.AiASSWrite(path, arnold.AI_NODE_SHAPE | arnold.AI_NODE_SHADER, open_procs, binary)
+        finally:
+            arnold.AiEnd()
+        files.append((name, path))
+        arnold.AiMsgInfo(b"BARNOLD: chunk '%S' (%f)", name, ctypes.c_double(time.perf_counter() - pc))
+
     arnold.AiBegin()
     try:
-        _export(data, scene, camera, xres, yres)
+        _export(data, scene, camera, xres, yres, objects=master)
+        for i, (name, path) in enumerate(files):
+            node = arnold.AiNode("procedural")
+            arnold.AiNodeSetStr(node, "name", "P%d::%s" % (i, _RN.sub("_", name)))
+            arnold.AiNodeSetStr(node, "filename", path)
         arnold.AiASSWrite(filepath, arnold.AI_NODE_ALL, open_procs, binary)
     finally:
         arnold.AiEnd()
 
 
+def _update_frame(data, scene, camera, xres, yres, session):
+    """Push the changes of the next sequence frame into the live universe"""
+    pc = time.perf_counter()
+    arnold.AiMsgDebug(b"BARNOLD: frame %d >>>", ctypes.c_int(scene.frame_current))
+
+    shaders = session["shaders"]
+    objects = scene.objects
+    for ob_name, name, deforming in session["nodes"]:
+        ob = objects.get(ob_name)
+        node = arnold.AiNodeLookUpByName(name)
+        if ob is None or node is None:
+            continue
+        if ob.type == 'LAMP':
+            lamp = ob.data
+            light = lamp.arnold
+            matrix = ob.matrix_world.copy()
+            if lamp.type == 'AREA' and light.type == 'photometric_light':
+                matrix *= _MR
+            arnold.AiNodeSetMatrix(node, "matrix", _AiMatrix(matrix))
+            if not arnold.AiNodeIsLinked(node, "color"):
+                arnold.AiNodeSetRGB(node, "color", *lamp.color)
+            arnold.AiNodeSetFlt(node, "intensity", light.intensity)
+            arnold.AiNodeSetFlt(node, "exposure", light.exposure)
+            continue
+        if deforming:
+            mesh = ob.to_mesh(scene, True, 'RENDER', False)
+            if mesh is not None:
+                try:
+                    _AiPolymesh(mesh, shaders, node)
+                finally:
+                    data.meshes.remove(mesh)
+        arnold.AiNodeSetMatrix(node, "matrix", _AiMatrix(ob.matrix_world))
+
+    render = scene.render
+    if camera and "camera" in session:
+        node = arnold.AiNodeLookUpByName(session["camera"])
+        if node is not None:
+            _export_camera_properties(camera, node, xres, yres,
+                                      render.pixel_aspect_x, render.pixel_aspect_y)
+
+    opts = scene.arnold
+    options = arnold.AiUniverseGetOptions()
+    if not opts.lock_sampling_pattern:
+        arnold.AiNodeSetInt(options, "AA_seed", scene.frame_current)
+    ipr = session.get("ipr")
+    arnold.AiNodeSetInt(options, "AA_samples", ipr[0] if ipr else opts.AA_samples)
+
+    session["stats"].phase("export", time.perf_counter() - pc)
+    arnold.AiMsgDebug(b"BARNOLD: <<< (%f)", ctypes.c_double(time.perf_counter() - pc))
+
+
+@bpy.app.handlers.persistent
+def sequence_end(*args):
+    """End the universe kept for the next sequence frame, it's also
+    the render_cancel / render_complete handler: the animation render may
+    stop before the last frame"""
+    if _SEQUENCE.pop("session", None) is not None and arnold.AiUniverseIsActive():
+        arnold.AiEnd()
+
+
 def update(engine, data, scene):
     print("Arnold Engine Updating...")
     engine.use_highlight_tiles = True
-    engine._session = {}
+
+    # sequence render: the universe of the previous frame is still alive
+    session = _SEQUENCE.pop("session", None)
+    if session is not None:
+        if (engine.is_animation and
+                session["scene"] == scene.name and
+                session["frame"] + scene.frame_step == scene.frame_current and
+                arnold.AiUniverseIsActive()):
+            session["frame"] = scene.frame_current
+            session["stats"] = _Stats.Stats()
+            engine._session = session
+            _update_frame(data, scene,
+                          engine.camera_override,
+                          engine.resolution_x,
+                          engine.resolution_y,
+                          session)
+            return
+        arnold.AiEnd()
+
+    engine._session = {
+        "scene": scene.name,
+        "frame": scene.frame_current,
+        "stats": _Stats.Stats(),
+    }
     arnold.AiBegin()
     _export(data, scene,
             engine.camera_override,
@@ -994,9 +1705,12 @@ def render(engine, scene):
     try:
         session = engine._session
         xoff, yoff = session["offset"]
+        # linear float or 8-bit RGBA buckets
+        ctype = ctypes.c_float if session["float_output"] else ctypes.c_ubyte
 
-        _htiles = {}  # highlighted tiles
+        tiles = _Tiles.TileBuffer(engine, *session["size"], scene.arnold.display_interval)
         session["peak"] = 0  # memory peak usage
+        stats = session["stats"]
 
         def display_callback(x, y, width, height, buffer, data):
             _x = x - xoff
@@ -1004,242 +1718,475 @@ def render(engine, scene):
 
             if buffer:
                 try:
-                    result = _htiles.pop((_x, _y), None)
-                    if result is None:
-                        result = engine.begin_result(_x, _y, width, height)
-                    _buffer = ctypes.cast(buffer, ctypes.POINTER(ctypes.c_ubyte))
+                    _buffer = ctypes.cast(buffer, ctypes.POINTER(ctype))
                     rect = numpy.ctypeslib.as_array(_buffer, shape=(width * height, 4))
                     # TODO: gamma correction. need??? kick is darker
                     # set 1/2.2 the driver_display node by default
                     #rect **= 2.2
-                    result.layers[0].passes[0].rect = rect
-                    engine.end_result(result)
+                    flushed = tiles.write(_x, _y, width, height, rect)
                 finally:
                     arnold.AiFree(buffer)
+                stats.bucket()
             else:
-                result = engine.begin_result(_x, _y, width, height)
-                # TODO: sometimes highlighted tiles become empty
-                #engine.update_result(result)
-                _htiles[(_x, _y)] = result
+                tiles.highlight(_x, _y, width, height)
+                flushed = tiles.interval <= 0
 
             if engine.test_break():
                 arnold.AiRenderAbort()
-                while _htiles:
-                    (_x, _y), result = _htiles.popitem()
-                    engine.end_result(result, True)
+                tiles.cancel()
 
-            mem = session["mem"] = arnold.AiMsgUtilGetUsedMemory() / 1048576  # 1024*1024
-            peak = session["peak"] = max(session["peak"], mem)
-            engine.update_memory_stats(mem, peak)
+            # memory stats are sampled with the display updates
+            if flushed:
+                mem = session["mem"] = arnold.AiMsgUtilGetUsedMemory() / 1048576  # 1024*1024
+                peak = session["peak"] = max(session["peak"], mem)
+                stats.memory(mem)
+                engine.update_memory_stats(mem, peak)
 
         # display callback must be a variable
         cb = arnold.AtDisplayCallBack(display_callback)
         arnold.AiNodeSetPtr(session['display'], "callback", cb)
 
-        res = arnold.AiRender(arnold.AI_RENDER_MODE_CAMERA)
+        options = arnold.AiUniverseGetOptions()
+
+        def _render():
+            AA_samples = arnold.AiNodeGetInt(options, "AA_samples")
+            pc = time.perf_counter()
+            res = arnold.AiRender(arnold.AI_RENDER_MODE_CAMERA)
+            stats.render_pass(AA_samples, time.perf_counter() - pc, res)
+            return res
+
+        stats.render_start()
+        res = _render()
         if res != arnold.AI_SUCCESS:
             ipr = session.get("ipr")
             if ipr:
-                options = arnold.AiUniverseGetOptions()
                 for sl in range(*ipr):
                     arnold.AiNodeSetInt(options, "AA_samples", sl)
-                    res = arnold.AiRender(arnold.AI_RENDER_MODE_CAMERA)
+                    res = _render()
                     if res == arnold.AI_SUCCESS:
                         break
                     engine.update_stats("", "Mem: %.2fMb, SL: %d" % (session.get("mem", "NA"), sl))
+        tiles.flush()
+        stats.memory(arnold.AiMsgUtilGetUsedMemory() / 1048576)
+        engine.update_stats("", stats.summary())
+        if scene.arnold.write_stats:
+            path = os.path.splitext(scene.render.frame_path(scene.frame_current))[0]
+            stats.write(path + ".stats.json")
         if res != arnold.AI_SUCCESS:
             engine.error_set("Render status: %d" % res)
+        elif (scene.arnold.sequence_render and
+                engine.is_animation and
+                session["static"] and
+                scene.frame_current + scene.frame_step <= scene.frame_end):
+            # keep the universe alive for the next frame
+            _SEQUENCE["session"] = session
     except:
         # cancel render on error
         engine.end_result(None, True)
     finally:
         del engine._session
-        arnold.AiEnd()
+        if "session" not in _SEQUENCE:
+            arnold.AiEnd()
+
+
+def _ipr_shader(node, prefix, nodes):
+    """IPR description of the shader node tree
+    Args:
+        node (ArnoldNode): node.
+        prefix (str): node name prefix.
+        nodes (OrderedDict): described nodes {name: (type, params)}.
+    Returns:
+        str or None: node name
+    """
+    if not isinstance(node, ArnoldNode):
+        return None
+
+    name = "%s&N::%s" % (prefix, node.name)
+    if name not in nodes:
+        params = {'name': ('STRING', name)}
+        nodes[name] = (node.ai_name, params)
+        for input in node.inputs:
+            if input.is_linked:
+                _name = _ipr_shader(input.links[0].from_node, prefix, nodes)
+                if _name is not None:
+                    params[input.identifier] = ('LINK', _name)
+                    continue
+            if not input.hide_value:
+                v = input.default_value
+                if input.bl_idname in {'NodeSocketColor',
+                                       'NodeSocketVector',
+                                       'NodeSocketVectorXYZ',
+                                       'ArnoldNodeSocketColor'}:
+                    v = v[:]
+                params[input.identifier] = (input.bl_idname, v)
+        for n, (t, v) in node.ai_properties.items():
+            if t in {'RGB', 'RGBA', 'VECTOR'}:
+                v = v[:]
+            params[n] = (t, v)
+    return name
+
+
+def _ipr_material(mat, nodes):
+    """IPR description of the node material, returns the surface shader name"""
+    if mat and mat.use_nodes:
+        for n in mat.node_tree.nodes:
+            if isinstance(n, ArnoldNodeOutput) and n.is_active:
+                input = n.inputs[0]
+                if input.is_linked:
+                    return _ipr_shader(input.links[0].from_node, "M::" + mat.name, nodes)
+                break
+    return None
+
+
+def _ipr_light(ob, nodes):
+    """IPR description of the lamp"""
+    lamp = ob.data
+    light = lamp.arnold
+    matrix = ob.matrix_world.copy()
+    params = {}
+    if lamp.type == 'POINT':
+        ntype = "point_light"
+        params['radius'] = ('FLOAT', light.radius)
+        params['decay_type'] = ('STRING', light.decay_type)
+    elif lamp.type == 'SUN':
+        ntype = "distant_light"
+        params['angle'] = ('FLOAT', light.angle)
+    elif lamp.type == 'SPOT':
+        ntype = "spot_light"
+        params['radius'] = ('FLOAT', light.radius)
+        params['lens_radius'] = ('FLOAT', light.lens_radius)
+        params['cone_angle'] = ('FLOAT', math.degrees(lamp.spot_size))
+        params['penumbra_angle'] = ('FLOAT', light.penumbra_angle)
+        params['aspect_ratio'] = ('FLOAT', light.aspect_ratio)
+        params['decay_type'] = ('STRING', light.decay_type)
+    elif lamp.type == 'HEMI':
+        ntype = "skydome_light"
+        params['resolution'] = ('INT', light.resolution)
+        params['format'] = ('STRING', light.format)
+    elif lamp.type == 'AREA':
+        ntype = light.type
+        if ntype == 'cylinder_light':
+            y = lamp.size_y / 2
+            params['top'] = ('ARRAY', (arnold.AI_TYPE_VECTOR, numpy.array([0, y, 0], dtype=numpy.float32)))
+            params['bottom'] = ('ARRAY', (arnold.AI_TYPE_VECTOR, numpy.array([0, -y, 0], dtype=numpy.float32)))
+            params['radius'] = ('FLOAT', lamp.size / 2)
+            params['decay_type'] = ('STRING', light.decay_type)
+        elif ntype == 'disk_light':
+            params['radius'] = ('FLOAT', lamp.size / 2)
+        elif ntype == 'quad_light':
+            x = lamp.size / 2
+            y = lamp.size_y / 2 if lamp.shape == 'RECTANGLE' else x
+            verts = numpy.array([-x, -y, 0, -x, y, 0, x, y, 0, x, -y, 0], dtype=numpy.float32)
+            params['vertices'] = ('ARRAY', (arnold.AI_TYPE_VECTOR, verts))
+            params['resolution'] = ('INT', light.quad_resolution)
+        elif ntype == 'photometric_light':
+            params['filename'] = ('STRING', bpy.path.abspath(light.filename))
+            matrix *= _MR
+        else:
+            # TODO: mesh_light
+            return None
+    else:
+        return None
+
+    name = "L::" + ob.name
+    params['name'] = ('STRING', name)
+    params['color'] = ('RGB', lamp.color[:])
+    if lamp.use_nodes:
+        # TODO: light filters
+        for _node in lamp.node_tree.nodes:
+            if isinstance(_node, ArnoldNodeLightOutput) and _node.is_active:
+                input = _node.inputs.get("color")
+                if input is not None and input.is_linked:
+                    _name = _ipr_shader(input.links[0].from_node, name, nodes)
+                    if _name is not None:
+                        params['color'] = ('LINK', _name)
+                break
+    params['matrix'] = ('MATRIX', numpy.reshape(matrix.transposed(), -1))
+    params['intensity'] = ('FLOAT', light.intensity)
+    params['exposure'] = ('FLOAT', light.exposure)
+    params['cast_shadows'] = ('BOOL', light.cast_shadows)
+    params['cast_volumetric_shadows'] = ('BOOL', light.cast_volumetric_shadows)
+    params['shadow_density'] = ('FLOAT', light.shadow_density)
+    params['shadow_color'] = ('RGB', light.shadow_color[:])
+    params['samples'] = ('INT', light.samples)
+    params['normalize'] = ('BOOL', light.normalize)
+    params['diffuse'] = ('FLOAT', light.diffuse)
+    params['specular'] = ('FLOAT', light.specular)
+    params['sss'] = ('FLOAT', light.sss)
+    params['indirect'] = ('FLOAT', light.indirect)
+    params['max_bounces'] = ('INT', light.max_bounces)
+    params['volume_samples'] = ('INT', light.volume_samples)
+    params['volume'] = ('FLOAT', light.volume)
+    nodes[name] = (ntype, params)
+    return name
+
+
+def _ipr_mesh(mesh):
+    """IPR description of the mesh geometry"""
+    verts = mesh.vertices
+    polygons = mesh.polygons
+    loops = mesh.loops
+    vlist = numpy.ndarray(len(verts) * 3, dtype=numpy.float32)
+    verts.foreach_get("co", vlist)
+    nsides = numpy.ndarray(len(polygons), dtype=numpy.uint32)
+    polygons.foreach_get("loop_total", nsides)
+    vidxs = numpy.ndarray(len(loops), dtype=numpy.uint32)
+    polygons.foreach_get("vertices", vidxs)
+    return {
+        'vlist': ('ARRAY', (arnold.AI_TYPE_VECTOR, vlist)),
+        'nsides': ('ARRAY', (arnold.AI_TYPE_UINT, nsides)),
+        'vidxs': ('ARRAY', (arnold.AI_TYPE_UINT, vidxs)),
+        #'smoothing': ('BOOL', True),
+    }
+
+
+def _ipr_scene(scene, to_mesh, prev=None):
+    """IPR description of the scene objects, lights and materials
+    Args:
+        to_mesh (callable): context manager converting object to mesh.
+        prev (dict): previous description, geometry of objects without
+            data updates (Object.is_updated_data) is taken from it.
+    Returns:
+        OrderedDict: {name: (type, params)}
+    """
+    nodes = collections.OrderedDict()
+    for ob in scene.objects:
+        if not ob.is_visible(scene):
+            continue
+        if ob.type in _CT:
+            name = "O::" + ob.name
+            old = prev.get(name) if prev else None
+            if old is None or ob.is_updated_data:
+                with to_mesh(ob) as mesh:
+                    if mesh is None:
+                        continue
+                    params = _ipr_mesh(mesh)
+            else:
+                params = {k: old[1][k] for k in ('vlist', 'nsides', 'vidxs')}
+            params['name'] = ('STRING', name)
+            params['matrix'] = ('MATRIX', numpy.reshape(ob.matrix_world.transposed(), -1))
+            slots = ob.material_slots
+            shader = _ipr_material(slots[0].material, nodes) if slots else None
+            if shader is not None:
+                params['shader'] = ('NODE', shader)
+            nodes[name] = ('polymesh', params)
+        elif ob.type == 'LAMP':
+            _ipr_light(ob, nodes)
+    return nodes
+
+
+def _ipr_options(scene, nodes):
+    """IPR options, world shaders are added to nodes"""
+    opts = scene.arnold
+    options = {
+        'camera': ('NODE', '__camera'),
+        'thread_priority': ('STRING', opts.thread_priority),
+        'pin_threads': ('STRING', opts.pin_threads),
+        'abort_on_error': ('BOOL', opts.abort_on_error),
+        'abort_on_license_fail': ('BOOL', opts.abort_on_license_fail),
+        'skip_license_check': ('BOOL', opts.skip_license_check),
+        'error_color_bad_texture': ('RGB', opts.error_color_bad_texture[:]),
+        'error_color_bad_pixel': ('RGB', opts.error_color_bad_pixel[:]),
+        'error_color_bad_shader': ('RGB', opts.error_color_bad_shader[:]),
+        'bucket_size': ('INT', opts.ipr_bucket_size),
+        'bucket_scanning': ('STRING', opts.bucket_scanning),
+        'ignore_textures': ('BOOL', opts.ignore_textures),
+        'ignore_shaders': ('BOOL', opts.ignore_shaders),
+        'ignore_atmosphere': ('BOOL', opts.ignore_atmosphere),
+        'ignore_lights': ('BOOL', opts.ignore_lights),
+        'ignore_shadows': ('BOOL', opts.ignore_shadows),
+        #TODO: DELETE 'ignore_direct_lighting': ('BOOL', opts.ignore_direct_lighting),
+        'ignore_subdivision': ('BOOL', opts.ignore_subdivision),
+        'ignore_displacement': ('BOOL', opts.ignore_displacement),
+        'ignore_bump': ('BOOL', opts.ignore_bump),
+        'ignore_motion_blur': ('BOOL', opts.ignore_motion_blur),
+        'ignore_dof': ('BOOL', opts.ignore_dof),
+        'ignore_smoothing': ('BOOL', opts.ignore_smoothing),
+        'ignore_sss': ('BOOL', opts.ignore_sss),
+        # TODO: DELETE? 'auto_transparency_mode': ('STRING', opts.auto_transparency_mode),
+        'auto_transparency_depth': ('INT', opts.auto_transparency_depth),
+        # TODO: DELETE? 'auto_transparency_threshold': ('FLOAT', opts.auto_transparency_threshold),
+        'texture_max_open_files': ('INT', opts.texture_max_open_files),
+        'texture_max_memory_MB': ('FLOAT', opts.texture_max_memory_MB),
+        'texture_searchpath': ('STRING', opts.texture_searchpath),
+        'texture_automip': ('BOOL', opts.texture_automip),
+        'texture_autotile': ('INT', opts.texture_autotile),
+        'texture_accept_untiled': ('BOOL', opts.texture_accept_untiled),
+        'texture_accept_unmipped': ('BOOL', opts.texture_accept_unmipped),
+        # 'texture_specular_blur': ('FLOAT', opts.texture_specular_blur),
+        # 'texture_diffuse_blur': ('FLOAT', opts.texture_diffuse_blur),
+        'low_light_threshold': ('FLOAT', opts.low_light_threshold),
+        'GI_sss_samples': ('INT', opts.GI_sss_samples),
+        'sss_use_autobump': ('BOOL', opts.sss_use_autobump),
+        'GI_volume_samples': ('INT', opts.GI_volume_samples),
+        'max_subdivisions': ('BYTE', opts.max_subdivisions),
+        'procedural_searchpath': ('STRING', opts.procedural_searchpath),
+        'plugin_searchpath': ('STRING', opts.plugin_searchpath),
+        # TODO: DELETE? 'texture_gamma': ('FLOAT', opts.texture_gamma),
+        # TODO: DELETE? 'light_gamma': ('FLOAT', opts.light_gamma),
+        # TODO: DELETE? 'shader_gamma': ('FLOAT', opts.shader_gamma),
+        'GI_diffuse_depth': ('INT', opts.GI_diffuse_depth),
+        'GI_specular_depth': ('INT', opts.GI_specular_depth),
+        # TODO: DELETE? 'GI_reflection_depth': ('INT', opts.GI_reflection_depth),
+        'GI_transmission_depth': ('INT', opts.GI_transmission_depth),
+        'GI_volume_depth': ('INT', opts.GI_volume_depth),
+        'GI_total_depth': ('INT', opts.GI_total_depth),
+        'GI_diffuse_samples': ('INT', opts.GI_diffuse_samples),
+        'GI_specular_samples': ('INT', opts.GI_specular_samples),
+        'GI_transmission_samples': ('INT', opts.GI_transmission_samples),
+    }
+
+    world = scene.world
+    if world and world.use_nodes:
+        for _node in world.node_tree.nodes:
+            if isinstance(_node, ArnoldNodeWorldOutput) and _node.is_active:
+                for input in _node.inputs:
+                    if input.is_linked:
+                        name = _ipr_shader(input.links[0].from_node, "W::" + world.name, nodes)
+                        if name:
+                            options[input.identifier] = ('NODE', name)
+    return options
+
+
+def _ipr_equal(a, b):
+    # unchanged objects reuse the arrays of the previous scene description
+    if a is b:
+        return True
+    if isinstance(a, numpy.ndarray) or isinstance(b, numpy.ndarray):
+        return numpy.array_equal(a, b)
+    if isinstance(a, tuple) and isinstance(b, tuple):
+        return len(a) == len(b) and all(_ipr_equal(x, y) for x, y in zip(a, b))
+    return a == b
+
+
+def _ipr_diff(old, new):
+    """Changed node params, removed node references are set to None"""
+    params = {}
+    for n, (t, v) in new.items():
+        o = old.get(n)
+        if o is None or o[0] != t or not _ipr_equal(o[1], v):
+            params[n] = (t, v)
+    for n, (t, v) in old.items():
+        if n not in new and t in {'NODE', 'LINK'}:
+            params[n] = (t, None)
+    return params
+
+
+def _ipr_delta(ipr, nodes, options):
+    """Minimal update from the previous IPR scene description
+    Returns:
+        dict: {'remove': [name], 'add': [(type, params)],
+               'nodes': {name: params}, 'options': params}
+    """
+    data = {}
+    remove = []
+    add = []
+    changed = {}
+    for name, (t, params) in nodes.items():
+        old = ipr.nodes.get(name)
+        if old is None:
+            add.append((t, params))
+        elif old[0] != t:
+            remove.append(name)
+            add.append((t, params))
+        else:
+            params = _ipr_diff(old[1], params)
+            if params:
+                changed[name] = params
+    remove.extend(name for name in ipr.nodes if name not in nodes)
+    if remove:
+        data['remove'] = remove
+    if add:
+        data['add'] = add
+    if changed:
+        data['nodes'] = changed
+    options = _ipr_diff(ipr.options, options)
+    if options:
+        data['options'] = options
+    return data
 
 
 def view_update(engine, context):
     print(">>> view_update [%f]:" % time.clock(), engine)
     try:
-        ipr = getattr(engine, "_ipr", None)
-        if ipr is None:
-            blend_data = context.blend_data
-            scene = context.scene
-            region = context.region
-            v3d = context.space_data
-            rv3d = context.region_data
-
-            nodes = []
-            _nodes = {}
-
-            @contextmanager
-            def _to_mesh(ob):
-                pc = time.perf_counter()
-                mesh = ob.to_mesh(scene, True, 'PREVIEW', False)
-                if mesh is not None:
-                    try:
-                        mesh.calc_normals_split()
-                        print("    to_mesh (%f)" % (time.perf_counter() - pc))
-                        yield mesh
-                    finally:
-                        # it force call view_update
-                        blend_data.meshes.remove(mesh)
-                else:
-                    yield None
+        blend_data = context.blend_data
+        scene = context.scene
+        region = context.region
 
-            def _AiNode(node, prefix):
-                anode = _nodes.get(node)
-                if anode is None and isinstance(node, ArnoldNode):
-                    params = {'name': ('STRING', "%s&N::%s" % (prefix, node.name))}
-                    for input in node.inputs:
-                        if input.is_linked:
-                            _anode = _AiNode(input.links[0].from_node, prefix)
-                            if _anode is not None:
-                                params[input.identifier] = ('LINK', _anode)
-                                continue
-                        if not input.hide_value:
-                            v = input.default_value
-                            if input.bl_idname in {'NodeSocketColor',
-                                                   'NodeSocketVector',
-                                                   'NodeSocketVectorXYZ',
-                                                   'ArnoldNodeSocketColor'}:
-                                v = v[:]
-                            params[input.identifier] = (input.bl_idname, v)
-                    for n, (t, v) in node.ai_properties.items():
-                        if t in {'RGB', 'RGBA', 'VECTOR'}:
-                            v = v[:]
-                        params[n] = (t, v)
-                    anode = (node.ai_name, params)
-                    _nodes[node] = anode
-                    nodes.append(anode)
-                return anode
+        @contextmanager
+        def _to_mesh(ob):
+            pc = time.perf_counter()
+            mesh = ob.to_mesh(scene, True, 'PREVIEW', False)
+            if mesh is not None:
+                try:
+                    mesh.calc_normals_split()
+                    print("    to_mesh (%f)" % (time.perf_counter() - pc))
+                    yield mesh
+                finally:
+                    # it force call view_update
+                    blend_data.meshes.remove(mesh)
+            else:
+                yield None
 
-            for ob in scene.objects:
-                if ob.is_visible(scene) and ob.type in _CT:
-                    with _to_mesh(ob) as mesh:
-                        if mesh is not None:
-                            verts = mesh.vertices
-                            polygons = mesh.polygons
-                            loops = mesh.loops
-                            vlist = numpy.ndarray(len(verts) * 3, dtype=numpy.float32)
-                            verts.foreach_get("co", vlist)
-                            nsides = numpy.ndarray(len(polygons), dtype=numpy.uint32)
-                            polygons.foreach_get("loop_total", nsides)
-                            vidxs = numpy.ndarray(len(loops), dtype=numpy.uint32)
-                            polygons.foreach_get("vertices", vidxs)
-                            nodes.append(('polymesh', {
-                                'name': ('STRING', "O::" + ob.name),
-                                'matrix': ('MATRIX', numpy.reshape(ob.matrix_world.transposed(), -1)),
-                                'vlist': ('ARRAY', (arnold.AI_TYPE_VECTOR, vlist)),
-                                'nsides': ('ARRAY', (arnold.AI_TYPE_UINT, nsides)),
-                                'vidxs': ('ARRAY', (arnold.AI_TYPE_UINT, vidxs)),
-                                #'smoothing': ('BOOL', True),
-                            }))
-
-            #####################################
-            ## camera
-            view_matrix = rv3d.view_matrix.copy()
-            _camera = {
-                'name': ('STRING', '__camera'),
-                'matrix': ('MATRIX', numpy.reshape(view_matrix.inverted().transposed(), -1)),
-            }
-            view_perspective = rv3d.view_perspective
-            if view_perspective == 'CAMERA':
-                camera_data = _view_update_camera(region.width / region.height, v3d, rv3d, _camera)
-            elif view_perspective == 'PERSP':
-                camera_data = _view_update_persp(v3d, _camera)
-            else:  # view_perspective == 'PERSP'
-                pass
-            camera = ('persp_camera', _camera)
-            nodes.append(camera)
-
-            #####################################
-            ## options
-            opts = scene.arnold
-            options = {
-                'camera': ('NODE', camera),
-                'thread_priority': ('STRING', opts.thread_priority),
-                'pin_threads': ('STRING', opts.pin_threads),
-                'abort_on_error': ('BOOL', opts.abort_on_error),
-                'abort_on_license_fail': ('BOOL', opts.abort_on_license_fail),
-                'skip_license_check': ('BOOL', opts.skip_license_check),
-                'error_color_bad_texture': ('RGB', opts.error_color_bad_texture[:]),
-                'error_color_bad_pixel': ('RGB', opts.error_color_bad_pixel[:]),
-                'error_color_bad_shader': ('RGB', opts.error_color_bad_shader[:]),
-                'bucket_size': ('INT', opts.ipr_bucket_size),
-                'bucket_scanning': ('STRING', opts.bucket_scanning),
-                'ignore_textures': ('BOOL', opts.ignore_textures),
-                'ignore_shaders': ('BOOL', opts.ignore_shaders),
-                'ignore_atmosphere': ('BOOL', opts.ignore_atmosphere),
-                'ignore_lights': ('BOOL', opts.ignore_lights),
-                'ignore_shadows': ('BOOL', opts.ignore_shadows),
-                #TODO: DELETE 'ignore_direct_lighting': ('BOOL', opts.ignore_direct_lighting),
-                'ignore_subdivision': ('BOOL', opts.ignore_subdivision),
-                'ignore_displacement': ('BOOL', opts.ignore_displacement),
-                'ignore_bump': ('BOOL', opts.ignore_bump),
-                'ignore_motion_blur': ('BOOL', opts.ignore_motion_blur),
-                'ignore_dof': ('BOOL', opts.ignore_dof),
-                'ignore_smoothing': ('BOOL', opts.ignore_smoothing),
-                'ignore_sss': ('BOOL', opts.ignore_sss),
-                # TODO: DELETE? 'auto_transparency_mode': ('STRING', opts.auto_transparency_mode),
-                'auto_transparency_depth': ('INT', opts.auto_transparency_depth),
-                # TODO: DELETE? 'auto_transparency_threshold': ('FLOAT', opts.auto_transparency_threshold),
-                'texture_max_open_files': ('INT', opts.texture_max_open_files),
-                'texture_max_memory_MB': ('FLOAT', opts.texture_max_memory_MB),
-                'texture_searchpath': ('STRING', opts.texture_searchpath),
-                'texture_automip': ('BOOL', opts.texture_automip),
-                'texture_autotile': ('INT', opts.texture_autotile),
-                'texture_accept_untiled': ('BOOL', opts.texture_accept_untiled),
-                'texture_accept_unmipped': ('BOOL', opts.texture_accept_unmipped),
-                # 'texture_specular_blur': ('FLOAT', opts.texture_specular_blur),
-                # 'texture_diffuse_blur': ('FLOAT', opts.texture_diffuse_blur),
-                'low_light_threshold': ('FLOAT', opts.low_light_threshold),
-                'GI_sss_samples': ('INT', opts.GI_sss_samples),
-                'sss_use_autobump': ('BOOL', opts.sss_use_autobump),
-                'GI_volume_samples': ('INT', opts.GI_volume_samples),
-                'max_subdivisions': ('BYTE', opts.max_subdivisions),
-                'procedural_searchpath': ('STRING', opts.procedural_searchpath),
-                'plugin_searchpath': ('STRING', opts.plugin_searchpath),
-                # TODO: DELETE? 'texture_gamma': ('FLOAT', opts.texture_gamma),
-                # TODO: DELETE? 'light_gamma': ('FLOAT', opts.light_gamma),
-                # TODO: DELETE? 'shader_gamma': ('FLOAT', opts.shader_gamma),
-                'GI_diffuse_depth': ('INT', opts.GI_diffuse_depth),
-                'GI_specular_depth': ('INT', opts.GI_specular_depth),
-                # TODO: DELETE? 'GI_reflection_depth': ('INT', opts.GI_reflection_depth),
-                'GI_transmission_depth': ('INT', opts.GI_transmission_depth),
-                'GI_volume_depth': ('INT', opts.GI_volume_depth),
-                'GI_total_depth': ('INT', opts.GI_total_depth),
-                'GI_diffuse_samples': ('INT', opts.GI_diffuse_samples),
-                'GI_specular_samples': ('INT', opts.GI_specular_samples),
-                'GI_transmission_samples': ('INT', opts.GI_transmission_samples),
-            }
-
-            #####################################
-            ## world
-            world = scene.world
-            if world and world.use_nodes:
-                for _node in world.node_tree.nodes:
-                    if isinstance(_node, ArnoldNodeWorldOutput) and _node.is_active:
-                        for input in _node.inputs:
-                            if input.is_linked:
-                                node = _AiNode(input.links[0].from_node, "W::" + world.name)
-                                if node:
-                                    options[input.identifier] = ('NODE', node)
-
-            # from pprint import pprint as pp
-            # pp(options)
-            # pp(nodes)
-
-            ipr = _IPR(engine, {
-                'options': options,
-                'nodes': nodes,
-                'sl': (opts.initial_sampling_level, opts.AA_samples)
-            }, region.width, region.height)
+        ipr = getattr(engine, "_ipr", None)
+        if ipr is not None:
+            # objects, lights and materials edits, only updated meshes are converted
+            nodes = _ipr_scene(scene, _to_mesh, ipr.nodes)
+            options = _ipr_options(scene, nodes)
+            data = _ipr_delta(ipr, nodes, options)
+            ipr.nodes = nodes
+            ipr.options = options
+            ipr.debounce = scene.arnold.ipr_debounce
+            latency = scene.arnold.ipr_latency
+            if latency != ipr.latency:
+                data['latency'] = ipr.latency = latency
+            if data:
+                ipr.update(region.width, region.height, data)
+            return
 
-            ipr.view_perspective = view_perspective
-            ipr.view_matrix = view_matrix
-            ipr.camera_data = camera_data
+        v3d = context.space_data
+        rv3d = context.region_data
+
+        nodes = _ipr_scene(scene, _to_mesh)
+        options = _ipr_options(scene, nodes)
 
-            engine._ipr = ipr
+        #####################################
+        ## camera
+        view_matrix = rv3d.view_matrix.copy()
+        _camera = {
+            'name': ('STRING', '__camera'),
+            'matrix': ('MATRIX', numpy.reshape(view_matrix.inverted().transposed(), -1)),
+        }
+        view_perspective = rv3d.view_perspective
+        if view_perspective == 'CAMERA':
+            camera_data = _view_update_camera(region.width / region.height, v3d, rv3d, _camera)
+        elif view_perspective == 'PERSP':
+            camera_data = _view_update_persp(v3d, _camera)
+        else:  # view_perspective == 'PERSP'
+            pass
+        camera = ('persp_camera', _camera)
+
+        # from pprint import pprint as pp
+        # pp(options)
+        # pp(nodes)
+
+        opts = scene.arnold
+        ipr = _IPR(engine, {
+            'options': dict(options),
+            'add': list(nodes.values()) + [camera],
+            'sl': (opts.initial_sampling_level, opts.AA_samples),
+            'latency': opts.ipr_latency,
+            'debounce': opts.ipr_debounce,
+        }, region.width, region.height)
+
+        ipr.view_perspective = view_perspective
+        ipr.view_matrix = view_matrix
+        ipr.camera_data = camera_data
+        ipr.nodes = nodes
+        ipr.options = options
+        ipr.latency = opts.ipr_latency
+
+        engine._ipr = ipr
     except:
         print("~" * 30)
         traceback.print_exc()
@@ -1297,17 +2244,61 @@ def view_draw(engine, context):
             data.setdefault('nodes', {})['__camera'] = _camera
 
         (width, height), rect = ipr.update(width, height, data)
+        xmin, ymin, xmax, ymax = ipr.dirty_region()
+
+        # persistent texture, only the region updated by the buckets is uploaded
+        texture = getattr(ipr, "texture", None)
+        if texture is None or texture[1] != (width, height):
+            if texture is not None:
+                bgl.glDeleteTextures(1, texture[0])
+            tex = bgl.Buffer(bgl.GL_INT, 1)
+            pixels = bgl.Buffer(bgl.GL_BYTE, [height, width, 4])
+            bgl.glGenTextures(1, tex)
+            bgl.glBindTexture(bgl.GL_TEXTURE_2D, tex[0])
+            bgl.glTexParameteri(bgl.GL_TEXTURE_2D, bgl.GL_TEXTURE_MIN_FILTER, bgl.GL_NEAREST)
+            bgl.glTexParameteri(bgl.GL_TEXTURE_2D, bgl.GL_TEXTURE_MAG_FILTER, bgl.GL_NEAREST)
+            bgl.glTexImage2D(bgl.GL_TEXTURE_2D, 0, bgl.GL_RGBA, width, height, 0,
+                             bgl.GL_RGBA, bgl.GL_UNSIGNED_BYTE, pixels)
+            texture = ipr.texture = (tex, (width, height), pixels,
+                                     _BLA.bgl_buffer_array(pixels, (height, width, 4)))
+            xmin, ymin, xmax, ymax = 0, 0, width, height
+        else:
+            bgl.glBindTexture(bgl.GL_TEXTURE_2D, texture[0][0])
+
+        # the region may be recorded for the previous viewport size
+        xmax = min(xmax, width)
+        ymax = min(ymax, height)
+        if xmin < xmax and ymin < ymax:
+            tex, size, pixels, a = texture
+            a[ymin:ymax, xmin:xmax] = rect[ymin:ymax, xmin:xmax]
+            bgl.glPixelStorei(bgl.GL_UNPACK_ROW_LENGTH, width)
+            bgl.glPixelStorei(bgl.GL_UNPACK_SKIP_PIXELS, xmin)
+            bgl.glPixelStorei(bgl.GL_UNPACK_SKIP_ROWS, ymin)
+            bgl.glTexSubImage2D(bgl.GL_TEXTURE_2D, 0, xmin, ymin, xmax - xmin, ymax - ymin,
+                                bgl.GL_RGBA, bgl.GL_UNSIGNED_BYTE, pixels)
+            bgl.glPixelStorei(bgl.GL_UNPACK_ROW_LENGTH, 0)
+            bgl.glPixelStorei(bgl.GL_UNPACK_SKIP_PIXELS, 0)
+            bgl.glPixelStorei(bgl.GL_UNPACK_SKIP_ROWS, 0)
 
         v = bgl.Buffer(bgl.GL_FLOAT, 4)
         bgl.glGetFloatv(bgl.GL_VIEWPORT, v)
         vw = v[2]
         vh = v[3]
-        bgl.glRasterPos2f(0, vh - 1.0)
-        bgl.glPixelZoom(vw / width, -vh / height)
-        bgl.glDrawPixels(width, height, bgl.GL_RGBA, bgl.GL_UNSIGNED_BYTE,
-                         bgl.Buffer(bgl.GL_BYTE, len(rect), rect))
-        bgl.glPixelZoom(1.0, 1.0)
-        bgl.glRasterPos2f(0, 0)
+        # texture rows go from top to bottom
+        bgl.glEnable(bgl.GL_TEXTURE_2D)
+        bgl.glColor4f(1.0, 1.0, 1.0, 1.0)
+        bgl.glBegin(bgl.GL_QUADS)
+        bgl.glTexCoord2f(0.0, 1.0)
+        bgl.glVertex2f(0.0, 0.0)
+        bgl.glTexCoord2f(1.0, 1.0)
+        bgl.glVertex2f(vw, 0.0)
+        bgl.glTexCoord2f(1.0, 0.0)
+        bgl.glVertex2f(vw, vh)
+        bgl.glTexCoord2f(0.0, 0.0)
+        bgl.glVertex2f(0.0, vh)
+        bgl.glEnd()
+        bgl.glBindTexture(bgl.GL_TEXTURE_2D, 0)
+        bgl.glDisable(bgl.GL_TEXTURE_2D)
     except:
         print("~" * 30)
         traceback.print_exc()
@@ -1318,9 +2309,21 @@ def free(engine):
     print(">>> free: [%f]:" % time.clock(), engine)
     if hasattr(engine, "_ipr"):
         engine._ipr.stop()
+        texture = getattr(engine._ipr, "texture", None)
+        if texture is not None:
+            bgl.glDeleteTextures(1, texture[0])
         del engine._ipr
 
 
+def ipr_prestart():
+    """Start idle IPR worker, arnold is loaded before the first viewport render"""
+    _IPR()
+
+
+def ipr_shutdown():
+    _ipr_shutdown()
+
+
 def _view_update_camera(aspect, v3d, rv3d, camera):
     zoom = rv3d.view_camera_zoom
     z = ((_SQRT2 + zoom / 50) ** 2) / 4
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+
+__doc__ = "numpy <-> arnold arrays bridge"
+
+import ctypes
+
+import numpy
+import arnold
+
+# {arnold type: (ctypes element type, components)}
+_TYPES = {
+    arnold.AI_TYPE_BYTE: (ctypes.c_uint8, 1),
+    arnold.AI_TYPE_INT: (ctypes.c_int32, 1),
+    arnold.AI_TYPE_UINT: (ctypes.c_uint32, 1),
+    arnold.AI_TYPE_FLOAT: (ctypes.c_float, 1),
+    arnold.AI_TYPE_VECTOR2: (ctypes.c_float, 2),
+    arnold.AI_TYPE_VECTOR: (ctypes.c_float, 3),
+    arnold.AI_TYPE_RGB: (ctypes.c_float, 3),
+    arnold.AI_TYPE_RGBA: (ctypes.c_float, 4),
+}
+
+
+class Mapping:
+    """Allocator of a numpy.ndarray backed by arnold array memory
+
+    Usage:
+        with Mapping(arnold.AI_TYPE_VECTOR) as alloc:
+            a = alloc([n, 3], numpy.float32)
+            ...  # fill a
+        array = alloc.array
+
+    The array memory is unmapped on exit, the view must not be used after it.
+    """
+
+    def __init__(self, type):
+        self.type = type
+        self.array = None
+
+    def __call__(self, shape, dtype=None):
+        ctype, size = _TYPES[self.type]
+        n = int(numpy.prod(shape))
+        self.array = arnold.AiArrayAllocate(n // size, 1, self.type)
+        if n == 0:
+            return numpy.ndarray(shape, dtype=ctype)
+        addr = arnold.AiArrayMap(self.array)
+        return numpy.ctypeslib.as_array((ctype * n).from_address(addr)).reshape(shape)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if self.array is not None:
+            arnold.AiArrayUnmap(self.array)
+
+
+def ndarray(n, type):
+    """Allocate flat numpy.ndarray for n elements of arnold type"""
+    ctype, size = _TYPES[type]
+    return numpy.ndarray(n * size, dtype=ctype)
+
+
+def array(n, type, fill):
+    """Allocate arnold array and fill its memory in place
+        n:
+            int
+            number of elements
+        type:
+            arnold.AI_TYPE_*
+        fill:
+            callable(numpy.ndarray)
+            called with a flat view of the array memory
+    """
+    ctype, size = _TYPES[type]
+    with Mapping(type) as alloc:
+        fill(alloc(n * size))
+    return alloc.array
+
+
+def from_collection(collection, attr, n, type):
+    """Read bpy collection attribute straight into arnold array memory"""
+    return array(n, type, lambda a: collection.foreach_get(attr, a))
+
+
+def arange(n):
+    """Arnold UINT array [0, n)"""
+    def _fill(a):
+        a[:] = numpy.arange(n, dtype=numpy.uint32)
+    return array(n, arnold.AI_TYPE_UINT, _fill)
+
+
+def nbytes(a):
+    """Memory size of numpy.ndarray or arnold array"""
+    if isinstance(a, numpy.ndarray):
+        return a.nbytes
+    ctype, size = _TYPES[arnold.AiArrayGetType(a)]
+    n = arnold.AiArrayGetNumElements(a) * arnold.AiArrayGetNumKeys(a)
+    return n * size * ctypes.sizeof(ctype)
+
+
+def convert(a, type):
+    """Copy numpy.ndarray to arnold array, arnold arrays are returned as is"""
+    if not isinstance(a, numpy.ndarray):
+        return a
+    ctype, size = _TYPES[type]
+    a = numpy.ascontiguousarray(a, dtype=ctype)
+    return arnold.AiArrayConvert(a.size // size, 1, type, ctypes.c_void_p(a.ctypes.data))
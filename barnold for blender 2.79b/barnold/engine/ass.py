@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+
+__doc__ = "ass files writer of the geometry cache"
+
+import gzip
+import os
+
+import numpy
+
+# polymesh arrays: (name, ass type, components, format)
+_ARRAYS = (
+    ('nsides', "UINT", 1, "%d"),
+    ('vidxs', "UINT", 1, "%d"),
+    ('vlist', "VECTOR", 3, "%.9g"),
+    ('nidxs', "UINT", 1, "%d"),
+    ('nlist', "VECTOR", 3, "%.9g"),
+    ('uvidxs', "UINT", 1, "%d"),
+    ('uvlist', "VECTOR2", 2, "%.9g"),
+    ('shidxs', "BYTE", 1, "%d"),
+)
+
+
+def _value(value):
+    if isinstance(value, bool):
+        return "on" if value else "off"
+    if isinstance(value, str):
+        return '"%s"' % value
+    return repr(value)
+
+
+def _array(f, param, a, type, size, fmt):
+    a = a.reshape(-1, size)
+    f.write((" %s %d 1 %s\n" % (param, len(a), type)).encode())
+    numpy.savetxt(f, a, fmt=fmt)
+
+
+def write_polymesh(path, name, arrays, params, uvmaps=None, shader=None):
+    """Write polymesh node into ascii .ass file, gzip compressed if the path ends with .gz
+        arrays:
+            {name: numpy.ndarray} flat polymesh arrays
+        params:
+            {name: bool | int | float | str} other polymesh parameters
+        uvmaps:
+            {name: (uvlist, uvidxs)} uv layers written as indexed user data
+        shader:
+            [str] names of the shader nodes, resolved when the file is loaded
+
+    The file is written under a temporary name and renamed, so renders
+    running at the same time never read a partial file.
+    """
+    tmp = "%s.%d.tmp" % (path, os.getpid())
+    f = gzip.open(tmp, "wb", 1) if path.endswith(".gz") else open(tmp, "wb")
+    try:
+        with f:
+            f.write(("polymesh\n{\n name %s\n" % name).encode())
+            for param, value in sorted(params.items()):
+                f.write((" %s %s\n" % (param, _value(value))).encode())
+            if shader:
+                f.write((" shader %d 1 NODE %s\n" % (
+                    len(shader), " ".join(_value(n) for n in shader))).encode())
+            for param, type, size, fmt in _ARRAYS:
+                a = arrays.get(param)
+                if a is not None:
+                    _array(f, param, a, type, size, fmt)
+            for param, (uvlist, uvidxs) in (uvmaps or {}).items():
+                f.write((" declare %s indexed VECTOR2\n" % param).encode())
+                _array(f, param, uvlist, "VECTOR2", 2, "%.9g")
+                _array(f, param + "idxs", uvidxs, "UINT", 1, "%d")
+            f.write(b"}\n")
+        os.replace(tmp, path)
+    except:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
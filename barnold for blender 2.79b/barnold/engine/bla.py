@@ -152,6 +152,53 @@ class _ChildParticle(ctypes.Structure):
     ]
 
 
+# <...>\source\blender\makesdna\DNA_particle_types.h
+class _ParticleKey(ctypes.Structure):
+    _fields_ = [
+        ("co", ctypes.c_float * 3),
+        ("vel", ctypes.c_float * 3),
+        ("rot", ctypes.c_float * 4),
+        ("ave", ctypes.c_float * 3),
+        ("time", ctypes.c_float)
+    ]
+
+
+# <...>\source\blender\makesdna\DNA_particle_types.h
+class _ParticleData(ctypes.Structure):
+    _fields_ = [
+        # current global coordinates
+        ("state", _ParticleKey),
+        # previous state
+        ("prev_state", _ParticleKey),
+        # hair vertices
+        ("hair", ctypes.c_void_p),
+        # keyed keys
+        ("keys", ctypes.c_void_p),
+        # boids data
+        ("boid", ctypes.c_void_p),
+        ("totkey", ctypes.c_int),
+        ("time", ctypes.c_float),
+        ("lifetime", ctypes.c_float),
+        ("dietime", ctypes.c_float),
+        # tessellated face index on the original mesh and on the final derived mesh
+        ("num", ctypes.c_int),
+        ("num_dmcache", ctypes.c_int),
+        # face vertex weights and offset
+        ("fuv", ctypes.c_float * 4),
+        ("foffset", ctypes.c_float),
+        ("size", ctypes.c_float),
+        ("sphdensity", ctypes.c_float),
+        ("pad", ctypes.c_int),
+        ("hair_index", ctypes.c_int),
+        ("flag", ctypes.c_short),
+        ("alive", ctypes.c_short)
+    ]
+
+
+# two keys, three pointers and 64 bytes of the scalar fields
+assert ctypes.sizeof(_ParticleData) == 2 * ctypes.sizeof(_ParticleKey) + 3 * ctypes.sizeof(ctypes.c_void_p) + 64
+
+
 # <...>\source\blender\makesdna\DNA_particle_types.h:264
 class _ParticleSystem(ctypes.Structure):
     pass
@@ -268,6 +315,58 @@ _PointCache._fields_ = [
 ]
 
 
+_KEY_FLOATS = ctypes.sizeof(_ParticleCacheKey) // ctypes.sizeof(ctypes.c_float)
+
+
+def _CacheKeys(cache, npts, steps):
+    """Strided views of the points cache coordinates
+        cache:
+            ctypes.POINTER(ctypes.POINTER(_ParticleCacheKey))
+            points cache
+        npts:
+            int
+            points number in cache.
+        steps:
+            int
+            keys number per point
+
+    Paths are allocated in buffers of consecutive keys, every run of
+    adjacent paths is returned as one view.
+        yields (i, numpy.ndarray([k, steps, 3], dtype='f'))
+    """
+    if npts <= 0:
+        return
+    p = ctypes.cast(cache, ctypes.POINTER(ctypes.c_size_t))
+    ptrs = numpy.ctypeslib.as_array(p, shape=(npts,)).astype(numpy.int64)
+    stride = steps * ctypes.sizeof(_ParticleCacheKey)
+    i = 0
+    for j in itertools.chain((numpy.flatnonzero(numpy.diff(ptrs) != stride) + 1).tolist(), [npts]):
+        k = j - i
+        keys = (ctypes.c_float * (k * steps * _KEY_FLOATS)).from_address(int(ptrs[i]))
+        yield i, numpy.ctypeslib.as_array(keys).reshape(k, steps, _KEY_FLOATS)[..., :3]
+        i = j
+
+
+def _CacheCopy(pts, n, cache, npts, steps, pad=0):
+    """Copy points cache to curve points
+        pts:
+            numpy.ndarray([x, steps + pad * 2, 3], dtype='f')
+        n:
+            int
+            position in pts array
+        pad:
+            int
+            number of repeated end points on both sides
+    """
+    for i, a in _CacheKeys(cache, npts, steps):
+        p = pts[n + i:n + i + len(a)]
+        p[:, pad:pad + steps] = a
+        if pad:
+            p[:, :pad] = a[:, :1]
+            p[:, -pad:] = a[:, -1:]
+    return n + max(npts, 0)
+
+
 def _BezierInterpolate(pts, n, cache, npts, steps, scale):
     """Interpolate points cache to bezier curve
         pts:
@@ -277,7 +376,7 @@ def _BezierInterpolate(pts, n, cache, npts, steps, scale):
             int
             position in pts array
         cache:
-            ctypes.POINTER(_ParticleCacheKey)
+            ctypes.POINTER(ctypes.POINTER(_ParticleCacheKey))
             points cache
         npts:
             int
@@ -286,28 +385,27 @@ def _BezierInterpolate(pts, n, cache, npts, steps, scale):
             float
             interpolation scale factor
     """
-    for i in range(npts):
-        c = cache[i]
-
-        a = _NDARRAY([steps, 3], dtype='f')
-        for j in range(steps):
-            a[j] = c[j].co
-
-        s = a[1:-1]
-        t = a[2:] - a[:-2]
-        t *= scale / _NORM(t, axis=1)[_S]  # tangents
-        m = _NORM(a[1:] - a[:-1], axis=1)[_S]  # magnitudes
-
-        pts[n, ::3] = a
-        pts[n, 1] = a[0] + (a[1] - a[0]) * scale
-        pts[n, -2] = a[-1] - (a[-1] - a[-2]) * scale
-        pts[n, 2:-3:3] = s - t * m[:-1]
-        pts[n, 4::3] = s + t * m[1:]
-        n += 1
-    return n
-
-
-def psys_get_curves(ps, steps, use_parent_particles, props):
+    for i, a in _CacheKeys(cache, npts, steps):
+        s = a[:, 1:-1]
+        t = a[:, 2:] - a[:, :-2]
+        t *= scale / _NORM(t, axis=2)[_S]  # tangents
+        m = _NORM(a[:, 1:] - a[:, :-1], axis=2)[_S]  # magnitudes
+
+        p = pts[n + i:n + i + len(a)]
+        p[:, ::3] = a
+        p[:, 1] = a[:, 0] + (a[:, 1] - a[:, 0]) * scale
+        p[:, -2] = a[:, -1] - (a[:, -1] - a[:, -2]) * scale
+        p[:, 2:-3:3] = s - t * m[:, :-1]
+        p[:, 4::3] = s + t * m[:, 1:]
+    return n + max(npts, 0)
+
+
+def psys_get_curves(ps, steps, use_parent_particles, props, alloc=_NDARRAY):
+    """Hair curves of the particle system
+        alloc:
+            callable(shape, dtype) -> numpy.ndarray
+            allocator for the points array
+    """
     nch = len(ps.child_particles)
     if nch == 0 or use_parent_particles:
         np = len(ps.particles)
@@ -326,7 +424,7 @@ def psys_get_curves(ps, steps, use_parent_particles, props):
 
     if props.basis == 'bezier':
         nsteps = steps * 3 - 2
-        points = _NDARRAY([tot, nsteps, 3], dtype=numpy.float32)
+        points = alloc([tot, nsteps, 3], numpy.float32)
         scale = props.bezier_scale
         if use_parent_particles:
             n = _BezierInterpolate(points, n, _ps.pathcache, np, steps, scale)
@@ -335,28 +433,11 @@ def psys_get_curves(ps, steps, use_parent_particles, props):
         return (points.reshape(-1, 3), numpy.tile(radius, tot), nsteps)
 
     if props.basis in {'b-spline', 'catmull-rom'}:
-        points = _NDARRAY([tot * (steps + 4), 3], dtype=numpy.float32)
+        points = alloc([tot * (steps + 4), 3], numpy.float32)
+        pts = points.reshape(tot, steps + 4, 3)
         if use_parent_particles:
-            _cache = _ps.pathcache
-            for i in range(np):
-                c = _cache[i]
-                points[n:n + 2] = c[0].co
-                n += 2
-                for j in range(steps):
-                    points[n] = c[j].co
-                    n += 1
-                points[n:n + 2] = points[n - 1]
-                n += 2
-        _cache = _ps.childcache
-        for i in range(nch):
-            c = _cache[i]
-            points[n:n + 2] = c[0].co
-            n += 2
-            for j in range(steps):
-                points[n] = c[j].co
-                n += 1
-            points[n: n + 2] = points[n - 1]
-            n += 2
+            n = _CacheCopy(pts, n, _ps.pathcache, np, steps, 2)
+        _CacheCopy(pts, n, _ps.childcache, nch, steps, 2)
         radius = numpy.ndarray(steps + 2, dtype=numpy.float32)
         radius[1:-1] = numpy.linspace(props.radius_root, props.radius_tip, steps, dtype=numpy.float32)
         radius[0] = 0
@@ -364,176 +445,322 @@ def psys_get_curves(ps, steps, use_parent_particles, props):
         return (points, numpy.tile(radius, tot), steps + 4)
 
     if props.basis == 'linear':
-        points = _NDARRAY([tot * steps, 3], dtype=numpy.float32)
+        points = alloc([tot * steps, 3], numpy.float32)
+        pts = points.reshape(tot, steps, 3)
         if use_parent_particles:
-            _cache = _ps.pathcache
-            for i in range(np):
-                c = _cache[i]
-                for j in range(steps):
-                    points[n] = c[j].co
-                    n += 1
-        _cache = _ps.childcache
-        for i in range(nch):
-            c = _cache[i]
-            for j in range(steps):
-                points[n] = c[j].co
-                n += 1
+            n = _CacheCopy(pts, n, _ps.pathcache, np, steps)
+        _CacheCopy(pts, n, _ps.childcache, nch, steps)
         radius = numpy.linspace(props.radius_root, props.radius_tip, steps, dtype=numpy.float32)
         return (points, numpy.tile(radius, tot), steps)
 
     return None
 
 
+def _StructField(addr, struct, n, field, shape=(), dtype=numpy.float32):
+    """Strided numpy.ndarray view of the field in C array of structures
+        shape:
+            tuple
+            field shape, one dimension at most
+    """
+    if n <= 0 or not addr:
+        return _NDARRAY((0, ) + shape, dtype=dtype)
+    stride = ctypes.sizeof(struct)
+    buf = (ctypes.c_byte * (n * stride)).from_address(addr)
+    strides = (stride, ) + (numpy.dtype(dtype).itemsize, ) * len(shape)
+    return _NDARRAY((n, ) + shape, dtype=dtype, buffer=buf, offset=getattr(struct, field).offset, strides=strides)
+
+
+def _TessfaceUVs(mesh, uvmap, faces, fuv):
+    """Interpolate tessellated faces uvs
+        faces:
+            numpy.ndarray([n], dtype=int)
+            face indices, negative for not found
+        fuv:
+            numpy.ndarray([n, 4], dtype='f')
+            face vertex weights
+    """
+    # <...>\source\blender\blenkernel\intern\particle.c: psys_interpolate_uvs
+    tessfaces = mesh.tessfaces
+    nf = len(tessfaces)
+    uvs = numpy.zeros((len(faces), 2), dtype=numpy.float32)
+    valid = (faces >= 0) & (faces < nf)
+    if nf == 0 or not valid.any():
+        return uvs
+    verts = _NDARRAY(nf * 4, dtype=numpy.uint32)
+    tessfaces.foreach_get("vertices_raw", verts)
+    uv = _NDARRAY(nf * 8, dtype=numpy.float32)
+    mesh.tessface_uv_textures[uvmap].data.foreach_get("uv_raw", uv)
+
+    f = faces[valid]
+    w = fuv[valid].copy()
+    w[:, 3] *= verts.reshape(-1, 4)[f, 3] != 0  # quads
+    uvs[valid] = numpy.einsum('ij,ijk->ik', w, uv.reshape(-1, 4, 2)[f])
+    return uvs
+
+
+def _ParticleDataCheck(ps, _ps, np):
+    """Compare the struct fields of the first and the last particles with
+    the rna values, False if the layout doesn't match the blender build"""
+    if np <= 0 or not _ps.particles:
+        return True
+    data = (_ParticleData * np).from_address(_ps.particles)
+    for i in {0, np - 1}:
+        p = ps.particles[i]
+        d = data[i]
+        if (numpy.float32(p.birth_time) != numpy.float32(d.time) or
+                numpy.float32(p.lifetime) != numpy.float32(d.lifetime) or
+                numpy.float32(p.die_time) != numpy.float32(d.dietime)):
+            return False
+    return True
+
+
+def psys_get_uvs(ob, mod, ps, pss, uvmap):
+    """Emitter uvs at the hair roots, ordered as psys_get_curves points
+        mod:
+            bpy.types.ParticleSystemModifier
+        uvmap:
+            str
+            emitter uv layer name
+    Returns:
+        numpy.ndarray([n, 2], dtype='f')
+    """
+    np = len(ps.particles)
+    nch = len(ps.child_particles)
+    use_parents = nch == 0 or pss.use_parent_particles
+    uvs = numpy.zeros((np * use_parents + nch, 2), dtype=numpy.float32)
+
+    _ps = _ParticleSystem.from_address(ps.as_pointer())
+    num = _StructField(_ps.particles, _ParticleData, np, "num", dtype=numpy.int32)
+    faces = _StructField(_ps.particles, _ParticleData, np, "num_dmcache", dtype=numpy.int32)
+    faces = numpy.where(faces == -1, num, faces)  # DMCACHE_NOTFOUND
+
+    # tessellated faces of the emitter are the ones of the final derived mesh
+    # only while no modifier precedes the particle system
+    mesh = ob.data
+    fast = (
+        _ParticleDataCheck(ps, _ps, np) and
+        pss.emit_from in {'FACE', 'VOLUME'} and
+        mesh.uv_layers.find(uvmap) >= 0 and
+        not any(m.show_render for m in ob.modifiers[:ob.modifiers.find(mod.name)])
+    )
+    if fast:
+        mesh.calc_tessface()
+        nf = len(mesh.tessfaces)
+        if use_parents or pss.child_type != 'INTERPOLATED':
+            fast = not len(faces) or (faces.min() >= 0 and faces.max() < nf)
+
+    if not fast:
+        uv_no = mesh.uv_layers.find(uvmap)
+        uv_on_emitter = ps.uv_on_emitter
+        n = 0
+        if use_parents:
+            for i, p in enumerate(ps.particles):
+                uvs[i] = uv_on_emitter(mod, p, i, uv_no)
+            n = np
+        if nch > 0:
+            particles = ps.particles
+            parent = _StructField(_ps.child, _ChildParticle, nch, "parent", dtype=numpy.int32)
+            for i, j in enumerate(parent.tolist(), np):
+                uvs[n] = uv_on_emitter(mod, particles[j], i, uv_no)
+                n += 1
+        return uvs
+
+    fuv = _StructField(_ps.particles, _ParticleData, np, "fuv", (4, ))
+    n = 0
+    if use_parents:
+        uvs[:np] = _TessfaceUVs(mesh, uvmap, faces, fuv)
+        n = np
+    if nch > 0:
+        # <...>\source\blender\makesrna\intern\rna_particle.c: rna_ParticleSystem_tessfaceidx_on_emitter
+        if pss.child_type == 'INTERPOLATED':
+            cfaces = _StructField(_ps.child, _ChildParticle, nch, "num", dtype=numpy.int32)
+            cfuv = _StructField(_ps.child, _ChildParticle, nch, "fuv", (4, ))
+        else:
+            parent = _StructField(_ps.child, _ChildParticle, nch, "parent", dtype=numpy.int32)
+            cfaces = faces[parent]
+            cfuv = fuv[parent]
+        uvs[n:] = _TessfaceUVs(mesh, uvmap, cfaces, cfuv)
+    return uvs
+
+
+def psys_frand_array(pss, seeds):
+    """Vectorized psys_frand
+        seeds:
+            numpy.ndarray of int
+    """
+    offset = PSYS_FRAND_SEED_OFFSET[pss.seed % PSYS_FRAND_COUNT]
+    multiplier = PSYS_FRAND_SEED_MULTIPLIER[pss.seed % PSYS_FRAND_COUNT]
+    # uint64 wraps around, but it doesn't change the result modulo 2^10
+    i = (numpy.uint64(offset) * seeds.astype(numpy.uint64) * numpy.uint64(multiplier)) % PSYS_FRAND_COUNT
+    return numpy.array(PSYS_FRAND_BASE, dtype=numpy.float32)[i.astype(numpy.intp)]
+
+
+def _ptcache_index(ps, totpart):
+    """Index of the particles point cache, built once per export
+    Returns:
+        (frames, keys, locs, vels)
+        frames: numpy.ndarray [nframes], cached frame numbers in list order
+        keys: numpy.ndarray [npoints], sorted (frame position * totpart + particle index)
+        locs, vels: numpy.ndarray [npoints, 3], ordered as keys
+    """
+    p_uint = ctypes.POINTER(ctypes.c_uint)
+    p_float = ctypes.POINTER(ctypes.c_float)
+
+    frames = []
+    keys = []
+    locs = []
+    vels = []
+
+    _cache = _PointCache.from_address(ps.point_cache.as_pointer())
+    _mem = ctypes.cast(_cache.mem_cache.first, ctypes.POINTER(_PTCacheMem))
+    f = 0
+    while _mem:
+        cur = _mem.contents
+        frames.append(cur.frame)
+        tp = cur.totpoint
+        data = cur.data
+        if tp > 0 and data[0]:
+            # <...>\source\blender\blenkernel\intern\pointcache.c: BPHYS_DATA_INDEX, _LOCATION, _VELOCITY
+            idxs = numpy.ctypeslib.as_array(ctypes.cast(data[0], p_uint), shape=(tp,))
+            keys.append(idxs.astype(numpy.int64) + f * totpart)
+            locs.append(numpy.ctypeslib.as_array(ctypes.cast(data[1], p_float), shape=(tp, 3)).copy())
+            if data[2]:
+                vels.append(numpy.ctypeslib.as_array(ctypes.cast(data[2], p_float), shape=(tp, 3)).copy())
+            else:
+                vels.append(numpy.zeros((tp, 3), dtype=numpy.float32))
+        f += 1
+        _mem = cur.next
+
+    frames = numpy.array(frames, dtype=numpy.float64)
+    if not keys:
+        return frames, numpy.ndarray(0, dtype=numpy.int64), None, None
+    keys = numpy.concatenate(keys)
+    order = numpy.argsort(keys, kind='mergesort')
+    return frames, keys[order], numpy.concatenate(locs)[order], numpy.concatenate(vels)[order]
+
+
+def _ptcache_lookup(keys, q):
+    """Positions of query keys in the sorted keys array and found mask"""
+    i = numpy.searchsorted(keys, q)
+    i[i >= len(keys)] = 0
+    found = keys[i] == q if len(keys) else numpy.zeros(len(q), dtype=numpy.bool_)
+    return i, found
+
+
+def _psys_get_trails(ps, pss, frame_current):
+    """Particles trail points interpolated from the point cache"""
+    trail_count = pss.trail_count
+    path_end = pss.path_end
+    randlength = pss.length_random
+    use_absolute_path_time = pss.use_absolute_path_time
+    time_tweak = pss.time_tweak
+
+    particles = ps.particles
+    n = len(particles)
+    birth = _NDARRAY(n, dtype=numpy.float32)
+    particles.foreach_get("birth_time", birth)
+    die = _NDARRAY(n, dtype=numpy.float32)
+    particles.foreach_get("die_time", die)
+    lifetime = _NDARRAY(n, dtype=numpy.float32)
+    particles.foreach_get("lifetime", lifetime)
+    birth = birth.astype(numpy.float64)[:, numpy.newaxis]
+    die = die.astype(numpy.float64)[:, numpy.newaxis]
+
+    # <...>\source\blender\editors\space_view3d\drawobject.c:5354
+    length = numpy.full(n, path_end, dtype=numpy.float64)
+    tc = numpy.full(n, trail_count if trail_count else 1.0, dtype=numpy.float64)
+    if randlength > 0:
+        r_length = psys_frand_array(pss, numpy.arange(n) + 22)
+        tc = trail_count * (1.0 - randlength * r_length)
+        tc[tc == 0] = 1.0
+        length = path_end * (1.0 - randlength * r_length)
+    if use_absolute_path_time:
+        _ct = numpy.full(n, frame_current - path_end, dtype=numpy.float64)
+    else:
+        pa_time = (frame_current - birth[:, 0]) / lifetime
+        _ct = pa_time - length
+
+    # <...>\source\blender\editors\space_view3d\drawobject.c:5404
+    j = numpy.arange(1, trail_count + 1, dtype=numpy.float64)
+    ct = _ct[:, numpy.newaxis] + (j / tc[:, numpy.newaxis]) * length[:, numpy.newaxis]
+    if use_absolute_path_time:
+        valid = (birth <= ct) & (ct <= die)
+        t = ct
+    else:
+        valid = (0 <= ct) & (ct <= 1)
+        t = birth + ct * (die - birth)
+    a = numpy.broadcast_to(numpy.arange(n)[:, numpy.newaxis], t.shape)[valid]
+    t = t[valid]
+
+    # <...>\source\blender\blenkernel\intern\particle.c:839
+    frames, keys, locs, vels = _ptcache_index(ps, n)
+    fi = numpy.searchsorted(frames, t)  # first cached frame >= t
+    m = fi < len(frames)
+    a, t, fi = a[m], t[m], fi[m]
+    i, found = _ptcache_lookup(keys, fi * n + a)
+    a, t, fi, i = a[found], t[found], fi[found], i[found]
+    co = locs[i].astype(numpy.float64) if len(i) else numpy.ndarray([0, 3])
+
+    # <...>\source\blender\blenkernel\intern\particle.c:1118
+    pfi = fi - 1
+    pi, pfound = _ptcache_lookup(keys, pfi * n + a)
+    pfound &= pfi >= 0
+    if pfound.any():
+        k = pfound
+        pi = pi[k]
+        cf = frames[fi[k]]
+        pf = frames[pfi[k]]
+        dfra = cf - pf
+        kt = ((t[k] - pf) / dfra)[:, numpy.newaxis]
+
+        # <...>\source\blender\blenkernel\intern\particle.c:1123
+        invdt = (dfra * 0.04 * time_tweak)[:, numpy.newaxis]
+        v = vels[i[k]] * invdt
+        pv = vels[pi] * invdt
+        pco = locs[pi]
+
+        # <...>\source\blender\blenlib\intern\math_geom.c:3283
+        t2 = kt * kt
+        t3 = t2 * kt
+        c = pco - co[k]
+        _a = pv + v + 2 * c
+        _b = -2 * pv - v - 3 * c
+        co[k] = _a * t3 + _b * t2 + pv * kt + pco
+    return co.astype(numpy.float32)
+
+
 def psys_get_points(ps, pss, frame_current):
     nch = len(ps.child_particles)
     trail_count = pss.trail_count
     if trail_count > 1:
-        def _it():
-            path_end = pss.path_end
-            randlength = pss.length_random
-            use_absolute_path_time = pss.use_absolute_path_time
-            time_tweak = pss.time_tweak
-
-            length = path_end
-            if use_absolute_path_time:
-                _ct = frame_current - length
-            tc = trail_count if trail_count else 1.0
-
-            cast = ctypes.cast
-            p_uint = ctypes.POINTER(ctypes.c_uint)
-            p_float3 = ctypes.POINTER(ctypes.c_float * 3)
-
-            _cache = _PointCache.from_address(ps.point_cache.as_pointer())
-            _mem = ctypes.cast(_cache.mem_cache.first, ctypes.POINTER(_PTCacheMem))
-
-            #def parts():
-            #    i = 0
-            #    particles = ps.particles
-            #    if nch == 0 or pss.use_parent_particles:
-            #        for p in particles:
-            #            # <...>\source\blender\editors\space_view3d\drawobject.c:5354
-            #            bt = p.birth_time
-            #            yield (i, bt, p.die_time, (frame_current - bt) / p.lifetime)
-            #            i += 1
-            #    PART_CHILD_FACES = (pss.child_type == 'INTERPOLATED')
-            #    for c, p in enumerate(ps.child_particles):
-            #        cpa = _ChildParticle.from_address(p.as_pointer())
-            #        # <...>\source\blender\blenkernel\intern\particle.c:3561
-            #        if PART_CHILD_FACES:
-            #            bt = 0.0
-            #            cpaw = cpa.w
-            #            for w, n in enumerate(cpa.pa):
-            #                if n < 0:
-            #                    break
-            #                bt += cpaw[w] * particles[n].birth_time
-            #            lt = pss.lifetime
-            #            if randlength > 0:
-            #                lt *= 1.0 - randlength * psys_frand(pss, c + 25)
-            #        else:
-            #            p = particles[cpa.parent]
-            #            bt = p.birth_time
-            #            lt = p.lifetime
-            #        yield (i, bt, bt + lt, (frame_current - bt) / lt)
-            #        i += 1
-
-            #for a, pa_birthtime, pa_dietime, pa_time in parts():
-            for a, pa in enumerate(ps.particles):
-                # <...>\source\blender\editors\space_view3d\drawobject.c:5354
-                pa_birthtime = pa.birth_time
-                pa_dietime = pa.die_time
-                pa_time = (frame_current - pa_birthtime) / pa.lifetime
-
-                if randlength > 0:
-                    r_length = psys_frand(pss, a + 22)
-                    tc = trail_count * (1.0 - randlength * r_length)
-                    if not tc:
-                        tc = 1.0
-                    length = path_end * (1.0 - randlength * r_length)
-                if not use_absolute_path_time:
-                    _ct = pa_time - length
-
-                # <...>\source\blender\editors\space_view3d\drawobject.c:5404
-                for j in range(1, trail_count + 1):
-                    ct = _ct + (j / tc) * length
-                    if use_absolute_path_time:
-                        if pa_birthtime > ct or ct > pa_dietime:
-                            continue
-                        t = ct
-                    elif 0 > ct or ct > 1:
-                        continue
-                    else:
-                        t = pa_birthtime + ct * (pa_dietime - pa_birthtime)
-
-                    prev = None
-                    while _mem:
-                        # <...>\source\blender\blenkernel\intern\particle.c:839
-                        cur = _mem.contents
-                        cf = cur.frame
-                        if t <= cf:
-                            tp = cur.totpoint
-                            data = cur.data
-                            if tp > 0 and data[0]:
-                                idxs = cast(data[0], p_uint)
-                                locs = cast(data[1], p_float3)
-
-                                if prev is not None:
-                                    vels = cast(data[2], p_float3)
-
-                                    data = prev.data
-                                    pidxs = cast(data[0], p_uint)
-                                    plocs = cast(data[1], p_float3)
-                                    pvels = cast(data[2], p_float3)
-                                    ptp = prev.totpoint
-
-                                for k in range(tp):
-                                    i = idxs[k]
-                                    co = locs[i]
-                                    if prev is not None and k < ptp:
-                                        ve = vels[i]
-
-                                        i = pidxs[k]
-                                        pco = plocs[i]
-                                        pve = pvels[i]
-
-                                        # <...>\source\blender\blenkernel\intern\particle.c:1118
-                                        pf = prev.frame
-                                        dfra = cf - pf
-                                        kt = (t - pf) / dfra
-
-                                        # <...>\source\blender\blenkernel\intern\particle.c:1123
-                                        invdt = dfra * 0.04 * time_tweak
-                                        v0 = ve[0] * invdt
-                                        v1 = ve[1] * invdt
-                                        v2 = ve[2] * invdt
-                                        pv0 = pve[0] * invdt
-                                        pv1 = pve[1] * invdt
-                                        pv2 = pve[2] * invdt
-
-                                        # <...>\source\blender\blenlib\intern\math_geom.c:3283
-                                        t2 = kt * kt
-                                        t3 = t2 * kt
-                                        c0 = pco[0] - co[0]
-                                        c1 = pco[1] - co[1]
-                                        c2 = pco[2] - co[2]
-                                        a0 = pv0 + v0 + 2 * c0
-                                        a1 = pv1 + v1 + 2 * c1
-                                        a2 = pv2 + v2 + 2 * c2
-                                        b0 = -2 * pv0 - v0 - 3 * c0
-                                        b1 = -2 * pv1 - v1 - 3 * c1
-                                        b2 = -2 * pv2 - v2 - 3 * c2
-                                        co = [
-                                            a0 * t3 + b0 * t2 + pv0 * kt + pco[0],
-                                            a1 * t3 + b1 * t2 + pv1 * kt + pco[1],
-                                            a2 * t3 + b2 * t2 + pv2 * kt + pco[2]
-                                        ]
-                                    yield co
-                            break
-                        prev = cur
-                        _mem = cur.next
-        it = _it()
+        return _psys_get_trails(ps, pss, frame_current)
     elif nch > 0:
         # TODO: child particles
         return None
     else:
         it = (p.location for p in ps.particles if p.alive_state == 'ALIVE')
     return numpy.fromiter(itertools.chain.from_iterable(it), dtype=numpy.float32).reshape([-1, 3])
+
+
+# <...>\source\blender\python\generic\bgl.h (struct _Buffer)
+class _BGLBuffer(ctypes.Structure):
+    _fields_ = [
+        ("ob_refcnt", ctypes.c_ssize_t),
+        ("ob_type", ctypes.c_void_p),
+        ("ob_size", ctypes.c_ssize_t),
+        ("parent", ctypes.c_void_p),
+        ("type", ctypes.c_int),
+        ("ndimensions", ctypes.c_int),
+        ("dimensions", ctypes.c_void_p),
+        ("buf", ctypes.c_void_p),
+    ]
+
+
+def bgl_buffer_array(buffer, shape, dtype=numpy.uint8):
+    """numpy.ndarray view of the bgl.Buffer memory
+
+    The view is valid while the buffer is alive.
+    """
+    _buf = _BGLBuffer.from_address(id(buffer))
+    n = int(numpy.prod(shape)) * numpy.dtype(dtype).itemsize
+    return numpy.frombuffer((ctypes.c_byte * n).from_address(_buf.buf), dtype=dtype).reshape(shape)
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+
+__doc__ = "persistent caches shared between render sessions"
+
+import collections
+import hashlib
+
+
+def digest(*buffers):
+    """Content hash of numpy arrays / bytes
+        buffers:
+            objects supporting the buffer protocol (contiguous)
+    """
+    h = hashlib.sha1()
+    for b in buffers:
+        if b is not None:
+            h.update(b)
+    return h.digest()
+
+
+class MeshCache:
+    """LRU cache of converted polymesh arrays
+        key:
+            bytes, mesh content hash (see digest)
+        value:
+            dict {name: numpy.ndarray}
+
+    Cached arrays are shared between renders and must not be modified.
+    """
+
+    def __init__(self, budget=0):
+        self._items = collections.OrderedDict()
+        self.budget = budget  # bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    @staticmethod
+    def _nbytes(arrays):
+        return sum(a.nbytes for a in arrays.values())
+
+    def get(self, key):
+        arrays = self._items.get(key)
+        if arrays is None:
+            self.misses += 1
+        else:
+            self._items.move_to_end(key)
+            self.hits += 1
+        return arrays
+
+    def put(self, key, arrays):
+        nbytes = self._nbytes(arrays)
+        if nbytes > self.budget:
+            return
+        old = self._items.pop(key, None)
+        if old is not None:
+            self.size -= self._nbytes(old)
+        self._items[key] = arrays
+        self.size += nbytes
+        self._evict()
+
+    def resize(self, budget):
+        self.budget = budget
+        self._evict()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self):
+        self._items.clear()
+        self.size = 0
+
+    def _evict(self):
+        items = self._items
+        while items and self.size > self.budget:
+            key, arrays = items.popitem(False)
+            self.size -= self._nbytes(arrays)
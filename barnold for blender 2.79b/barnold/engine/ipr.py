@@ -3,29 +3,99 @@
 __author__ = "Ildar Nikolaev"
 __email__ = "nildar@users.sourceforge.net"
 
+import os
 import sys
+import atexit
 import numpy
 import mmap
 import platform
+import tempfile
 
-ABORT = 1
-UPDATE = 2
+_SHM_MIN = 64 * 1024  # smaller arrays are pickled
+_SCALE_MAX = 8  # max resolution divisor of the interactive passes
+# memory backed files where available, tmp may be on disk
+_SHM_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
 
 
+def _shm_path(name):
+    return os.path.join(_SHM_DIR, name.replace("/", "-"))
+
+
+def _shm(name, size, create=False):
+    """Named shared memory segment"""
+    if platform.system() == "Windows":
+        return mmap.mmap(-1, size, name)
+    with open(_shm_path(name), "w+b" if create else "r+b") as f:
+        if create:
+            f.truncate(size)
+        return mmap.mmap(f.fileno(), size)
+
+
+def _shm_unlink(name):
+    if platform.system() != "Windows":
+        try:
+            os.remove(_shm_path(name))
+        except OSError:
+            pass
+
+
+def _shm_pack(data, name):
+    """Move large arrays of the nodes params to a shared memory segment
+
+    Arrays are replaced by ('SHM', (type, offset, dtype, count)) handles,
+    the params dicts are copied, the scene description isn't changed.
+    Returns:
+        mmap.mmap or None
+    """
+    arrays = []
+
+    def _params(params):
+        params = dict(params)
+        for n, (t, v) in params.items():
+            if t == 'ARRAY' and v[1].nbytes >= _SHM_MIN:
+                arrays.append((params, n, v))
+        return params
+
+    if 'add' in data:
+        data['add'] = [(nt, _params(np)) for nt, np in data['add']]
+    if 'nodes' in data:
+        data['nodes'] = {k: _params(np) for k, np in data['nodes'].items()}
+    if not arrays:
+        return None
+
+    size = sum((v[1].nbytes + 15) & ~15 for _, _, v in arrays)
+    mm = _shm(name, size, True)
+    offset = 0
+    for params, n, (t, a) in arrays:
+        a = numpy.ascontiguousarray(a)
+        numpy.frombuffer(mm, dtype=a.dtype, count=a.size, offset=offset)[:] = a.ravel()
+        params[n] = ('SHM', (t, offset, a.dtype.str, a.size))
+        offset += (a.nbytes + 15) & ~15
+    data['shm'] = (name, size)
+    return mm
+
+
+_POOL = []  # idle worker processes, they live between IPR sessions
+
 
 def ipr():
+    """IPR session factory
+
+    Without engine only starts an idle worker process in background.
+    """
     import weakref
     from types import ModuleType
 
     code = __spec__.loader.get_code(__name__)
 
-    def _exec(engine, data, width, height):
+    def _exec(engine=None, data=None, width=0, height=0):
         _main = sys.modules["__main__"]
         try:
             mod = ModuleType("__main__")
             mod.__file__ = __file__
 
-            mod._engine_ = weakref.ref(engine)
+            mod._pool_ = _POOL
+            mod._engine_ = None if engine is None else weakref.ref(engine)
             mod._data_ = data
             mod._width_ = width
             mod._height_ = height
@@ -41,31 +111,64 @@ def ipr():
     return _exec
 
 
-def _worker(data, new_data, redraw_event, mmap_size, mmap_name, state):
+def _release(worker, consumed=None):
+    """Unlink the shared memory segments of the worker, all of them
+    or the ones read by the worker up to the consumed id"""
+    segments = worker['segments']
+    for i in [i for i in segments if consumed is None or i <= consumed]:
+        name, mm = segments.pop(i)
+        if mm is not None:
+            mm.close()
+        _shm_unlink(name)
+
+
+def shutdown():
+    """Stop idle worker processes"""
+    while _POOL:
+        worker = _POOL.pop()
+        try:
+            worker['pipe'].send(None)
+            worker['pipe'].close()
+        except OSError:
+            pass
+        process = worker['process']
+        process.join(5)
+        if process.is_alive():
+            process.terminate()
+        _release(worker)
+
+
+if __name__ != "__main__":
+    # the addon isn't unregistered when blender quits
+    atexit.register(shutdown)
+
+
+def _worker(new_data, redraw_event, consumed, dirty):
     print("+++ _worker: started")
 
-    import os
     import ctypes
+    import time
 
     dir = os.path.dirname(__file__)
     if dir not in sys.path:
         sys.path.append(dir)
 
     import arnold
+    import arrays as _AiArray
 
-    nodes = {}
     nptrs = []  # nodes linked by AiNodeSetPtr
     links = []  # nodes linked by AiNodeLink
 
+    shm = {}  # shared memory segment of the current update
+
     def _AiNodeSetArray(node, param, value):
         t, a = value
-        _len = len(a)
-        if t == arnold.AI_TYPE_VECTOR:
-            _len //= 3
-        elif t == arnold.AI_TYPE_UINT:
-            pass
-        _a = arnold.AiArrayConvert(_len, 1, t, ctypes.c_void_p(a.ctypes.data))
-        arnold.AiNodeSetArray(node, param, _a)
+        arnold.AiNodeSetArray(node, param, _AiArray.convert(a, t))
+
+    def _AiNodeSetShm(node, param, value):
+        t, offset, dtype, count = value
+        a = numpy.frombuffer(shm['mmap'], dtype=dtype, count=count, offset=offset)
+        arnold.AiNodeSetArray(node, param, _AiArray.convert(a, t))
 
     _AiNodeSet = {
         'NodeSocketShader': lambda n, i, v: True,
@@ -90,33 +193,95 @@ def _worker(data, new_data, redraw_event, mmap_size, mmap_name, state):
         'STRING': lambda n, p, v: arnold.AiNodeSetStr(n, p, v),
         'MATRIX': lambda n, p, v: arnold.AiNodeSetMatrix(n, p, arnold.AtMatrix(*v)),
         'ARRAY': _AiNodeSetArray,
+        'SHM': _AiNodeSetShm,
         'LINK': lambda n, p, v: links.append((n, p, v)),
         'NODE': lambda n, p, v: nptrs.append((n, p, v)),
     }
 
-    arnold.AiBegin()
-    try:
+    def _update(data):
+        """Apply scene update with arrays from the shared memory segment"""
+        segment = data.get('shm')
+        if segment is None:
+            _AiNodes(data)
+            return
+        name, size = segment
+        shm['mmap'] = _shm(name, size)
+        try:
+            _AiNodes(data)
+        finally:
+            shm.pop('mmap').close()
+            _shm_unlink(name)
+            consumed.value = data['shm_id']
+
+    def _AiNodes(data):
+        """Apply scene update, nodes are referenced by names"""
+        for name in data.get('remove', ()):
+            node = arnold.AiNodeLookUpByName(name)
+            if node:
+                arnold.AiNodeDestroy(node)
+        for nt, np in data.get('add', ()):
+            node = arnold.AiNode(nt)
+            for n, (t, v) in np.items():
+                _AiNodeSet[t](node, n, v)
+        for name, params in data.get('nodes', {}).items():
+            node = arnold.AiNodeLookUpByName(name)
+            if not node:
+                continue
+            for n, (t, v) in params.items():
+                if t != 'LINK' and arnold.AiNodeIsLinked(node, n):
+                    arnold.AiNodeUnlink(node, n)
+                _AiNodeSet[t](node, n, v)
+        opts = data.get('options')
+        if opts is not None:
+            options = arnold.AiUniverseGetOptions()
+            for n, (t, v) in opts.items():
+                _AiNodeSet[t](options, n, v)
+        for n, p, v in nptrs:
+            arnold.AiNodeSetPtr(n, p, arnold.AiNodeLookUpByName(v) if v else None)
+        for n, p, v in links:
+            src = arnold.AiNodeLookUpByName(v) if v else None
+            if src:
+                arnold.AiNodeLink(src, p, n)
+            elif arnold.AiNodeIsLinked(n, p):
+                arnold.AiNodeUnlink(n, p)
+        del nptrs[:]
+        del links[:]
+
+    def _rect(data):
+        """Open the frame buffer segment, it is read before the update
+        segment, so the consumed id covers both"""
+        name, w, h = data['rect']
+        mm = _shm(name, w * h * 4)
+        _shm_unlink(name)
+        consumed.value = data['rect_id']
+        return numpy.frombuffer(mm, dtype=numpy.uint8).reshape([h, w, 4])
+
+    def _reset():
+        """Destroy session nodes, plugins stay loaded"""
+        nodes = []
+        it = arnold.AiUniverseGetNodeIterator(arnold.AI_NODE_ALL)
+        while not arnold.AiNodeIteratorFinished(it):
+            nodes.append(arnold.AiNodeIteratorGetNext(it))
+        arnold.AiNodeIteratorDestroy(it)
+        options = arnold.AiUniverseGetOptions()
+        for node in nodes:
+            if node and arnold.AiNodeGetName(node) != arnold.AiNodeGetName(options):
+                arnold.AiNodeDestroy(node)
+        arnold.AiNodeReset(options)
+
+    def _session(data):
+        """Render IPR session until the end of session (None) message"""
         # arnold.AiMsgSetConsoleFlags(arnold.AI_LOG_ALL)
         # arnold.AiMsgSetConsoleFlags(0x000E)
         #
         # from pprint import pprint as pp
         # pp(data)
 
+        rect = _rect(data)
+
         ## Nodes
-        for node in data['nodes']:
-            print("WEEEEEEEEEEEEEEEEEEE")
-            nt, np = node
-            anode = arnold.AiNode(nt)
-            for n, (t, v) in np.items():
-                _AiNodeSet[t](anode, n, v)
-            nodes[id(node)] = anode
+        _update(data)
         options = arnold.AiUniverseGetOptions()
-        for n, (t, v) in data['options'].items():
-            _AiNodeSet[t](options, n, v)
-        for n, p, v in nptrs:
-            arnold.AiNodeSetPtr(n, p, nodes[id(v)])
-        for n, p, v in links:
-            arnold.AiNodeLink(nodes[id(v)], p, n)
 
         ## Outputs
         filter = arnold.AiNode("gaussian_filter")
@@ -131,20 +296,56 @@ def _worker(data, new_data, redraw_event, mmap_size, mmap_name, state):
         arnold.AiNodeSetArray(options, "outputs", outputs)
 
         sl = data['sl']
-
-        del nodes, nptrs, links, data
-
-        if platform.system() == "Darwin" or "Linux":
-            _rect = lambda w, h: numpy.frombuffer(
-                mmap.mmap(-1, w * h * 4 * 4), dtype=numpy.float32
-            ).reshape([h, w, 4])
-            rect = _rect(*mmap_size)
-
-        if platform.system() == "Windows":
-            _rect = lambda n, w, h: numpy.frombuffer(
-                mmap.mmap(-1, w * h * 4 * 4, n), dtype=numpy.float32
-            ).reshape([h, w, 4])
-            rect = _rect(mmap_name, *mmap_size)
+        latency = data.get('latency', 0.1)
+
+        del data
+
+        # AA levels of the progressive passes, zero samples renders nothing
+        levels = [l for l in range(sl[0], sl[1] + 1) if l != 0]
+        costs = {}  # {AA level: seconds per pixel}
+        scale = 1  # resolution divisor of the current pass
+
+        def _pass(level, _scale):
+            """Render pass, returns True if it isn't interrupted"""
+            nonlocal scale
+            scale = _scale
+            h, w = rect.shape[:2]
+            xres = -(-w // scale)
+            yres = -(-h // scale)
+            arnold.AiNodeSetInt(options, "xres", xres)
+            arnold.AiNodeSetInt(options, "yres", yres)
+            arnold.AiNodeSetInt(options, "AA_samples", level)
+            t = time.perf_counter()
+            res = arnold.AiRender(arnold.AI_RENDER_MODE_CAMERA)
+            if res != arnold.AI_SUCCESS:
+                return False
+            c = (time.perf_counter() - t) / (xres * yres)
+            _c = costs.get(level)
+            costs[level] = c if _c is None else (_c + c) / 2
+            return True
+
+        def _interactive():
+            """AA level and resolution divisor of the first pass after an update
+
+            The highest measured level which fits the target latency at full
+            resolution, or the lowest level at the reduced resolution.
+            """
+            h, w = rect.shape[:2]
+            n = w * h
+            level = levels[0]
+            for l in levels:
+                c = costs.get(l)
+                if c is None or c * n > latency:
+                    break
+                level = l
+            c = costs.get(level)
+            if c is None:
+                # first pass, there is no measure yet
+                return level, max(1, min(_SCALE_MAX, round((max(w, h) + 600) / 900)))
+            _scale = 1
+            while _scale < _SCALE_MAX and c * n > latency * _scale * _scale:
+                _scale += 1
+            return level, _scale
 
         def _callback(x, y, width, height, buffer, data):
             #print("+++ _callback:", x, y, width, height, ctypes.cast(buffer, ctypes.c_void_p))
@@ -156,7 +357,26 @@ def _worker(data, new_data, redraw_event, mmap_size, mmap_name, state):
                         #print("+++ _callback: tile", x, y, width, height)
                         _buffer = ctypes.cast(buffer, ctypes.POINTER(ctypes.c_ubyte))
                         a = numpy.ctypeslib.as_array(_buffer, shape=(height, width, 4))
-                        rect[y : y + height, x : x + width] = a
+                        if scale > 1:
+                            a = a.repeat(scale, 0).repeat(scale, 1)
+                            x *= scale
+                            y *= scale
+                        # the bucket is clipped by the frame size
+                        h, w = rect.shape[:2]
+                        width = min(a.shape[1], w - x)
+                        height = min(a.shape[0], h - y)
+                        if width <= 0 or height <= 0:
+                            return
+                        rect[y : y + height, x : x + width] = a[:height, :width]
+                        # dirty region [xmin, ymin, xmax, ymax], empty if xmin >= xmax
+                        with dirty.get_lock():
+                            if dirty[0] < dirty[2]:
+                                dirty[0] = min(dirty[0], x)
+                                dirty[1] = min(dirty[1], y)
+                                dirty[2] = max(dirty[2], x + width)
+                                dirty[3] = max(dirty[3], y + height)
+                            else:
+                                dirty[:] = [x, y, x + width, y + height]
                         redraw_event.set()
                     return
                 finally:
@@ -169,59 +389,55 @@ def _worker(data, new_data, redraw_event, mmap_size, mmap_name, state):
         cb = arnold.AtDisplayCallBack(_callback)
         arnold.AiNodeSetPtr(driver, "callback", cb)
 
-        class _Dict(dict):
-            def update(self, u):
-                for k, v in u.items():
-                    if isinstance(v, dict):
-                        self[k] = _Dict.update(self.get(k, {}), v)
-                    else:
-                        self[k] = u[k]
-                return self
-
-
-        while state.value != ABORT:
-            for _sl in range(*sl):
-                arnold.AiNodeSetInt(options, "AA_samples", _sl)
-                res = arnold.AiRender(arnold.AI_RENDER_MODE_CAMERA)
-                if res == arnold.AI_SUCCESS:
-                    break
-            if state.value == ABORT:
-                #print("+++ _worker: abort")
-                break;
-
-            data = _Dict()
-            _data = new_data.recv()
-            print(_data)
-            while _data is not None:
+        while True:
+            # interactive pass, then the refinement to full resolution
+            # and the final AA level while the view is idle
+            level, _scale = _interactive()
+            if _pass(level, _scale):
+                i = levels.index(level)
+                for l in levels[i if _scale > 1 else i + 1:]:
+                    if not _pass(l, 1):
+                        break
+
+            # updates are applied in order, added and removed nodes
+            # can't be merged with the parameter changes
+            data = new_data.recv()
+            while True:
+                if data is None:
+                    #print("+++ _worker: session end")
+                    return
                 # from pprint import pprint as pp
                 # print("+++ _worker: data")
-                # pp(_data)
-                data.update(_data)
+                # pp(data)
+                if 'rect' in data:
+                    rect = _rect(data)
+                _update(data)
+                latency = data.get('latency', latency)
                 if not new_data.poll():
-                    _nodes = data.get('nodes')
-                    if _nodes is not None:
-                        for name, params in _nodes.items():
-                            node = arnold.AiNodeLookUpByName(name)
-                            for n, (t, v) in params.items():
-                                _AiNodeSet[t](node, n, v)
-                    opts = data.get('options')
-                    if opts is not None:
-                        for n, (t, v) in opts.items():
-                            _AiNodeSet[t](options, n, v)
-                    size = data.get('mmap_size')
-                    if size is not None:
-                        rect = _rect(mmap_name, *size)
                     break
-                _data = new_data.recv()
+                data = new_data.recv()
+
+    # warm worker, the universe is reset between sessions
+    arnold.AiBegin()
+    try:
+        data = new_data.recv()
+        while data is not None:
+            try:
+                _session(data)
+            finally:
+                del nptrs[:]
+                del links[:]
+                _reset()
+            data = new_data.recv()
     finally:
         arnold.AiEnd()
     print("+++ _worker: finished")
 
 
-def _main():
+def _start():
+    """Start worker process"""
     import multiprocessing as _mp
-    import threading
-    import time
+    import itertools
 
     import bpy
     _mp.set_executable(bpy.app.binary_path_python)
@@ -230,92 +446,189 @@ def _main():
     # logger = _mp.log_to_stderr()
     # logger.setLevel(logging.INFO)
 
-    global _engine_, _data_, _width_, _height_, _mmap_size_, _mmap_
-
-    _mmap_name = "blender/barnold/ipr/pid-%d" % id(_engine_)
+    pout, pin = _mp.Pipe(False)
+    worker = {
+        'pipe': pin,
+        'redraw_event': _mp.Event(),
+        'consumed': _mp.Value('i', -1),  # last shared memory segment read by the worker
+        'dirty': _mp.Array('i', 4),  # frame buffer region updated since the last redraw
+        'segments': {},  # {id: (name, mmap or None)}, None for the frame buffers
+        'counter': itertools.count(),
+    }
+    worker['process'] = process = _mp.Process(target=_worker, args=(
+        pout, worker['redraw_event'], worker['consumed'], worker['dirty']
+    ), daemon=True)
+    process.start()
+    return worker
 
-    if platform.system() == "Darwin" or "Linux":
-        _mmap_ = mmap.mmap(-1, 64 * 1024 * 1024)  # 64Mb
 
-    if platform.system() == "Windows":
-        _mmap_ = mmap.mmap(-1, 64 * 1024 * 1024, _mmap_name)  # 64Mb
+def _main():
+    import threading
+    import time
 
-    state = _mp.Value('i', 0)
-    redraw_event = _mp.Event()
+    global _engine_, _data_, _width_, _height_, _mmap_size_, _mmap_, debounce
+
+    # min time between the parameter updates, each of them restarts the render
+    debounce = _data_.pop('debounce', 0.0)
+
+    # take idle worker or start new one
+    while _pool_:
+        worker = _pool_.pop()
+        if worker['process'].is_alive():
+            break
+        _release(worker)
+    else:
+        worker = _start()
+
+    pin = worker['pipe']
+    redraw_event = worker['redraw_event']
+    consumed = worker['consumed']
+    dirty = worker['dirty']
+    segments = worker['segments']
+    counter = worker['counter']
+
+    _mmap_name = "blender/barnold/ipr/pid-%d-%d" % (os.getpid(), worker['process'].pid)
+
+    state = threading.Event()  # session stopped
+
+    def _free():
+        _release(worker, consumed.value)
+
+    def _send(data):
+        """Move large arrays to shared memory, free segments read by the worker"""
+        _free()
+        i = next(counter)
+        name = "%s/shm-%d" % (_mmap_name, i)
+        mm = _shm_pack(data, name)
+        if mm is not None:
+            data['shm_id'] = i
+            segments[i] = (name, mm)
+        return data
 
     def tag_redraw():
-        while redraw_event.wait() and state.value != ABORT:
+        while redraw_event.wait() and not state.is_set():
             redraw_event.clear()
             e = _engine_()
             if e is not None:
                 e.tag_redraw()
             del e
 
-    def _mmap_size(opts):
+    def _mmap_size(data):
+        """Full viewport size frame buffer, render resolution is chosen by the worker"""
         global _mmap_
-        m = max(_width_, _height_)
-        if m > 300:
-            c = 900 / (m + 600)
-            w = int(_width_ * c)
-            h = int(_height_ * c)
-        else:
-            w = _width_
-            h = _height_
-
-        if platform.system() == "Darwin" or "Linux":
-            _mmap_ = mmap.mmap(-1, w * h * 4 * 4)
-
-        if platform.system() == "Windows":
-            _mmap_ = mmap.mmap(-1, w * h * 4 * 4, _mmap_name)
-
-        opts['xres'] = ('INT', w)
-        opts['yres'] = ('INT', h)
+        w = _width_
+        h = _height_
+
+        # new segment for every size, the worker may still draw to the old one
+        i = next(counter)
+        name = "%s/rect-%d" % (_mmap_name, i)
+        _mmap_ = _shm(name, w * h * 4, True)
+        # unlinked by the worker, or here if the worker never reads it
+        segments[i] = (name, None)
+        data['rect'] = (name, w, h)
+        data['rect_id'] = i
         return w, h
 
-    _mmap_size_ = _mmap_size(_data_['options'])
-    pout, pin = _mp.Pipe(False)
+    _mmap_size_ = _mmap_size(_data_)
+
+    lock = threading.Lock()
+    pending = {}  # {(node name, param): (type, value)}, None name for options
+    timer = None  # sends pending updates at the end of the debounce window
+    sent = 0.0  # time of the last message
+
+    def _post(data):
+        nonlocal sent
+        pin.send(_send(data))
+        sent = time.perf_counter()
+
+    def _pending():
+        """Message of the coalesced parameter updates"""
+        data = {}
+        for (name, param), value in pending.items():
+            if name is None:
+                data.setdefault('options', {})[param] = value
+            else:
+                data.setdefault('nodes', {}).setdefault(name, {})[param] = value
+        pending.clear()
+        return data
+
+    def _flush():
+        nonlocal timer
+        with lock:
+            timer = None
+            if pending and not state.is_set():
+                _post(_pending())
+
+    def _update(data):
+        """Send update, parameter changes are coalesced within the debounce window"""
+        nonlocal timer
+        with lock:
+            if data.keys() - {'nodes', 'options'}:
+                # nodes are added and removed in order with the parameter changes
+                if pending:
+                    _post(_pending())
+                _post(data)
+                return
+            for name, params in data.get('nodes', {}).items():
+                for param, value in params.items():
+                    pending[(name, param)] = value
+            for param, value in data.get('options', {}).items():
+                pending[(None, param)] = value
+            if timer is None:
+                wait = sent + debounce - time.perf_counter()
+                if wait > 0:
+                    timer = threading.Timer(wait, _flush)
+                    timer.start()
+                else:
+                    _post(_pending())
 
     def update(width, height, data):
         global _width_, _height_, _mmap_size_
         if _width_ != width or _height_ != height:
             _width_ = width
             _height_ = height
-            _mmap_size_ = _mmap_size(data.setdefault('options', {}))
-            data['mmap_size'] = _mmap_size_
+            _mmap_size_ = _mmap_size(data)
         if data:
             #print(">>> update [%f]" % time.clock())
-            pin.send(data)
-        return _mmap_size_, numpy.frombuffer(_mmap_, dtype=numpy.float32)
+            _update(data)
+        w, h = _mmap_size_
+        return _mmap_size_, numpy.frombuffer(_mmap_, dtype=numpy.uint8).reshape([h, w, 4])
+
+    def dirty_region():
+        """Frame buffer region updated since the last call, (xmin, ymin, xmax, ymax)"""
+        with dirty.get_lock():
+            region = tuple(dirty)
+            dirty[:] = [0, 0, 0, 0]
+        return region
 
     redraw_thread = threading.Thread(target=tag_redraw)
-    process = _mp.Process(target=_worker, args=(
-        _data_, pout, redraw_event, _mmap_size_, _mmap_name, state
-    ))
 
     def stop():
-        print(">>> stop [%f]: ABORT" % time.clock())
-        state.value = ABORT
-        print(">>> stop [%f]: close data" % time.clock())
-        pin.send(None)
-        pin.close()
+        print(">>> stop [%f]: end session" % time.clock())
+        with lock:
+            state.set()
+            if timer is not None:
+                timer.cancel()
+            pending.clear()
+            pin.send(None)
         print(">>> stop [%f]: set event" % time.clock())
         redraw_event.set()
         print(">>> stop [%f]: join" % time.clock(), redraw_thread)
         redraw_thread.join()
         print(">>> stop [%f]:" % time.clock(), redraw_thread)
-        print(">>> stop [%f]: join" % time.clock(), process)
-        process.join(5)
-        if process.is_alive():
-            print(">>> stop [%f]: terminate" % time.clock(), process)
-            process.terminate()
-        print(">>> stop [%f]:" % time.clock(), process)
+        # the worker waits for the next session
+        _free()
+        _pool_.append(worker)
 
     redraw_thread.start()
-    process.start()
+    _post(_data_)
 
-    return update, stop
+    return update, dirty_region, stop
 
 
 if __name__ == "__main__":
-    update, stop = _main()
-    del _data_
+    if _engine_ is None:
+        _pool_.append(_start())
+    else:
+        update, dirty_region, stop = _main()
+        del _data_
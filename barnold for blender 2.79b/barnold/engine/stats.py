@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+
+__doc__ = "render session statistics"
+
+import collections
+import json
+import os
+import time
+
+import arnold
+
+from . import arrays as _AiArray
+
+
+class Stats:
+    """Statistics of a render session
+
+    Export: per object time, mesh arrays sizes, export phases and the
+    universe nodes by type. Render: time to the first bucket, AA passes
+    durations and the memory peak.
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.objects = collections.OrderedDict()  # {name: {'type': str, 'time': float}}
+        self.meshes = collections.OrderedDict()  # {node name: {'build': float, 'arrays': {name: bytes}}}
+        self.phases = collections.OrderedDict()  # {name: seconds}
+        self.nodes = {}  # {node type: count}
+        self.passes = []  # [{'AA_samples': int, 'time': float, 'status': int}]
+        self.first_bucket = None  # seconds from the render start
+        self.memory_peak = 0.0  # Mb
+        self._render = None
+
+    def iter_objects(self, objects):
+        """Iterate objects, each of them is timed until the next one is requested"""
+        for ob in objects:
+            pc = time.perf_counter()
+            yield ob
+            self.objects[ob.name] = {
+                'type': ob.type,
+                'time': time.perf_counter() - pc,
+            }
+
+    def mesh(self, name, arrays, build):
+        self.meshes[name] = {
+            'build': build,
+            'arrays': {k: int(_AiArray.nbytes(a)) for k, a in arrays.items()},
+        }
+
+    def phase(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def count_nodes(self):
+        """Count the universe nodes by type"""
+        nodes = collections.Counter()
+        it = arnold.AiUniverseGetNodeIterator(arnold.AI_NODE_ALL)
+        while not arnold.AiNodeIteratorFinished(it):
+            node = arnold.AiNodeIteratorGetNext(it)
+            nodes[arnold.AiNodeEntryGetName(arnold.AiNodeGetNodeEntry(node))] += 1
+        arnold.AiNodeIteratorDestroy(it)
+        self.nodes = dict(nodes)
+
+    def render_start(self):
+        self._render = time.perf_counter()
+
+    def bucket(self):
+        """Bucket is done"""
+        if self.first_bucket is None and self._render is not None:
+            self.first_bucket = time.perf_counter() - self._render
+
+    def render_pass(self, AA_samples, seconds, status):
+        self.passes.append({
+            'AA_samples': AA_samples,
+            'time': seconds,
+            'status': status,
+        })
+
+    def memory(self, mem):
+        self.memory_peak = max(self.memory_peak, mem)
+
+    def summary(self):
+        """Short report for the render stats line"""
+        s = ["Export: %.2fs" % self.phases.get('export', 0.0)]
+        if self.first_bucket is not None:
+            s.append("First bucket: %.2fs" % self.first_bucket)
+        if self.passes:
+            s.append("Render: %.2fs (%d passes)" % (sum(p['time'] for p in self.passes), len(self.passes)))
+        s.append("Peak: %.2fMb" % self.memory_peak)
+        return " | ".join(s)
+
+    def to_dict(self):
+        objects = sorted(self.objects.items(), key=lambda i: i[1]['time'], reverse=True)
+        return collections.OrderedDict([
+            ('total', time.perf_counter() - self.start),
+            ('phases', self.phases),
+            ('first_bucket', self.first_bucket),
+            ('passes', self.passes),
+            ('memory_peak', self.memory_peak),
+            ('nodes', self.nodes),
+            ('objects', collections.OrderedDict(objects)),
+            ('meshes', self.meshes),
+        ])
+
+    def write(self, path):
+        """Write JSON report"""
+        dir = os.path.dirname(path)
+        if dir:
+            os.makedirs(dir, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+
+__doc__ = "batched delivery of render buckets to blender"
+
+import time
+
+import numpy
+
+
+class TileBuffer:
+    """Frame sized buffer between the display driver and the render result
+
+    Buckets are copied into the buffer and the merged dirty region is sent
+    to blender at most once per interval. With zero interval every bucket
+    is sent as it arrives, highlighted tiles are supported only in this mode.
+    """
+
+    def __init__(self, engine, width, height, interval=0.0):
+        self.engine = engine
+        self.interval = interval
+        self.rect = numpy.zeros((height, width, 4), dtype=numpy.float32)
+        self._dirty = None  # [xmin, ymin, xmax, ymax]
+        self._highlights = {}
+        self._flushed = time.perf_counter()
+
+    def _reserve(self, width, height):
+        h, w = self.rect.shape[:2]
+        if width > w or height > h:
+            rect = numpy.zeros((max(h, height), max(w, width), 4), dtype=numpy.float32)
+            rect[:h, :w] = self.rect
+            self.rect = rect
+
+    def highlight(self, x, y, width, height):
+        """Bucket rendering starts"""
+        if self.interval <= 0:
+            # TODO: sometimes highlighted tiles become empty
+            self._highlights[(x, y)] = self.engine.begin_result(x, y, width, height)
+
+    def write(self, x, y, width, height, rect):
+        """Bucket is done
+            rect:
+                numpy.ndarray([width * height, 4])
+        """
+        if self.interval <= 0:
+            result = self._highlights.pop((x, y), None)
+            if result is None:
+                result = self.engine.begin_result(x, y, width, height)
+            result.layers[0].passes[0].rect = rect
+            self.engine.end_result(result)
+            return True
+
+        self._reserve(x + width, y + height)
+        self.rect[y:y + height, x:x + width] = rect.reshape(height, width, 4)
+        d = self._dirty
+        if d is None:
+            self._dirty = [x, y, x + width, y + height]
+        else:
+            d[0] = min(d[0], x)
+            d[1] = min(d[1], y)
+            d[2] = max(d[2], x + width)
+            d[3] = max(d[3], y + height)
+        if time.perf_counter() - self._flushed >= self.interval:
+            self.flush()
+            return True
+        return False
+
+    def flush(self):
+        """Send the dirty region to blender"""
+        self._flushed = time.perf_counter()
+        d = self._dirty
+        if d is not None:
+            self._dirty = None
+            xmin, ymin, xmax, ymax = d
+            result = self.engine.begin_result(xmin, ymin, xmax - xmin, ymax - ymin)
+            result.layers[0].passes[0].rect = self.rect[ymin:ymax, xmin:xmax].reshape(-1, 4)
+            self.engine.end_result(result)
+
+    def cancel(self):
+        """Drop highlighted tiles"""
+        while self._highlights:
+            (x, y), result = self._highlights.popitem()
+            self.engine.end_result(result, True)
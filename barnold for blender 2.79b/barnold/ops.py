@@ -9,6 +9,7 @@ import bpy
 from bpy.types import Operator
 from bpy.props import (
     BoolProperty,
+    EnumProperty,
     StringProperty
 )
 from bpy_extras.io_utils import ExportHelper
@@ -101,9 +102,20 @@ class ArnoldExportASS(Operator, ExportHelper):
     bl_label = "Export ASS"
 
     filename_ext = ".ass"
-    filter_glob = StringProperty(default="*.ass", options={'HIDDEN'})
+    filter_glob = StringProperty(default="*.ass;*.ass.gz", options={'HIDDEN'})
     binary = BoolProperty(name="Binary-encode ASS File", default=True)
     open_procs = BoolProperty(name="Expand Procedurals")
+    chunks = EnumProperty(
+        name="Split Geometry",
+        description="Write the geometry into separate files loaded by procedurals",
+        items=[
+            ('NONE', "None", "Single file"),
+            ('OBJECT', "Per Object", "File per object"),
+            ('GROUP', "Per Group", "File per object group")
+        ],
+        default='NONE'
+    )
+    compress = BoolProperty(name="Compress (.ass.gz)")
 
     @classmethod
     def poll(cls, context):
@@ -125,7 +137,9 @@ class ArnoldExportASS(Operator, ExportHelper):
                     int(render.resolution_y * resolution),
                     self.filepath,
                     self.open_procs,
-                    self.binary
+                    self.binary,
+                    self.chunks,
+                    self.compress
                 )
                 return {'FINISHED'}
             except Exception as e:
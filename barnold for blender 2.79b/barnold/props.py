@@ -189,10 +189,72 @@ class ArnoldOptions(PropertyGroup):
         min=16, soft_max=1024,
         default=64,
     )
+    ipr_latency = FloatProperty(
+        name="Target Latency (s)",
+        description="Time of the first pass after an update, viewport resolution is reduced to fit it",
+        min=0.01, soft_max=1.0,
+        default=0.1,
+    )
+    ipr_debounce = FloatProperty(
+        name="Update Interval (s)",
+        description="Min time between render restarts, parameter changes within it are merged",
+        min=0.0, soft_max=1.0,
+        default=0.05,
+    )
     display_gamma = FloatProperty(
         name="Display Driver",
         default=1  # / 2.2  # TODO: inspect gamma correction
     )
+    display_float = BoolProperty(
+        name="Float Output",
+        description="Display driver sends linear float buckets, "
+                    "without color management and 8-bit quantization",
+        default=False
+    )
+    display_interval = FloatProperty(
+        name="Display Interval (s)",
+        description="Rendered buckets are collected and sent to blender at this rate, "
+                    "0 to send every bucket as it's done",
+        min=0, soft_max=10,
+        default=0.5
+    )
+    write_stats = BoolProperty(
+        name="Write Stats",
+        description="Write the render statistics JSON next to the output image",
+        default=False
+    )
+    sequence_render = BoolProperty(
+        name="Keep Scene Between Frames",
+        description="Animation render exports the scene once and updates only "
+                    "transforms, deforming meshes and options on next frames",
+        default=False
+    )
+    mesh_cache_size = IntProperty(
+        name="Mesh Cache (Mb)",
+        description="Memory budget for converted mesh arrays kept between renders, 0 to disable. "
+                    "Meshes are still read and hashed to detect changes, a hit skips the normals "
+                    "and uv conversion. Cached meshes are held in memory twice, by the cache "
+                    "and by arnold, and can't be read straight into arnold arrays",
+        min=0, soft_max=16384,
+        default=0
+    )
+    proc_cache = BoolProperty(
+        name="Geometry Cache",
+        description="Write heavy meshes into .ass files loaded by procedurals, "
+                    "the files are reused while the mesh is unchanged",
+        default=False
+    )
+    proc_cache_path = StringProperty(
+        name="Cache Path",
+        subtype='DIR_PATH',
+        default="//arnold_cache/"
+    )
+    proc_cache_polygons = IntProperty(
+        name="Min Polygons",
+        description="Meshes with fewer polygons are exported as polymesh nodes",
+        min=0, soft_max=10000000,
+        default=100000
+    )
 
     def _get_bucket_size(self):
         r = self.id_data.render
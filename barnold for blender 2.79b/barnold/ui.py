@@ -142,6 +142,7 @@ class ArnoldRenderMainPanel(RenderButtonsPanel, Panel):
             # TODO: DELETE? col.prop(opts, "shader_gamma")
             col.separator()
             col.prop(opts, "display_gamma")
+            col.prop(opts, "display_float")
 
         sublayout = _subpanel(layout, "Textures", opts.ui_textures, opts_path, "ui_textures", "scene")
         if sublayout:
@@ -175,6 +176,8 @@ class ArnoldRenderSystemPanel(RenderButtonsPanel, Panel):
             col = sublayout.column()
             col.prop(opts, "bucket_scanning")
             col.prop(opts, "bucket_size")
+            col.prop(opts, "display_interval")
+            col.prop(opts, "write_stats")
             # overscan
             col.separator()
             col.prop(opts, "auto_threads")
@@ -185,6 +188,13 @@ class ArnoldRenderSystemPanel(RenderButtonsPanel, Panel):
             col.prop(opts, "pin_threads")
             col.separator()
             col.prop(opts, "procedural_force_expand")
+            col.prop(opts, "mesh_cache_size")
+            col.prop(opts, "proc_cache")
+            subcol = col.column()
+            subcol.prop(opts, "proc_cache_path")
+            subcol.prop(opts, "proc_cache_polygons")
+            subcol.enabled = opts.proc_cache
+            col.prop(opts, "sequence_render")
 
         sublayout = _subpanel(layout, "IPR", opts.ui_ipr, opts_path, "ui_ipr", "scene")
         if sublayout:
@@ -193,6 +203,8 @@ class ArnoldRenderSystemPanel(RenderButtonsPanel, Panel):
             col.prop(opts, "initial_sampling_level")
             col.label("Viewport Rendering", icon='SETTINGS')
             col.prop(opts, "ipr_bucket_size")
+            col.prop(opts, "ipr_latency")
+            col.prop(opts, "ipr_debounce")
 
         sublayout = _subpanel(layout, "Search paths", opts.ui_paths, opts_path, "ui_paths", "scene")
         if sublayout:
@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+
+__doc__ = "synthetic bpy-like scene data for the benchmarks"
+
+import ctypes
+import types
+
+import numpy
+
+
+class Collection:
+    """bpy collection with foreach_get over numpy arrays
+        attrs:
+            {name: numpy.ndarray [len, ...]}
+    """
+
+    def __init__(self, n, items=None, **attrs):
+        self._n = n
+        self._items = items
+        self._attrs = attrs
+
+    def __len__(self):
+        return self._n
+
+    def __iter__(self):
+        return iter(self._items or ())
+
+    def __getitem__(self, i):
+        return self._items[i]
+
+    def foreach_get(self, attr, out):
+        out[:] = self._attrs[attr].ravel()
+
+
+class Value(float):
+    """Float property, iterable as a color or vector, unknown attributes
+    are values too, so it stands in for the nested property groups"""
+
+    def __iter__(self):
+        return iter((float(self), ) * 3)
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return Value(0.5)
+
+
+class Props:
+    """Property group, unknown properties are Value(0.5)"""
+
+    def __init__(self, **props):
+        self.__dict__.update(props)
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return Value(0.5)
+
+
+##############################
+## meshes
+def grid_mesh(nx, ny, materials=(), uv=True, seed=0):
+    """Grid of nx * ny quads
+        materials:
+            sequence of materials assigned to the polygons in turn
+    """
+    rnd = numpy.random.RandomState(seed)
+    nverts = (nx + 1) * (ny + 1)
+    npolygons = nx * ny
+    nloops = npolygons * 4
+
+    x, y = numpy.meshgrid(numpy.arange(nx + 1), numpy.arange(ny + 1))
+    co = numpy.stack([x.ravel(), y.ravel(), rnd.rand(nverts)], axis=1).astype(numpy.float32)
+    i = (numpy.arange(ny)[:, None] * (nx + 1) + numpy.arange(nx)).ravel()
+    vertices = numpy.stack([i, i + 1, i + nx + 2, i + nx + 1], axis=1).astype(numpy.uint32)
+    normals = numpy.tile(numpy.array([0, 0, 1], dtype=numpy.float32), (nloops, 1))
+
+    mesh = Props(
+        name="grid_%dx%d" % (nx, ny),
+        vertices=Collection(nverts, co=co),
+        loops=Collection(nloops, normal=normals, vertex_index=vertices),
+        polygons=Collection(
+            npolygons,
+            loop_total=numpy.full(npolygons, 4, dtype=numpy.uint32),
+            loop_start=numpy.arange(0, nloops, 4, dtype=numpy.uint32),
+            vertices=vertices,
+            material_index=(numpy.arange(npolygons) % max(len(materials), 1)).astype(numpy.int16),
+            use_smooth=numpy.ones(npolygons, dtype=numpy.bool_),
+        ),
+        edges=Collection(0, use_edge_sharp=numpy.zeros(0, dtype=numpy.bool_)),
+        materials=list(materials),
+        uv_textures=[],
+        uv_layers=[],
+        has_custom_normals=False,
+        use_auto_smooth=False,
+        auto_smooth_angle=0.5,
+        shape_keys=None,
+        is_updated_data=False,
+    )
+    if uv:
+        uvs = co[vertices.ravel(), :2] / max(nx, ny)
+        mesh.uv_textures.append(Props(name="UVMap", active_render=True))
+        mesh.uv_layers.append(Props(name="UVMap", data=Collection(nloops, uv=uvs)))
+    mesh.calc_normals_split = lambda: None
+    return mesh
+
+
+##############################
+## materials
+def material(name, shader="standard_surface"):
+    """Material with the built-in shader properties"""
+    return Props(name=name, use_nodes=False, type='SURFACE', arnold=Props(type=shader))
+
+
+class Socket(Props):
+    def __init__(self, identifier, bl_idname="NodeSocketFloat", default_value=0.5, link=None):
+        super().__init__(
+            identifier=identifier,
+            bl_idname=bl_idname,
+            default_value=default_value,
+            hide_value=False,
+            is_linked=link is not None,
+            links=[Props(from_node=link)] if link is not None else [],
+        )
+
+
+def node_material(name, nodes_module, depth=4, width=2):
+    """Material with a node tree of depth * width shader nodes
+        nodes_module:
+            module with the ArnoldNode and ArnoldNodeOutput classes
+    """
+    def _node(level, i):
+        node = nodes_module.ArnoldNode()
+        node.name = "%s_%d_%d" % (name, level, i)
+        node.ai_name = "standard_surface" if level == 0 else "image"
+        node.ai_properties = {"filename": ("STRING", "tex_%d_%d.tx" % (level, i))} if level else {}
+        inputs = [Socket("base", "NodeSocketFloat", 0.8),
+                  Socket("specular_roughness", "NodeSocketFloat", 0.3)]
+        if level < depth - 1:
+            for k in range(width):
+                inputs.append(Socket("color%d" % k, "NodeSocketColor", (1, 1, 1, 1), _node(level + 1, i * width + k)))
+        node.inputs = inputs
+        return node
+
+    output = nodes_module.ArnoldNodeOutput()
+    output.is_active = True
+    output.inputs = [Socket("shader", "NodeSocketShader", None, _node(0, 0))]
+    return Props(name=name, use_nodes=True, node_tree=Props(nodes=[output]))
+
+
+def nodes_module():
+    """Stand-in of the addon nodes module, the engine imports these classes"""
+    mod = types.ModuleType("barnold.nodes")
+
+    class ArnoldNode:
+        pass
+
+    class ArnoldNodeOutput:
+        pass
+
+    class ArnoldNodeWorldOutput:
+        pass
+
+    class ArnoldNodeLightOutput:
+        pass
+
+    mod.ArnoldNode = ArnoldNode
+    mod.ArnoldNodeOutput = ArnoldNodeOutput
+    mod.ArnoldNodeWorldOutput = ArnoldNodeWorldOutput
+    mod.ArnoldNodeLightOutput = ArnoldNodeLightOutput
+    return mod
+
+
+##############################
+## particles
+class HairSystem:
+    """Particle system with the path caches in memory
+        buffers:
+            number of the key buffers, paths of a buffer are adjacent
+    """
+
+    def __init__(self, bla, nparents, nchildren, steps, buffers=4, seed=0):
+        rnd = numpy.random.RandomState(seed)
+        self._keep = []
+        self._ps = ps = bla._ParticleSystem()
+        ps.pathcache = self._cache(bla, nparents, steps, buffers, rnd)
+        ps.childcache = self._cache(bla, nchildren, steps, buffers, rnd)
+        ps.totpart = nparents
+        ps.totchild = nchildren
+        self.particles = Collection(nparents)
+        self.child_particles = Collection(nchildren)
+
+    def _cache(self, bla, n, steps, buffers, rnd):
+        ptrs = (ctypes.POINTER(bla._ParticleCacheKey) * max(n, 1))()
+        size = ctypes.sizeof(bla._ParticleCacheKey)
+        for b in numpy.array_split(numpy.arange(n), buffers):
+            if not len(b):
+                continue
+            keys = (bla._ParticleCacheKey * (len(b) * steps))()
+            a = numpy.ctypeslib.as_array(
+                (ctypes.c_float * (len(keys) * bla._KEY_FLOATS)).from_buffer(keys)
+            ).reshape(len(b), steps, -1)
+            a[..., :3] = numpy.cumsum(rnd.rand(len(b), steps, 3), axis=1)
+            self._keep.append(keys)
+            addr = ctypes.addressof(keys)
+            for k, i in enumerate(b):
+                ptrs[i] = ctypes.cast(addr + k * steps * size, ctypes.POINTER(bla._ParticleCacheKey))
+        self._keep.append(ptrs)
+        return ctypes.cast(ptrs, ctypes.POINTER(ctypes.POINTER(bla._ParticleCacheKey)))
+
+    def as_pointer(self):
+        return ctypes.addressof(self._ps)
+
+
+def hair_props(basis):
+    return Props(basis=basis, bezier_scale=0.5, radius_root=0.01, radius_tip=0.001)
+
+
+class Particle(Props):
+    pass
+
+
+class EmitterSystem:
+    """Emitter particle system, point cache has a frame per nframes"""
+
+    def __init__(self, bla, n, nframes=10, seed=0):
+        rnd = numpy.random.RandomState(seed)
+        self._keep = []
+        birth = rnd.rand(n).astype(numpy.float32) * nframes / 2
+        lifetime = numpy.full(n, nframes, dtype=numpy.float32)
+        loc = rnd.rand(n, 3).astype(numpy.float32)
+        self.particles = Collection(
+            n,
+            items=[Particle(location=tuple(l), alive_state='ALIVE') for l in loc],
+            birth_time=birth,
+            die_time=birth + lifetime,
+            lifetime=lifetime,
+        )
+        self.child_particles = Collection(0)
+
+        cache = self._cache = bla._PointCache()
+        mems = [bla._PTCacheMem() for f in range(nframes)]
+        for f, mem in enumerate(mems):
+            idx = numpy.arange(n, dtype=numpy.uint32)
+            co = (loc + f * 0.1).astype(numpy.float32)
+            vel = numpy.full((n, 3), 0.1, dtype=numpy.float32)
+            self._keep.extend([idx, co, vel])
+            mem.frame = f + 1
+            mem.totpoint = n
+            mem.data[0] = idx.ctypes.data
+            mem.data[1] = co.ctypes.data
+            mem.data[2] = vel.ctypes.data
+            if f:
+                mems[f - 1].next = ctypes.pointer(mem)
+        self._keep.append(mems)
+        cache.mem_cache.first = ctypes.cast(ctypes.pointer(mems[0]), ctypes.POINTER(bla._ListBase))
+        self.point_cache = Props(as_pointer=lambda: ctypes.addressof(cache))
+
+
+def emitter_settings(trail_count):
+    return Props(seed=0, trail_count=trail_count, path_end=1.0, length_random=0.0,
+                 use_absolute_path_time=False, time_tweak=1.0)
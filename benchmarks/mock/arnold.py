@@ -0,0 +1,421 @@
+# -*- coding: utf-8 -*-
+
+__doc__ = "stand-in arnold module, records calls and keeps arrays in memory"
+
+import collections
+import ctypes
+
+CALLS = collections.Counter()  # {function name: calls}
+
+AI_TYPE_BYTE = 0x00
+AI_TYPE_INT = 0x01
+AI_TYPE_UINT = 0x02
+AI_TYPE_BOOLEAN = 0x03
+AI_TYPE_FLOAT = 0x04
+AI_TYPE_RGB = 0x05
+AI_TYPE_RGBA = 0x06
+AI_TYPE_VECTOR = 0x07
+AI_TYPE_VECTOR2 = 0x09
+AI_TYPE_STRING = 0x0A
+AI_TYPE_POINTER = 0x0B
+AI_TYPE_NODE = 0x0C
+AI_TYPE_ARRAY = 0x0D
+AI_TYPE_MATRIX = 0x0E
+
+AI_NODE_UNDEFINED = 0x0000
+AI_NODE_OPTIONS = 0x0001
+AI_NODE_CAMERA = 0x0002
+AI_NODE_LIGHT = 0x0004
+AI_NODE_SHAPE = 0x0008
+AI_NODE_SHADER = 0x0010
+AI_NODE_OVERRIDE = 0x0020
+AI_NODE_DRIVER = 0x0040
+AI_NODE_FILTER = 0x0080
+AI_NODE_COLOR_MANAGER = 0x0800
+AI_NODE_ALL = 0xFFFF
+
+AI_SUCCESS = 0
+AI_ABORT = 1
+AI_ERROR_NO_CAMERA = 2
+AI_INTERRUPT = 9
+
+AI_RENDER_MODE_CAMERA = 0
+AI_RENDER_MODE_FREE = 1
+
+AI_LOG_ALL = 0xFFFFF
+
+# element sizes of the array types
+_SIZES = {
+    AI_TYPE_BYTE: 1,
+    AI_TYPE_INT: 4,
+    AI_TYPE_UINT: 4,
+    AI_TYPE_BOOLEAN: 1,
+    AI_TYPE_FLOAT: 4,
+    AI_TYPE_RGB: 12,
+    AI_TYPE_RGBA: 16,
+    AI_TYPE_VECTOR: 12,
+    AI_TYPE_VECTOR2: 8,
+    AI_TYPE_MATRIX: 64,
+}
+
+
+def _call(name):
+    CALLS[name] += 1
+
+
+class AtVector(tuple):
+    def __new__(cls, x=0.0, y=0.0, z=0.0):
+        return tuple.__new__(cls, (x, y, z))
+
+
+class AtRGB(tuple):
+    def __new__(cls, r=0.0, g=0.0, b=0.0):
+        return tuple.__new__(cls, (r, g, b))
+
+
+class AtMatrix(tuple):
+    def __new__(cls, *values):
+        return tuple.__new__(cls, values)
+
+
+def AtDisplayCallBack(fn):
+    return fn
+
+
+class AtNodeEntry:
+    def __init__(self, name):
+        self.name = name
+
+
+class AtNode:
+    __slots__ = ("entry", "params", "links")
+
+    def __init__(self, entry):
+        self.entry = entry
+        self.params = {}
+        self.links = {}
+
+
+class AtArray:
+    """Array memory is a ctypes buffer for the numeric types, a list otherwise"""
+
+    def __init__(self, nelements, nkeys, type):
+        self.nelements = nelements
+        self.nkeys = nkeys
+        self.type = type
+        size = _SIZES.get(type)
+        self.data = (ctypes.c_byte * (nelements * nkeys * size))() if size else [None] * (nelements * nkeys)
+
+
+class _Universe:
+    def __init__(self):
+        self.active = False
+        self.nodes = []
+        self.names = {}
+        self.entries = {}
+        self.options = None
+
+    def entry(self, name):
+        e = self.entries.get(name)
+        if e is None:
+            e = self.entries[name] = AtNodeEntry(name)
+        return e
+
+
+_U = _Universe()
+
+
+##############################
+## universe
+def AiBegin():
+    _call("AiBegin")
+    _U.__init__()
+    _U.active = True
+    _U.options = AiNode("options")
+    AiNodeSetStr(_U.options, "name", "options")
+
+
+def AiEnd():
+    _call("AiEnd")
+    _U.__init__()
+
+
+def AiUniverseIsActive():
+    return _U.active
+
+
+def AiUniverseGetOptions():
+    _call("AiUniverseGetOptions")
+    return _U.options
+
+
+def AiUniverseGetNodeIterator(mask):
+    _call("AiUniverseGetNodeIterator")
+    return collections.deque(_U.nodes)
+
+
+def AiNodeIteratorFinished(it):
+    return not it
+
+
+def AiNodeIteratorGetNext(it):
+    return it.popleft()
+
+
+def AiNodeIteratorDestroy(it):
+    pass
+
+
+def AiLoadPlugins(path):
+    _call("AiLoadPlugins")
+
+
+def AiRender(mode):
+    _call("AiRender")
+    return AI_SUCCESS
+
+
+def AiRenderAbort():
+    _call("AiRenderAbort")
+
+
+def AiRenderInterrupt():
+    _call("AiRenderInterrupt")
+
+
+def AiASSWrite(filename, mask, open_procs, binary):
+    _call("AiASSWrite")
+    return 0
+
+
+def AiFree(ptr):
+    pass
+
+
+##############################
+## messages
+def AiMsgDebug(fmt, *args):
+    pass
+
+
+AiMsgInfo = AiMsgWarning = AiMsgError = AiMsgDebug
+
+
+def AiMsgSetConsoleFlags(flags):
+    pass
+
+
+def AiMsgSetMaxWarnings(n):
+    pass
+
+
+def AiMsgTab(n):
+    pass
+
+
+def AiMsgUtilGetUsedMemory():
+    return 0
+
+
+##############################
+## nodes
+def AiNode(type):
+    _call("AiNode")
+    node = AtNode(_U.entry(type))
+    _U.nodes.append(node)
+    return node
+
+
+def AiNodeDestroy(node):
+    _call("AiNodeDestroy")
+    _U.nodes.remove(node)
+    name = node.params.get("name")
+    if name is not None and _U.names.get(name) is node:
+        del _U.names[name]
+
+
+def AiNodeReset(node):
+    _call("AiNodeReset")
+    node.params.clear()
+    node.links.clear()
+
+
+def AiNodeLookUpByName(name):
+    _call("AiNodeLookUpByName")
+    return _U.names.get(name)
+
+
+def AiNodeGetName(node):
+    return node.params.get("name", "")
+
+
+def AiNodeGetNodeEntry(node):
+    return node.entry
+
+
+def AiNodeEntryGetName(entry):
+    return entry.name
+
+
+# built-in parameters of the node types the benchmarks check
+_PARAMS = {
+    "polymesh": {
+        "name", "matrix", "shader", "visibility", "sidedness", "smoothing",
+        "nsides", "vidxs", "vlist", "nidxs", "nlist", "uvidxs", "uvlist", "shidxs",
+    },
+}
+
+
+def AiNodeEntryLookUp(name):
+    return _U.entry(name)
+
+
+def AiNodeEntryLookUpParameter(entry, param):
+    return param in _PARAMS.get(entry.name, ())
+
+
+def AiNodeSetStr(node, param, value):
+    _call("AiNodeSetStr")
+    if param == "name":
+        old = node.params.get("name")
+        if old is not None and _U.names.get(old) is node:
+            del _U.names[old]
+        _U.names[value] = node
+    node.params[param] = value
+
+
+def _setter(name):
+    def fn(node, param, *value):
+        _call(name)
+        node.params[param] = value[0] if len(value) == 1 else value
+    fn.__name__ = name
+    return fn
+
+
+for _name in (
+    "AiNodeSetBool", "AiNodeSetByte", "AiNodeSetInt", "AiNodeSetUInt", "AiNodeSetFlt",
+    "AiNodeSetRGB", "AiNodeSetRGBA", "AiNodeSetVec", "AiNodeSetVector", "AiNodeSetVec2",
+    "AiNodeSetMatrix", "AiNodeSetPtr", "AiNodeSetArray",
+):
+    globals()[_name] = _setter(_name)
+
+
+def _getter(name, default):
+    def fn(node, param):
+        _call(name)
+        return node.params.get(param, default)
+    fn.__name__ = name
+    return fn
+
+
+AiNodeGetBool = _getter("AiNodeGetBool", False)
+AiNodeGetInt = _getter("AiNodeGetInt", 0)
+AiNodeGetFlt = _getter("AiNodeGetFlt", 0.0)
+AiNodeGetStr = _getter("AiNodeGetStr", "")
+AiNodeGetPtr = _getter("AiNodeGetPtr", None)
+AiNodeGetArray = _getter("AiNodeGetArray", AtArray(0, 1, AI_TYPE_UINT))
+
+
+def AiNodeDeclare(node, param, declaration):
+    _call("AiNodeDeclare")
+    node.params.setdefault(param, None)
+    return True
+
+
+def AiNodeLookUpUserParameter(node, param):
+    return param in node.params
+
+
+def AiNodeLink(src, param, target):
+    _call("AiNodeLink")
+    target.links[param] = src
+    return True
+
+
+def AiNodeUnlink(node, param):
+    _call("AiNodeUnlink")
+    return node.links.pop(param, None) is not None
+
+
+def AiNodeIsLinked(node, param):
+    _call("AiNodeIsLinked")
+    return param in node.links
+
+
+##############################
+## arrays
+def AiArray(nelements, nkeys, type, *values):
+    _call("AiArray")
+    a = AtArray(nelements, nkeys, type)
+    if isinstance(a.data, list):
+        a.data[:len(values)] = values
+    return a
+
+
+def AiArrayAllocate(nelements, nkeys, type):
+    _call("AiArrayAllocate")
+    return AtArray(nelements, nkeys, type)
+
+
+def AiArrayConvert(nelements, nkeys, type, data):
+    _call("AiArrayConvert")
+    a = AtArray(nelements, nkeys, type)
+    ctypes.memmove(a.data, data, ctypes.sizeof(a.data))
+    return a
+
+
+def AiArrayMap(array):
+    _call("AiArrayMap")
+    return ctypes.addressof(array.data)
+
+
+def AiArrayUnmap(array):
+    _call("AiArrayUnmap")
+
+
+def AiArrayGetNumElements(array):
+    return array.nelements
+
+
+def AiArrayGetNumKeys(array):
+    return array.nkeys
+
+
+def AiArrayGetType(array):
+    return array.type
+
+
+# ctypes element of the numeric arrays
+_CTYPES = {
+    AI_TYPE_BYTE: ctypes.c_uint8 * 1,
+    AI_TYPE_INT: ctypes.c_int32 * 1,
+    AI_TYPE_UINT: ctypes.c_uint32 * 1,
+    AI_TYPE_BOOLEAN: ctypes.c_bool * 1,
+    AI_TYPE_FLOAT: ctypes.c_float * 1,
+    AI_TYPE_RGB: ctypes.c_float * 3,
+    AI_TYPE_RGBA: ctypes.c_float * 4,
+    AI_TYPE_VECTOR: ctypes.c_float * 3,
+    AI_TYPE_VECTOR2: ctypes.c_float * 2,
+    AI_TYPE_MATRIX: ctypes.c_float * 16,
+}
+
+
+def _array_setter(name):
+    def fn(array, i, value):
+        _call(name)
+        if isinstance(array.data, list):
+            array.data[i] = value
+        else:
+            ctype = _CTYPES[array.type]
+            ctype.from_buffer(array.data, i * ctypes.sizeof(ctype))[:] = \
+                value if isinstance(value, tuple) else (value, )
+    fn.__name__ = name
+    return fn
+
+
+for _name in (
+    "AiArraySetBool", "AiArraySetByte", "AiArraySetInt", "AiArraySetUInt", "AiArraySetFlt",
+    "AiArraySetRGB", "AiArraySetRGBA", "AiArraySetVec", "AiArraySetVec2", "AiArraySetMtx",
+    "AiArraySetStr", "AiArraySetPtr",
+):
+    globals()[_name] = _array_setter(_name)
@@ -0,0 +1,3 @@
+# -*- coding: utf-8 -*-
+
+__doc__ = "stand-in bgl module, viewport drawing isn't benchmarked"
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+
+__doc__ = "stand-in bpy module, the fixtures provide the data"
+
+import os
+import types
+
+app = types.SimpleNamespace(
+    binary_path_python="python3",
+    version=(2, 79, 0),
+    handlers=types.SimpleNamespace(persistent=lambda fn: fn, render_cancel=[], render_complete=[]),
+)
+path = types.SimpleNamespace(abspath=os.path.abspath)
+
+
+class ID:
+    """Base of the named data blocks"""
+
+    def __init__(self, name=""):
+        self.name = name
+
+
+class Object(ID):
+    pass
+
+
+class Mesh(ID):
+    pass
+
+
+types = types.SimpleNamespace(ID=ID, Object=Object, Mesh=Mesh)
+data = None
+context = None
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+
+__doc__ = "stand-in mathutils module, 4x4 matrices and vectors on numpy"
+
+import math
+
+import numpy
+
+
+class Vector(tuple):
+    def __new__(cls, values=(0.0, 0.0, 0.0)):
+        return tuple.__new__(cls, (float(v) for v in values))
+
+    x = property(lambda self: self[0])
+    y = property(lambda self: self[1])
+    z = property(lambda self: self[2])
+
+
+class Matrix:
+    def __init__(self, rows=None):
+        self._m = numpy.identity(4) if rows is None else numpy.array(rows, dtype=numpy.float64)
+
+    @classmethod
+    def Identity(cls, size=4):
+        return cls(numpy.identity(size))
+
+    @classmethod
+    def Rotation(cls, angle, size, axis):
+        c = math.cos(angle)
+        s = math.sin(angle)
+        i, j = {'X': (1, 2), 'Y': (2, 0), 'Z': (0, 1)}[axis]
+        m = numpy.identity(size)
+        m[i, i] = c
+        m[i, j] = -s
+        m[j, i] = s
+        m[j, j] = c
+        return cls(m)
+
+    @classmethod
+    def Translation(cls, v):
+        m = numpy.identity(4)
+        m[:3, 3] = v
+        return cls(m)
+
+    def copy(self):
+        return Matrix(self._m)
+
+    def transposed(self):
+        return Matrix(self._m.T)
+
+    def inverted(self):
+        return Matrix(numpy.linalg.inv(self._m))
+
+    def __mul__(self, other):
+        return Matrix(self._m.dot(other._m))
+
+    def __imul__(self, other):
+        self._m = self._m.dot(other._m)
+        return self
+
+    def __array__(self, dtype=None, copy=None):
+        return self._m if dtype is None else self._m.astype(dtype)
+
+    def __iter__(self):
+        return iter(self._m.tolist())
+
+    def __len__(self):
+        return len(self._m)
+
+
+geometry = None
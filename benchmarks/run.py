@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+
+__doc__ = """export benchmarks without blender and arnold
+
+Usage:
+    python benchmarks/run.py                 run and compare with the baselines
+    python benchmarks/run.py --update        run and store the baselines
+    python benchmarks/run.py -k curves       run benchmarks matching the pattern
+
+Exit status is 1 if a benchmark is slower than its baseline by more
+than the tolerance factor.
+"""
+
+import argparse
+import collections
+import contextlib
+import json
+import os
+import pickle
+import platform
+import re
+import sys
+import time
+import types
+
+import numpy
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+ADDON = os.path.join(ROOT, "barnold for blender 2.79b", "barnold")
+BASELINES = os.path.join(HERE, "baselines.json")
+
+sys.path.insert(0, os.path.join(HERE, "mock"))
+sys.path.insert(0, HERE)
+
+import arnold
+import fixtures
+
+
+def load_engine():
+    """Import the addon engine package without the addon registration"""
+    pkg = types.ModuleType("barnold")
+    pkg.__path__ = [ADDON]
+    sys.modules["barnold"] = pkg
+    sys.modules["barnold.nodes"] = fixtures.nodes_module()
+    import barnold.engine
+    return barnold.engine
+
+
+engine = load_engine()
+bla = engine._BLA
+
+BENCHMARKS = collections.OrderedDict()
+
+
+def benchmark(name):
+    """Register benchmark setup, it returns the callable to measure"""
+    def _register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return _register
+
+
+##############################
+## polymesh
+def _polymesh(n, cache, auto_smooth=False):
+    def setup():
+        materials = [fixtures.material("M%d" % i) for i in range(4)]
+        mesh = fixtures.grid_mesh(n, n, materials)
+        mesh.use_auto_smooth = auto_smooth
+        engine._MESH_CACHE.clear()
+        engine._MESH_CACHE.resize(cache)
+        shaders = engine.Shaders(None)
+        return lambda: engine._AiPolymesh(mesh, shaders)
+    return setup
+
+
+benchmark("polymesh_40k")(_polymesh(200, 0))
+benchmark("polymesh_40k_cached")(_polymesh(200, 1 << 30))
+benchmark("polymesh_40k_split_normals")(_polymesh(200, 0, True))
+
+
+##############################
+## shaders
+@benchmark("shaders_builtin_200")
+def _shaders_builtin():
+    materials = [fixtures.material("M%d" % i) for i in range(200)]
+
+    def run():
+        shaders = engine.Shaders(None)
+        for mat in materials:
+            shaders.get(mat)
+    return run
+
+
+@benchmark("shaders_nodes_50")
+def _shaders_nodes():
+    nodes = sys.modules["barnold.nodes"]
+    materials = [fixtures.node_material("N%d" % i, nodes) for i in range(50)]
+
+    def run():
+        shaders = engine.Shaders(None)
+        for mat in materials:
+            shaders.get(mat)
+    return run
+
+
+##############################
+## particles
+def _curves(basis):
+    def setup():
+        ps = fixtures.HairSystem(bla, 1000, 10000, 10)
+        props = fixtures.hair_props(basis)
+        return lambda: bla.psys_get_curves(ps, 10, True, props)
+    return setup
+
+
+for _basis in ("bezier", "b-spline", "linear"):
+    benchmark("psys_get_curves_%s" % _basis)(_curves(_basis))
+
+
+@benchmark("psys_get_points_10k")
+def _points():
+    ps = fixtures.EmitterSystem(bla, 10000)
+    pss = fixtures.emitter_settings(1)
+    return lambda: bla.psys_get_points(ps, pss, 5)
+
+
+@benchmark("psys_get_points_trails_10k")
+def _trails():
+    ps = fixtures.EmitterSystem(bla, 10000)
+    pss = fixtures.emitter_settings(5)
+    return lambda: bla.psys_get_points(ps, pss, 5)
+
+
+##############################
+## IPR transport
+@benchmark("ipr_transport_40k")
+def _ipr_transport():
+    ipr = sys.modules["barnold.engine.ipr"]
+    mesh = fixtures.grid_mesh(200, 200)
+    name = "barnold-benchmark/shm-%d" % os.getpid()
+
+    def run():
+        params = engine._ipr_mesh(mesh)
+        params['name'] = ('STRING', "O::grid")
+        data = {'add': [('polymesh', params)]}
+        mm = ipr._shm_pack(data, name)
+        # worker side: unpickle and map the arrays
+        data = pickle.loads(pickle.dumps(data, pickle.HIGHEST_PROTOCOL))
+        try:
+            segment = ipr._shm(*data['shm'])
+            for t, v in data['add'][0][1].values():
+                if t == 'SHM':
+                    _t, offset, dtype, count = v
+                    numpy.frombuffer(segment, dtype=dtype, count=count, offset=offset).copy()
+            segment.close()
+        finally:
+            mm.close()
+            ipr._shm_unlink(name)
+    return run
+
+
+##############################
+## runner
+def measure(fn, repeat, min_time=0.2):
+    """Best time per call, calls number is calibrated to min_time per repeat"""
+    number = 1
+    while True:
+        pc = time.perf_counter()
+        for i in range(number):
+            fn()
+        t = time.perf_counter() - pc
+        if t >= min_time or number >= 1 << 16:
+            break
+        number *= 2 if t <= 0 else max(2, int(min_time / t) + 1)
+    best = t / number
+    for r in range(repeat - 1):
+        pc = time.perf_counter()
+        for i in range(number):
+            fn()
+        best = min(best, (time.perf_counter() - pc) / number)
+    return best
+
+
+def calls(fn):
+    """Arnold API calls of one run"""
+    arnold.CALLS.clear()
+    fn()
+    return dict(sorted(arnold.CALLS.items()))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="barnold export benchmarks")
+    parser.add_argument("-k", dest="pattern", default="", help="run benchmarks matching the regex")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--tolerance", type=float, default=1.5,
+                        help="slowdown factor reported as a regression")
+    parser.add_argument("--update", action="store_true", help="store the results as baselines")
+    args = parser.parse_args(argv)
+
+    baselines = {}
+    if os.path.exists(BASELINES):
+        with open(BASELINES) as f:
+            baselines = json.load(f).get("benchmarks", {})
+
+    results = collections.OrderedDict()
+    regressions = []
+    pattern = re.compile(args.pattern)
+    for name, setup in BENCHMARKS.items():
+        if not pattern.search(name):
+            continue
+        arnold.AiBegin()
+        try:
+            # the addon prints progress messages
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                fn = setup()
+                res = results[name] = {
+                    'time': measure(fn, args.repeat),
+                    'calls': calls(fn),
+                }
+        finally:
+            arnold.AiEnd()
+
+        base = baselines.get(name)
+        note = ""
+        if base is not None:
+            ratio = res['time'] / base['time']
+            note = "%.2fx" % ratio
+            if ratio > args.tolerance:
+                note += " SLOWER"
+                regressions.append(name)
+            if res['calls'] != base['calls']:
+                note += " (arnold calls changed)"
+        print("%-32s %10.3fms  %s" % (name, res['time'] * 1000, note))
+
+    if args.update:
+        if baselines:
+            baselines.update(results)
+            results = baselines
+        with open(BASELINES, "w") as f:
+            json.dump(collections.OrderedDict([
+                ('machine', {
+                    'platform': platform.platform(),
+                    'python': platform.python_version(),
+                    'numpy': numpy.__version__,
+                }),
+                ('benchmarks', results),
+            ]), f, indent=2)
+            f.write("\n")
+        print("baselines updated:", BASELINES)
+    elif regressions:
+        print("regressions:", ", ".join(regressions))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
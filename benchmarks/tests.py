@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+
+__doc__ = """export checks without blender and arnold, on the benchmark mocks
+
+Usage:
+    python benchmarks/tests.py
+"""
+
+import contextlib
+import gzip
+import os
+import tempfile
+import types
+import unittest
+import unittest.mock
+
+import numpy
+
+from run import arnold, engine, fixtures
+
+import bpy
+
+
+class Modifier(fixtures.Props):
+    """Modifier, the keyword arguments are its rna properties,
+    the values which aren't numbers or strings are pointers"""
+
+    def __init__(self, type, **props):
+        super().__init__(type=type, show_render=True, **props)
+        self.bl_rna = fixtures.Props(properties=[
+            fixtures.Props(
+                identifier=i,
+                type='FLOAT' if isinstance(v, (int, float, str)) else 'POINTER'
+            ) for i, v in props.items()
+        ])
+
+
+def read_ass(path):
+    """Parameters of the single node of an .ass file written by the addon
+    Returns:
+        {name: [str]} values, one per array element or one for a scalar
+    """
+    params = {}
+    with gzip.open(path, "rt") as f:
+        lines = iter(f.read().splitlines()[2:-1])
+    for line in lines:
+        t = line.split()
+        if t[0] == "declare":
+            continue
+        if len(t) >= 4 and t[1].isdigit() and t[2] == "1":
+            n = int(t[1])
+            params[t[0]] = t[4:] if t[3] == "NODE" else [next(lines) for i in range(n)]
+        else:
+            params[t[0]] = [" ".join(t[1:])]
+    return params
+
+
+@contextlib.contextmanager
+def universe():
+    """Arnold universe, the addon progress messages are dropped"""
+    arnold.AiBegin()
+    try:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            yield
+    finally:
+        arnold.AiEnd()
+
+
+class ModifiersSignatureTest(unittest.TestCase):
+
+    def signature(self, *modifiers):
+        return engine._ModifiersSignature(fixtures.Props(modifiers=modifiers))
+
+    def test_id_pointer(self):
+        a = self.signature(Modifier('DISPLACE', strength=1.0, texture=bpy.types.ID("Tex")))
+        b = self.signature(Modifier('DISPLACE', strength=1.0, texture=bpy.types.ID("Tex")))
+        c = self.signature(Modifier('DISPLACE', strength=1.0, texture=bpy.types.ID("Tex.001")))
+        self.assertIsNotNone(a)
+        self.assertEqual(a, b)
+        self.assertNotEqual(a, c)
+
+    def test_empty_pointer(self):
+        self.assertIsNotNone(self.signature(Modifier('DISPLACE', strength=1.0, texture=None)))
+
+    def test_object_pointer(self):
+        self.assertIsNone(self.signature(Modifier('ARMATURE', object=bpy.types.Object("Armature"))))
+
+    def test_non_id_pointer(self):
+        # settings structs have no name
+        settings = types.SimpleNamespace(quality=5)
+        self.assertIsNone(self.signature(Modifier('MESH_CACHE', settings=settings)))
+
+    def test_simulation(self):
+        for t in ('CLOTH', 'SOFT_BODY', 'COLLISION', 'SMOKE', 'DYNAMIC_PAINT',
+                  'EXPLODE', 'PARTICLE_INSTANCE'):
+            self.assertIsNone(self.signature(Modifier('SUBSURF', levels=2), Modifier(t)), t)
+
+
+class MeshReadTest(unittest.TestCase):
+
+    def setUp(self):
+        self.mesh = fixtures.grid_mesh(4, 4, [fixtures.material("M%d" % i) for i in range(2)])
+        self.mesh.use_auto_smooth = True
+        self.addCleanup(engine._MESH_CACHE.resize, engine._MESH_CACHE.budget)
+        self.addCleanup(engine._MESH_CACHE.clear)
+
+    def read(self, budget, digest=False):
+        engine._MESH_CACHE.clear()
+        engine._MESH_CACHE.resize(budget)
+        with universe(), unittest.mock.patch.object(
+                engine._AiArray, "from_collection", wraps=engine._AiArray.from_collection) as fc:
+            key, arrays, slots = engine._MeshRead(self.mesh, engine.Shaders(None), digest)
+        return key, arrays, [c[0][1] for c in fc.call_args_list]
+
+    def test_zero_copy(self):
+        key, arrays, attrs = self.read(0)
+        self.assertIsNone(key)
+        self.assertEqual(attrs, ["co", "loop_total", "vertices", "normal"])
+
+    def test_digest(self):
+        key, arrays, attrs = self.read(0, True)
+        self.assertIsNotNone(key)
+        self.assertEqual(attrs, [])
+
+    def test_cached(self):
+        key, arrays, attrs = self.read(1 << 20)
+        self.assertIsNotNone(key)
+        self.assertEqual(attrs, [])
+
+
+class ProceduralTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+
+    def test_write_polymesh(self):
+        path = os.path.join(self.dir.name, "m.ass.gz")
+        arrays = {
+            'vlist': numpy.arange(12, dtype=numpy.float32),
+            'nsides': numpy.array([3, 3], dtype=numpy.uint32),
+            'vidxs': numpy.array([0, 1, 2, 0, 2, 3], dtype=numpy.uint32),
+            'shidxs': numpy.array([1, 0], dtype=numpy.uint8),
+        }
+        engine._Ass.write_polymesh(path, "m", arrays, {'matte': True, 'visibility': 255},
+                                   shader=["M0::a", "M1::b"])
+        params = read_ass(path)
+        self.assertEqual(params['name'], ["m"])
+        self.assertEqual(params['shader'], ['"M0::a"', '"M1::b"'])
+        self.assertEqual(params['shidxs'], ["1", "0"])
+        self.assertEqual(params['matte'], ["on"])
+        self.assertEqual(params['visibility'], ["255"])
+        self.assertEqual(params['vidxs'], ["0", "1", "2", "0", "2", "3"])
+
+    def test_materials(self):
+        materials = [fixtures.material("A"), fixtures.material("B"), fixtures.material("C")]
+        mesh = fixtures.grid_mesh(3, 2, materials)
+        # the first material is not used
+        mesh.polygons._attrs['material_index'] = numpy.array([1, 2, 2, 1, 2, 1], dtype=numpy.int16)
+        props = fixtures.Props(visibility=254, sidedness=255, receive_shadows=True, self_shadows=False,
+                               invert_normals=False, opaque=True, matte=False, subdiv_type='none')
+        with universe():
+            shaders = engine.Shaders(None)
+            node, new = engine._AiProcedural(mesh, shaders, props, self.dir.name, {})
+            names = [arnold.AiNodeGetName(shaders.get(m)) for m in materials]
+        self.assertTrue(new)
+        params = read_ass(node.params["filename"])
+        self.assertEqual(params['shader'], ['"%s"' % n for n in names[1:]])
+        self.assertEqual(params['shidxs'], ["0", "1", "1", "0", "1", "0"])
+        self.assertEqual(params['visibility'], ["254"])
+        self.assertEqual(params['self_shadows'], ["off"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,24 +1,73 @@
 #include <ai.h>
+#include <atomic>
+#include <cstring>
 
 namespace ASTR {
 	static const AtString callback("callback");
 	static const AtString callback_data("callback_data");
 	static const AtString color_space("color_space");
+	static const AtString float_output("float_output");
+	static const AtString process_buckets("process_buckets");
 };
 
 AI_DRIVER_NODE_EXPORT_METHODS(DriverDisplayCallbackMtd)
 
-typedef void(*DisplayCallback)(uint32_t x, uint32_t y, uint32_t width, uint32_t height, uint8_t* buffer, void* data);
+// buffer is 8-bit display RGBA, or linear float RGBA with float_output enabled
+typedef void(*DisplayCallback)(uint32_t x, uint32_t y, uint32_t width, uint32_t height, void* buffer, void* data);
+
+// Bucket converted by a render thread, waiting for delivery to the callback
+struct Bucket
+{
+	int x, y, width, height;
+	void* buffer;
+	Bucket* next;
+};
+
+// Lock-free queue of converted buckets.
+//
+// Render threads push in driver_process_bucket, buckets are delivered to the
+// callback in driver_write_bucket and driver_close, which Arnold serializes,
+// so the callback is never called concurrently.
+struct DriverData
+{
+	std::atomic<Bucket*> head;
+
+	void push(Bucket* bucket)
+	{
+		bucket->next = head.load(std::memory_order_relaxed);
+		while (!head.compare_exchange_weak(bucket->next, bucket, std::memory_order_release, std::memory_order_relaxed));
+	}
+
+	// Takes all queued buckets, oldest first
+	Bucket* pop_all()
+	{
+		Bucket* bucket = head.exchange(NULL, std::memory_order_acquire);
+		Bucket* fifo = NULL;
+		while (bucket)
+		{
+			Bucket* next = bucket->next;
+			bucket->next = fifo;
+			fifo = bucket;
+			bucket = next;
+		}
+		return fifo;
+	}
+};
 
 node_parameters
 {
 	AiParameterPtr("callback"     , NULL);
 AiParameterPtr("callback_data", NULL);  // This value will be passed directly to the callback function
+AiParameterBool("float_output", false);  // Pass linear float RGBA buckets, no color management
+AiParameterBool("process_buckets", true);  // Convert buckets in render threads, see driver_process_bucket
 }
 
 node_initialize
 {
 	AiDriverInitialize(node, false);
+	DriverData* data = new DriverData();
+	data->head = NULL;
+	AiNodeSetLocalData(node, data);
 }
 
 node_update
@@ -65,72 +114,102 @@ if (cb)
 }
 }
 
-driver_write_bucket
-{
-	int pixel_type;
-const void* bucket_data;
-
-// Get the first AOV layer
-if (!AiOutputIteratorGetNext(iterator, NULL, &pixel_type, &bucket_data))
-return;
-
-const bool dither = true;
-
-// Retrieve color manager for conversion
-AtNode* color_manager = (AtNode*)AiNodeGetPtr(AiUniverseGetOptions(), "color_manager");
-AtString display_space, linear_space;
-AiColorManagerGetDefaults(color_manager, display_space, linear_space);
-if (!display_space)
-display_space = linear_space;
-
-// Allocates memory for the final pixels in the bucket
+// Converts the first AOV layer of the bucket to the callback pixel format.
 //
 // This memory is not released here. The client code is
 // responsible for its release, which must be done using
 // the AiFree() function in the Arnold API
-uint8_t* buffer = (uint8_t*)AiMalloc(bucket_size_x * bucket_size_y * sizeof(uint8_t) * 4);
-int minx = bucket_xo;
-int miny = bucket_yo;
-int maxx = bucket_xo + bucket_size_x - 1;
-int maxy = bucket_yo + bucket_size_y - 1;
-
-for (int j = miny; (j <= maxy); ++j)
+static void* convert_bucket(AtNode* node, AtOutputIterator* iterator,
+                            int bucket_xo, int bucket_yo, int bucket_size_x, int bucket_size_y)
 {
-	for (int i = minx; (i <= maxx); ++i)
-	{
-		int bx = i - minx;
-		int by = j - miny;
-		AtRGBA source = AI_RGBA_ZERO;
+	int pixel_type;
+	const void* bucket_data;
+
+	// Get the first AOV layer
+	if (!AiOutputIteratorGetNext(iterator, NULL, &pixel_type, &bucket_data))
+		return NULL;
 
+	int npixels = bucket_size_x * bucket_size_y;
+
+	if (AiNodeGetBool(node, ASTR::float_output))
+	{
+		// Linear float RGBA, the client does the color management
+		AtRGBA* fbuffer = (AtRGBA*)AiMalloc(npixels * sizeof(AtRGBA));
 		switch (pixel_type)
 		{
 		case AI_TYPE_FLOAT:
-		{
-			float f = ((float*)bucket_data)[by * bucket_size_x + bx];
-			source = AtRGBA(f, f, f, 1.0f);
+			for (int k = 0; k < npixels; ++k)
+			{
+				float f = ((const float*)bucket_data)[k];
+				fbuffer[k] = AtRGBA(f, f, f, 1.0f);
+			}
 			break;
-		}
 		case AI_TYPE_RGB:
-		{
-			AtRGB rgb = ((AtRGB*)bucket_data)[by * bucket_size_x + bx];
-			source = AtRGBA(rgb, 1.0f);
+			for (int k = 0; k < npixels; ++k)
+				fbuffer[k] = AtRGBA(((const AtRGB*)bucket_data)[k], 1.0f);
 			break;
-		}
 		case AI_TYPE_RGBA:
-		{
-			source = ((AtRGBA*)bucket_data)[by * bucket_size_x + bx];
+			memcpy(fbuffer, bucket_data, npixels * sizeof(AtRGBA));
 			break;
 		}
-		}
+		return fbuffer;
+	}
+
+	const bool dither = true;
+
+	// Retrieve color manager for conversion
+	AtNode* color_manager = (AtNode*)AiNodeGetPtr(AiUniverseGetOptions(), "color_manager");
+	AtString display_space, linear_space;
+	AiColorManagerGetDefaults(color_manager, display_space, linear_space);
+	if (!display_space)
+		display_space = linear_space;
+
+	// Allocates memory for the final pixels in the bucket
+	uint8_t* buffer = (uint8_t*)AiMalloc(npixels * sizeof(uint8_t) * 4);
+	int minx = bucket_xo;
+	int miny = bucket_yo;
+	int maxx = bucket_xo + bucket_size_x - 1;
+	int maxy = bucket_yo + bucket_size_y - 1;
+
+	for (int j = miny; (j <= maxy); ++j)
+	{
+		for (int i = minx; (i <= maxx); ++i)
+		{
+			int bx = i - minx;
+			int by = j - miny;
+			AtRGBA source = AI_RGBA_ZERO;
+
+			switch (pixel_type)
+			{
+			case AI_TYPE_FLOAT:
+			{
+				float f = ((float*)bucket_data)[by * bucket_size_x + bx];
+				source = AtRGBA(f, f, f, 1.0f);
+				break;
+			}
+			case AI_TYPE_RGB:
+			{
+				AtRGB rgb = ((AtRGB*)bucket_data)[by * bucket_size_x + bx];
+				source = AtRGBA(rgb, 1.0f);
+				break;
+			}
+			case AI_TYPE_RGBA:
+			{
+				source = ((AtRGBA*)bucket_data)[by * bucket_size_x + bx];
+				break;
+			}
+			}
 
-		AiColorManagerTransform(color_manager, display_space, false, false, NULL, (uint8_t*)&source.rgb());
+			AiColorManagerTransform(color_manager, display_space, false, false, NULL, (uint8_t*)&source.rgb());
 
-		uint8_t* target = &buffer[(by * bucket_size_x + bx) * 4];
-		target[0] = AiQuantize8bit(i, j, 0, source.r, dither);
-		target[1] = AiQuantize8bit(i, j, 1, source.g, dither);
-		target[2] = AiQuantize8bit(i, j, 2, source.b, dither);
-		target[3] = AiQuantize8bit(i, j, 3, source.a, dither);
+			uint8_t* target = &buffer[(by * bucket_size_x + bx) * 4];
+			target[0] = AiQuantize8bit(i, j, 0, source.r, dither);
+			target[1] = AiQuantize8bit(i, j, 1, source.g, dither);
+			target[2] = AiQuantize8bit(i, j, 2, source.b, dither);
+			target[3] = AiQuantize8bit(i, j, 3, source.a, dither);
+		}
 	}
+	return buffer;
 }
 
 // Sends the buffer with the final pixels to the callback for display.
@@ -144,27 +223,83 @@ for (int j = miny; (j <= maxy); ++j)
 // the callback and return to the rendering process, which will continue
 // asynchronously, in parallel with the visualization of the bucket, carried
 // out by the client code.
-//
-DisplayCallback cb = (DisplayCallback)AiNodeGetPtr(node, ASTR::callback);
-if (cb)
+static void send_bucket(AtNode* node, int x, int y, int width, int height, void* buffer)
 {
-	void *cb_data = AiNodeGetPtr(node, ASTR::callback_data);
-	(*cb)(bucket_xo, bucket_yo, bucket_size_x, bucket_size_y, buffer, cb_data);
+	DisplayCallback cb = (DisplayCallback)AiNodeGetPtr(node, ASTR::callback);
+	if (cb)
+	{
+		void *cb_data = AiNodeGetPtr(node, ASTR::callback_data);
+		(*cb)(x, y, width, height, buffer, cb_data);
+	}
+	else
+		AiFree(buffer);
+}
+
+// Delivers the buckets converted in render threads
+static void drain_buckets(AtNode* node)
+{
+	DriverData* data = (DriverData*)AiNodeGetLocalData(node);
+	Bucket* bucket = data->pop_all();
+	while (bucket)
+	{
+		Bucket* next = bucket->next;
+		send_bucket(node, bucket->x, bucket->y, bucket->width, bucket->height, bucket->buffer);
+		AiFree(bucket);
+		bucket = next;
+	}
 }
+
+driver_write_bucket
+{
+	if (AiNodeGetBool(node, ASTR::process_buckets))
+	{
+		drain_buckets(node);
+		return;
+	}
+
+	void* buffer = convert_bucket(node, iterator, bucket_xo, bucket_yo, bucket_size_x, bucket_size_y);
+	if (buffer)
+		send_bucket(node, bucket_xo, bucket_yo, bucket_size_x, bucket_size_y, buffer);
 }
 
 driver_process_bucket
 {
-	// Use this instead of driver_write_bucket for best performance, if your
-	// callback handling code is thread safe.
+	// Called from the render threads, the pixels conversion runs in parallel
+	// and the converted buckets are queued for driver_write_bucket.
+	if (!AiNodeGetBool(node, ASTR::process_buckets))
+		return;
+
+	void* buffer = convert_bucket(node, iterator, bucket_xo, bucket_yo, bucket_size_x, bucket_size_y);
+	if (!buffer)
+		return;
+
+	Bucket* bucket = (Bucket*)AiMalloc(sizeof(Bucket));
+	bucket->x = bucket_xo;
+	bucket->y = bucket_yo;
+	bucket->width = bucket_size_x;
+	bucket->height = bucket_size_y;
+	bucket->buffer = buffer;
+	DriverData* data = (DriverData*)AiNodeGetLocalData(node);
+	data->push(bucket);
 }
 
 driver_close
 {
+	drain_buckets(node);
 }
 
 node_finish
 {
+	DriverData* data = (DriverData*)AiNodeGetLocalData(node);
+	Bucket* bucket = data->pop_all();
+	while (bucket)
+	{
+		Bucket* next = bucket->next;
+		AiFree(bucket->buffer);
+		AiFree(bucket);
+		bucket = next;
+	}
+	delete data;
 }
 
 node_loader